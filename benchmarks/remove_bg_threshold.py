@@ -0,0 +1,56 @@
+"""
+Сравнение глобального порога Оцу и локальных порогов Sauvola/Bradley
+на синтетическом фото документа с неравномерным освещением.
+
+Запуск из корня репозитория:
+    poetry run python -m benchmarks.remove_bg_threshold --width 4000 --height 3000
+"""
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from src.utils.remove_bg.remove_bg_document import THRESHOLD_METHODS, remove_background_image
+
+
+def build_photo(width: int, height: int) -> tuple[np.ndarray, np.ndarray]:
+    """Строки «текста» на фоне, освещённом слева направо от 120 до 240."""
+    rng = np.random.default_rng(0)
+    light = np.linspace(120, 240, width, dtype=np.float32)
+    gray = np.tile(light, (height, 1))
+    ink = np.zeros((height, width), dtype=bool)
+    for top in range(height // 15, height - height // 15, max(12, height // 50)):
+        ink[top:top + max(2, height // 400), width // 12:width - width // 12] = True
+    gray[ink] *= 0.45
+    gray += rng.normal(0, 4, gray.shape).astype(np.float32)
+    photo = cv2.cvtColor(np.clip(gray, 0, 255).astype(np.uint8), cv2.COLOR_GRAY2BGR)
+    return photo, ink
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--width', type=int, default=4000)
+    parser.add_argument('--height', type=int, default=3000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    photo, ink = build_photo(args.width, args.height)
+    print(f"Изображение: {args.width}x{args.height}")
+
+    baseline = None
+    for method in THRESHOLD_METHODS:
+        started = time.perf_counter()
+        for _ in range(args.repeat):
+            result = remove_background_image(photo, text_color=(0, 0, 0), method=method)
+        seconds = (time.perf_counter() - started) / args.repeat
+        baseline = baseline or seconds
+        errors = float(((result[:, :, 3] > 0) != ink).mean()) * 100
+        print(
+            f"{method:8s} {seconds * 1000:8.1f} мс  x{seconds / baseline:.2f}  "
+            f"ошибок: {errors:.2f}%"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+Сравнение подстановки значений в PPTX: прежние вложенные циклы
+(слайд -> фигура -> абзац -> фрагмент -> ключ, str.replace на каждый ключ)
+и однопроходный Substitutions.
+
+Запуск из корня репозитория:
+    poetry run python -m benchmarks.substitution --slides 20 --keys 9
+"""
+import argparse
+import copy
+import time
+
+from pptx import Presentation
+from pptx.util import Inches, Pt
+
+from src.utils.office import Substitutions
+
+
+def legacy_replace(prs, replacements: dict) -> None:
+    for slide in prs.slides:
+        for shape in slide.shapes:
+            if not shape.has_text_frame:
+                continue
+            for paragraph in shape.text_frame.paragraphs:
+                for run in paragraph.runs:
+                    for key, value in replacements.items():
+                        if key in run.text:
+                            run.text = run.text.replace(key, value)
+
+
+def build_presentation(slides: int, keys: list[str]):
+    prs = Presentation()
+    for _ in range(slides):
+        slide = prs.slides.add_slide(prs.slide_layouts[6])
+        for index, key in enumerate(keys):
+            box = slide.shapes.add_textbox(
+                Inches(0.5), Inches(0.3 + 0.5 * index), Inches(6), Inches(0.4)
+            )
+            paragraph = box.text_frame.paragraphs[0]
+            for text in ('Поле: ', key, ' конец строки'):
+                run = paragraph.add_run()
+                run.text = text
+                run.font.size = Pt(14)
+    return prs
+
+
+def measure(function, template, replacements: dict, repeat: int) -> float:
+    copies = [copy.deepcopy(template) for _ in range(repeat)]
+    started = time.perf_counter()
+    for prs in copies:
+        function(prs, replacements)
+    return (time.perf_counter() - started) / repeat
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--slides', type=int, default=20)
+    parser.add_argument('--keys', type=int, default=9)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    keys = [f'Placeholder_{index}' for index in range(args.keys)]
+    replacements = {key: f'Значение {index}' for index, key in enumerate(keys)}
+    template = build_presentation(args.slides, keys)
+
+    legacy = measure(legacy_replace, template, replacements, args.repeat)
+    single_pass = measure(
+        lambda prs, values: Substitutions(values).apply_slides(prs.slides),
+        template, replacements, args.repeat
+    )
+
+    print(f"Слайдов: {args.slides}, ключей: {args.keys}")
+    print(f"Вложенные циклы: {legacy * 1000:.2f} мс")
+    print(f"Substitutions:   {single_pass * 1000:.2f} мс")
+    print(f"Ускорение:       x{legacy / single_pass:.2f}")
+
+
+if __name__ == '__main__':
+    main()
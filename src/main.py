@@ -1,9 +1,11 @@
 import datetime
 import base64
+import io
+from contextlib import asynccontextmanager
 
 import uvicorn
-from fastapi import FastAPI, File, Form, Request, UploadFile, BackgroundTasks
-from fastapi.responses import Response
+from fastapi import FastAPI, File, Form, Request, UploadFile
+from fastapi.responses import JSONResponse, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 
@@ -19,19 +21,74 @@ from src.auth import (
     JWTDecodeError
 )
 from src.utils.send_email.email_handler import send_email_handler
-from src.utils.doctor_form.doctor_form_handler import doctor_form_handler
-from src.utils.gen_cert.gen_cert_handler import gen_cert_handler
+from src.utils.doctor_form.doctor_form_handler import (
+    doctor_form_handler,
+    form_date,
+    TEMPLATE_PATH as DOCTOR_TEMPLATE_PATH,
+)
+from src.utils.doctor_form.day_template import start_daily_rebuild, stop_daily_rebuild
+from src.utils.doctor_form.schedule_handler import doctor_schedule_handler
+from src.utils.gen_cert.gen_cert_handler import gen_cert_handler, TEMPLATE_PATH as CERT_TEMPLATE_PATH
+from src.utils.gen_cert.fast_render import prepare_fast_renderer_async
+from src.utils.gen_cert.bulk_cert_handler import bulk_cert_handler
 from src.utils.remove_bg.remove_bg_handler import remove_bg_handler
+from src.utils.remove_bg.batch_handler import remove_bg_batch_handler
+from src.utils.remove_bg.image_pool import get_image_pool, stop_image_pool
+from src.utils.remove_bg.encoding import OUTPUT_FORMATS
+from src.utils.admission import AdmissionMiddleware, admission_stats
+from src.utils.jobs import (
+    get_job_manager,
+    job_events_response,
+    job_result_response,
+    job_status_response,
+    stop_jobs,
+    submit_job_response,
+    wants_async,
+)
+from src.utils.office import (
+    EXPORT_PROFILES,
+    converter_status,
+    discover_converter,
+    export_stats,
+    get_conversion_cache,
+    remove_profiles,
+    start_pool,
+    stop_pool,
+    warm_template,
+)
 
 
 date_now = datetime.datetime.now().strftime("%d.%m.%y")
 dependencies = [get_auth_dependency()]
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Определяет бэкенд конвертации, готовит шаблон профиля LibreOffice,
+    запускает пул, готовит быстрый рендерер сертификатов и бланк врача
+    на сегодня при старте, останавливает пул при выходе.
+    """
+    converter = discover_converter()
+    if converter['binary']:
+        warm_template(converter['binary'])
+        prepare_fast_renderer_async(CERT_TEMPLATE_PATH)
+    start_pool()
+    start_daily_rebuild(DOCTOR_TEMPLATE_PATH, lambda: form_date(None))
+    yield
+    stop_daily_rebuild()
+    stop_jobs()
+    stop_image_pool()
+    stop_pool()
+    remove_profiles()
+
+
 # FastAPI app
-app = FastAPI(docs_url=None, redoc_url=None)
+app = FastAPI(docs_url=None, redoc_url=None, lifespan=lifespan)
 app.mount("/static", StaticFiles(directory="templates"), name="static")
 templates = Jinja2Templates(directory="templates")
 app.add_exception_handler(JWTDecodeError, jwt_decode_exception_handler)
+app.add_middleware(AdmissionMiddleware)
 
 
 @app.post("/login",
@@ -66,6 +123,33 @@ def root(request: Request):
         return Response(status_code=200)
     return check_auth_status(request)
 
+@app.api_route("/ready", methods=["GET", "HEAD"],
+               tags=['Мониторинг'],
+               summary='Готовность конвертера документов'
+               )
+def ready(request: Request):
+    # Без авторизации отдаётся только состояние; путь и версия LibreOffice - в /stats.
+    status = converter_status()['status']
+    status_code = 503 if status == 'unavailable' else 200
+    if request.method == "HEAD":
+        return Response(status_code=status_code)
+    return JSONResponse({'status': status}, status_code=status_code)
+
+@app.get("/stats",
+         dependencies=dependencies,
+         tags=['Мониторинг'],
+         summary='Статистика кэшей и очередей обработки'
+         )
+def stats():
+    return {
+        'converter': converter_status(),
+        'conversion_cache': get_conversion_cache().stats(),
+        'pdf_export': export_stats(),
+        'admission': admission_stats(),
+        'jobs': get_job_manager().stats(),
+        'image_pool': get_image_pool().stats(),
+    }
+
 @app.get("/home",
          dependencies=dependencies,
          tags=['Домашняя страница'],
@@ -133,7 +217,7 @@ def gen_rit_cert_page(request: Request):
             status = f"Ошибка декодирования статуса, {e}"
 
     response = templates.TemplateResponse(
-        request, "gen_rit_cert.html", {"status": status}
+        request, "gen_rit_cert.html", {"status": status, "profiles": EXPORT_PROFILES.values()}
         )
     if encoded_status:
         response.delete_cookie("gen_cert_status")
@@ -147,12 +231,35 @@ def gen_rit_cert_page(request: Request):
 def gen_rit_cert_endpoint(
     request: Request,
     name: str | None = Form(None),
-    price: str | None = Form(None)
+    price: str | None = Form(None),
+    profile: str | None = Form(None)
 ):
+    if wants_async(request):
+        return submit_job_response(
+            'gen_rit_cert', gen_cert_handler,
+            request=request, name=name, price=price, profile=profile
+        )
     return gen_cert_handler(
         request=request,
         name=name,
-        price=price
+        price=price,
+        profile=profile
+    )
+
+@app.post("/gen_rit_cert/bulk",
+         dependencies=dependencies,
+         tags=['Генерация сертификата'],
+         summary='Сгенерировать сертификаты по таблице CSV/XLSX'
+         )
+def gen_rit_cert_bulk_endpoint(
+    request: Request,
+    file: UploadFile = File(...),
+    output: str | None = Form(None)
+):
+    return bulk_cert_handler(
+        request=request,
+        file=file,
+        output=output
     )
 
 @app.get("/doctor_form",
@@ -193,6 +300,16 @@ def doctor_form_endpoint(
     patient_4: str | None = Form(None),
     date: str | None = Form(None)
 ):
+    if wants_async(request):
+        return submit_job_response(
+            'doctor_form', doctor_form_handler,
+            request=request,
+            doctor_1=doctor_1, doctor_2=doctor_2,
+            doctor_3=doctor_3, doctor_4=doctor_4,
+            patient_1=patient_1, patient_2=patient_2,
+            patient_3=patient_3, patient_4=patient_4,
+            date=date
+        )
     return doctor_form_handler(
         request=request,
         doctor_1=doctor_1,
@@ -206,6 +323,28 @@ def doctor_form_endpoint(
         date=date
     )
 
+@app.post("/doctor_form/schedule",
+         dependencies=dependencies,
+         tags=['Генерация карточек'],
+         summary='Сгенерировать карточки по расписанию CSV/XLSX'
+         )
+def doctor_schedule_endpoint(
+    request: Request,
+    file: UploadFile = File(...),
+    date: str | None = Form(None)
+):
+    if wants_async(request):
+        upload = UploadFile(io.BytesIO(file.file.read()), filename=file.filename)
+        return submit_job_response(
+            'doctor_form_schedule', doctor_schedule_handler,
+            request=request, file=upload, date=date
+        )
+    return doctor_schedule_handler(
+        request=request,
+        file=file,
+        date=date
+    )
+
 
 @app.get("/remove_bg",
          dependencies=dependencies,
@@ -222,7 +361,7 @@ def remove_bg_page(request: Request):
             status = f"Ошибка декодирования статуса, {e}"
 
     response = templates.TemplateResponse(
-        request, "remove_bg.html", {"status": status}
+        request, "remove_bg.html", {"status": status, "output_formats": OUTPUT_FORMATS.values()}
         )
     if encoded_status:
         response.delete_cookie("remove_bg_status")
@@ -235,17 +374,90 @@ def remove_bg_page(request: Request):
          )
 def remove_bg_endpoint(
     request: Request,
-    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
-    color: str | None = Form(None)
+    color: str | None = Form(None),
+    output_format: str | None = Form(None),
+    compression: str | None = Form(None),
+    pages: str | None = Form(None),
+    threshold: str | None = Form(None),
+    max_dimension: str | None = Form(None),
+    crop: str | None = Form(None),
+    trim: str | None = Form(None),
+    trim_padding: str | None = Form(None),
+    colors: str | None = Form(None)
 ):
+    if wants_async(request):
+        # Загруженный файл закрывается по окончании запроса,
+        # поэтому задача получает копию содержимого.
+        upload = UploadFile(io.BytesIO(file.file.read()), filename=file.filename)
+        return submit_job_response(
+            'remove_bg', remove_bg_handler,
+            request=request, file=upload, color=color,
+            output_format=output_format, compression=compression, pages=pages,
+            threshold=threshold, max_dimension=max_dimension,
+            crop=crop, trim=trim, trim_padding=trim_padding, colors=colors
+        )
     return remove_bg_handler(
         request=request,
-        background_tasks=background_tasks,
         file=file,
-        color=color
+        color=color,
+        output_format=output_format,
+        compression=compression,
+        pages=pages,
+        threshold=threshold,
+        max_dimension=max_dimension,
+        crop=crop,
+        trim=trim,
+        trim_padding=trim_padding,
+        colors=colors
+    )
+
+
+@app.post("/remove_bg/batch",
+         dependencies=dependencies,
+         tags=['Удаление фона'],
+         summary='Удалить фон с нескольких изображений (ZIP)'
+         )
+def remove_bg_batch_endpoint(
+    request: Request,
+    files: list[UploadFile] = File(...),
+    color: str | None = Form(None),
+    output_format: str | None = Form(None),
+    compression: str | None = Form(None)
+):
+    return remove_bg_batch_handler(
+        request=request,
+        files=files,
+        color=color,
+        output_format=output_format,
+        compression=compression
     )
 
 
+@app.get("/jobs/{job_id}",
+         dependencies=dependencies,
+         tags=['Фоновые задачи'],
+         summary='Состояние фоновой задачи'
+         )
+def job_status(job_id: str):
+    return job_status_response(job_id)
+
+@app.get("/jobs/{job_id}/events",
+         dependencies=dependencies,
+         tags=['Фоновые задачи'],
+         summary='Состояние фоновой задачи (Server-Sent Events)'
+         )
+def job_events(job_id: str):
+    return job_events_response(job_id)
+
+@app.get("/jobs/{job_id}/result",
+         dependencies=dependencies,
+         tags=['Фоновые задачи'],
+         summary='Скачать результат фоновой задачи'
+         )
+def job_result(job_id: str):
+    return job_result_response(job_id)
+
+
 if __name__ == "__main__":
     uvicorn.run("src.main:app", reload=True, host="0.0.0.0", port=8000)
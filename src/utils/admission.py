@@ -0,0 +1,146 @@
+"""
+Ограничение числа одновременно выполняемых тяжёлых запросов.
+
+Генерация сертификатов и бланков (LibreOffice) и удаление фона (OpenCV)
+выполняются синхронно в пуле потоков Starlette, который сам по себе
+не ограничивает число одновременных задач. При всплеске запросов машина
+перегружается и замедляются все запросы сразу.
+
+Для каждого такого эндпоинта задаётся лимит одновременных запросов и
+длина очереди ожидания. Запрос сверх лимита ждёт в очереди; если очередь
+заполнена или ожидание затянулось, клиент сразу получает 503 с
+заголовком Retry-After. Слот занят до конца отправки ответа, включая
+потоковые ответы (архивы сертификатов).
+"""
+import asyncio
+import os
+from collections import deque
+
+from starlette.responses import PlainTextResponse
+
+
+CPU_COUNT = os.cpu_count() or 2
+RETRY_AFTER = int(os.getenv('ADMISSION_RETRY_AFTER', '5'))
+QUEUE_TIMEOUT = float(os.getenv('ADMISSION_QUEUE_TIMEOUT', '30'))
+
+
+class AdmissionLimiter:
+    """Лимит одновременных запросов с ограниченной очередью ожидания."""
+
+    def __init__(self, concurrency: int, queue_size: int, queue_timeout: float = QUEUE_TIMEOUT):
+        self.concurrency = max(1, concurrency)
+        self.queue_size = max(0, queue_size)
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self._waiters: deque[asyncio.Future] = deque()
+
+    @property
+    def queued(self) -> int:
+        return sum(1 for waiter in self._waiters if not waiter.done())
+
+    async def acquire(self) -> bool:
+        """Занимает слот. Возвращает False, если запрос нужно отклонить."""
+        if self.in_flight < self.concurrency and not self.queued:
+            self.in_flight += 1
+            self.admitted += 1
+            return True
+        if self.queued >= self.queue_size:
+            self.rejected += 1
+            return False
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except asyncio.TimeoutError:
+            # С Python 3.12 wait_for может сообщить о тайм-ауте, когда
+            # release() уже передал слот этому запросу: тогда запрос
+            # принимается, иначе слот был бы потерян навсегда.
+            if not (waiter.done() and not waiter.cancelled()):
+                self.timed_out += 1
+                return False
+        except asyncio.CancelledError:
+            # Клиент ушёл, но слот мог быть уже передан этому запросу.
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+        self.admitted += 1
+        return True
+
+    def release(self) -> None:
+        """Освобождает слот или передаёт его первому ожидающему запросу."""
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(True)
+                return
+        self.in_flight -= 1
+
+    def stats(self) -> dict:
+        return {
+            'concurrency': self.concurrency,
+            'queue_size': self.queue_size,
+            'in_flight': self.in_flight,
+            'queued': self.queued,
+            'admitted': self.admitted,
+            'rejected': self.rejected,
+            'timed_out': self.timed_out,
+        }
+
+
+def _limiter(name: str, concurrency: int, queue_size: int) -> AdmissionLimiter:
+    return AdmissionLimiter(
+        int(os.getenv(f'ADMISSION_{name}_CONCURRENCY', str(concurrency))),
+        int(os.getenv(f'ADMISSION_{name}_QUEUE', str(queue_size))),
+    )
+
+
+LIMITERS = {
+    '/gen_rit_cert': _limiter('GEN_CERT', CPU_COUNT, 4 * CPU_COUNT),
+    '/gen_rit_cert/bulk': _limiter('GEN_CERT_BULK', 1, 2),
+    '/doctor_form': _limiter('DOCTOR_FORM', CPU_COUNT, 4 * CPU_COUNT),
+    '/doctor_form/schedule': _limiter('DOCTOR_SCHEDULE', CPU_COUNT, 2 * CPU_COUNT),
+    '/remove_bg': _limiter('REMOVE_BG', CPU_COUNT, 2 * CPU_COUNT),
+    '/remove_bg/batch': _limiter('REMOVE_BG_BATCH', 1, 2),
+}
+
+
+def admission_stats() -> dict:
+    """Текущая загрузка и счётчики по эндпоинтам для /stats."""
+    return {path: limiter.stats() for path, limiter in LIMITERS.items()}
+
+
+class AdmissionMiddleware:
+    """ASGI middleware, применяющий лимиты к POST-запросам эндпоинтов."""
+
+    def __init__(self, app, limiters: dict[str, AdmissionLimiter] | None = None):
+        self.app = app
+        self.limiters = LIMITERS if limiters is None else limiters
+
+    async def __call__(self, scope, receive, send):
+        limiter = None
+        if scope['type'] == 'http' and scope['method'] == 'POST':
+            limiter = self.limiters.get(scope['path'])
+        if limiter is None:
+            await self.app(scope, receive, send)
+            return
+
+        if not await limiter.acquire():
+            response = PlainTextResponse(
+                f"Сервер перегружен, повторите попытку через {RETRY_AFTER} с",
+                status_code=503,
+                headers={'Retry-After': str(RETRY_AFTER)}
+            )
+            await response(scope, receive, send)
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release()
@@ -0,0 +1,17 @@
+"""
+Даты по-русски без зависимости от локали процесса.
+
+strftime("%B") зависит от глобального locale.setlocale и возвращает
+название месяца в именительном падеже («март»), а в документах нужен
+родительный («15 марта»). Таблица названий задана заранее, поэтому
+форматирование не зависит от локали и безопасно в любых потоках.
+"""
+MONTHS_GENITIVE = (
+    'января', 'февраля', 'марта', 'апреля', 'мая', 'июня',
+    'июля', 'августа', 'сентября', 'октября', 'ноября', 'декабря',
+)
+
+
+def month_genitive(month: int) -> str:
+    """Название месяца (1-12) в родительном падеже."""
+    return MONTHS_GENITIVE[month - 1]
@@ -0,0 +1,131 @@
+"""
+Шаблон бланка врача с уже подставленной датой.
+
+Дата одна на все бланки за день, поэтому она подставляется в шаблон
+один раз, а запрос заполняет только поля врачей и пациентов. Готовый
+шаблон на сегодня пересобирается в полночь (таймер запускается при
+старте приложения). Для дней, заданных в форме вручную, шаблон
+собирается при первом запросе и тоже хранится, пока не будет вытеснен
+более новыми датами. Замена файла шаблона отслеживается общим кэшем
+пакетов (см. office.templates).
+"""
+import datetime
+import logging
+import threading
+from collections import OrderedDict
+
+from src.utils.office import load_package
+from src.utils.office.package import PptxPackage
+
+
+logger = logging.getLogger(__name__)
+
+DATE_KEY = 'Дата'
+MAX_DATES = 8
+
+
+class DayTemplates:
+    """Шаблоны с подставленной датой по ключу (путь, дата)."""
+
+    def __init__(self, max_dates: int = MAX_DATES):
+        self.max_dates = max_dates
+        self._entries: OrderedDict[tuple[str, str], tuple[PptxPackage, PptxPackage]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.bakes = 0
+
+    def get(self, path: str, date_text: str) -> PptxPackage:
+        """
+        Raises:
+            FileNotFoundError: Если файла шаблона нет
+        """
+        base = load_package(path)
+        key = (path, date_text)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] is base:
+                self._entries.move_to_end(key)
+                return entry[1]
+
+        baked = base.bake({DATE_KEY: date_text})
+        with self._lock:
+            self._entries[key] = (base, baked)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_dates:
+                self._entries.popitem(last=False)
+            self.bakes += 1
+        return baked
+
+    def render(self, path: str, date_text: str, replacements: dict) -> bytes:
+        """PPTX на дату date_text с подставленными значениями."""
+        return self.get(path, date_text).render_bytes(replacements)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+_templates = DayTemplates()
+_timer: threading.Timer | None = None
+_timer_running = False
+_timer_lock = threading.Lock()
+
+
+def render_day_template(path: str, date_text: str, replacements: dict) -> bytes:
+    """PPTX из общего кэша шаблонов с датой (см. DayTemplates.render)."""
+    return _templates.render(path, date_text, replacements)
+
+
+def seconds_until_midnight(now: datetime.datetime | None = None) -> float:
+    now = now or datetime.datetime.now()
+    midnight = datetime.datetime.combine(
+        now.date() + datetime.timedelta(days=1), datetime.time()
+    )
+    return (midnight - now).total_seconds()
+
+
+def _rebuild(path: str, date_text) -> None:
+    try:
+        _templates.get(path, date_text())
+    except Exception as e:
+        logger.warning("Не удалось подготовить бланк на сегодня: %s", e)
+
+
+def _schedule(path: str, date_text) -> None:
+    global _timer
+
+    def run():
+        _rebuild(path, date_text)
+        _schedule(path, date_text)
+
+    with _timer_lock:
+        if not _timer_running:
+            return
+        # Секунда запаса, чтобы таймер не сработал за мгновение до полуночи.
+        _timer = threading.Timer(seconds_until_midnight() + 1, run)
+        _timer.daemon = True
+        _timer.start()
+
+
+def start_daily_rebuild(path: str, date_text) -> None:
+    """
+    Готовит шаблон на сегодня и пересобирает его каждую полночь.
+
+    Args:
+        path: Путь к шаблону
+        date_text: Функция без аргументов, возвращающая текущую дату бланка
+    """
+    global _timer_running
+    stop_daily_rebuild()
+    _rebuild(path, date_text)
+    with _timer_lock:
+        _timer_running = True
+    _schedule(path, date_text)
+
+
+def stop_daily_rebuild() -> None:
+    global _timer, _timer_running
+    with _timer_lock:
+        timer, _timer = _timer, None
+        _timer_running = False
+    if timer is not None:
+        timer.cancel()
@@ -0,0 +1,101 @@
+import io
+import os
+import base64
+from fastapi import File, Form, Request, UploadFile
+from fastapi.responses import RedirectResponse
+
+from src.utils.doctor_form.doctor_form_handler import (
+    CARDS_PER_SLIDE,
+    PPTX_MEDIA_TYPE,
+    TEMPLATE_PATH,
+    card_replacements,
+    form_date,
+)
+from src.utils.office import Substitutions, load_template
+from src.utils.office.slides import duplicate_slide
+from src.utils.office.spreadsheet import pick, read_rows
+from src.utils.responses import MemoryFileResponse
+
+
+MAX_SCHEDULE_ROWS = int(os.getenv('DOCTOR_SCHEDULE_MAX_ROWS', '400'))
+
+DOCTOR_COLUMNS = ('doctor', 'врач', 'доктор')
+PATIENT_COLUMNS = ('patient', 'пациент', 'фио пациента', 'фио')
+
+
+def read_schedule_rows(filename: str, content: bytes) -> list[tuple[str, str]]:
+    """Читает пары (врач, пациент) из расписания CSV/XLSX."""
+    rows = read_rows(filename, content)
+    cards = [
+        (pick(row, *DOCTOR_COLUMNS), pick(row, *PATIENT_COLUMNS))
+        for row in rows
+    ]
+    cards = [item for item in cards if any(item)]
+    if not cards:
+        raise ValueError(
+            "В расписании нет данных. Нужны столбцы «Врач» и «Пациент» "
+            "(или doctor и patient)"
+        )
+    if len(cards) > MAX_SCHEDULE_ROWS:
+        raise ValueError(
+            f"Слишком много строк: {len(cards)}, максимум {MAX_SCHEDULE_ROWS}"
+        )
+    return cards
+
+
+def render_schedule_pptx(cards: list[tuple[str, str]], date_text: str) -> bytes:
+    """
+    Собирает презентацию с карточками по четыре на слайд.
+
+    Шаблон разбирается один раз (из кэша шаблонов), первый слайд
+    копируется для каждой следующей четвёрки карточек, и вся
+    презентация сохраняется один раз. Поля карточек, не заполненных
+    на последнем слайде, остаются пустыми.
+    """
+    prs = load_template(TEMPLATE_PATH)
+    source = prs.slides[0]
+    pages = [
+        cards[start:start + CARDS_PER_SLIDE]
+        for start in range(0, len(cards), CARDS_PER_SLIDE)
+    ]
+    slides = [source] + [duplicate_slide(prs, source) for _ in pages[1:]]
+    for slide, page in zip(slides, pages):
+        Substitutions(card_replacements(page, date_text, empty='')).apply_shapes(slide.shapes)
+
+    output = io.BytesIO()
+    prs.save(output)
+    return output.getvalue()
+
+
+def doctor_schedule_handler(
+    request: Request,
+    file: UploadFile = File(...),
+    date: str | None = Form(None)
+):
+    """
+    Обработчик генерации карточек по расписанию приёма.
+
+    Args:
+        request: FastAPI request object
+        file: Расписание CSV/XLSX со столбцами Врач и Пациент
+        date: День месяца для бланков (по умолчанию - сегодня)
+    """
+    try:
+        if not file.filename:
+            raise ValueError("Файл не был загружен")
+
+        cards = read_schedule_rows(file.filename, file.file.read())
+        pptx_data = render_schedule_pptx(cards, form_date(date))
+
+        return MemoryFileResponse(
+            content=pptx_data,
+            filename="Бланки Врача на печать.pptx",
+            media_type=PPTX_MEDIA_TYPE
+        )
+
+    except Exception as e:
+        status = f"Ошибка обработки расписания: {str(e)}"
+        response = RedirectResponse(url="/doctor_form", status_code=303)
+        encoded_status = base64.b64encode(status.encode('utf-8')).decode('ascii')
+        response.set_cookie("doctor_form_status", encoded_status, max_age=10)
+        return response
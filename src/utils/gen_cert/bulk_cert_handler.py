@@ -0,0 +1,207 @@
+import os
+import base64
+import shutil
+import subprocess
+import zipfile
+from fastapi import File, Form, Request, UploadFile, BackgroundTasks
+from fastapi.responses import FileResponse, RedirectResponse
+
+from src.utils.gen_cert.gen_cert_handler import (
+    TEMPLATE_PATH,
+    certificate_replacements,
+    convert_pptx_to_pdf,
+    fill_slide,
+    get_random_number,
+)
+from src.utils.office import fill_template, load_template, make_work_dir
+from src.utils.office.batch import iter_convert_to_pdf
+from src.utils.office.slides import duplicate_slide
+from src.utils.office.spreadsheet import pick, read_rows
+from src.utils.responses import StreamingFileResponse
+from src.utils.streaming_zip import iter_zip, safe_filename
+
+
+MAX_BULK_ROWS = int(os.getenv('BULK_CERT_MAX_ROWS', '500'))
+BULK_CHUNK = int(os.getenv('BULK_CERT_CHUNK', '40'))
+
+OUTPUT_ZIP = 'zip'
+OUTPUT_PDF = 'pdf'
+
+NAME_COLUMNS = ('name', 'фио', 'имя')
+PRICE_COLUMNS = ('price', 'сумма', 'цена', 'номинал')
+
+
+def read_certificate_rows(filename: str, content: bytes) -> list[tuple[str, str]]:
+    """Читает пары (ФИО, сумма) из таблицы CSV/XLSX."""
+    rows = read_rows(filename, content)
+    certificates = [
+        (pick(row, *NAME_COLUMNS), pick(row, *PRICE_COLUMNS))
+        for row in rows
+    ]
+    certificates = [item for item in certificates if any(item)]
+    if not certificates:
+        raise ValueError(
+            "В таблице нет данных. Нужны столбцы «ФИО» и «Сумма» "
+            "(или name и price)"
+        )
+    if len(certificates) > MAX_BULK_ROWS:
+        raise ValueError(
+            f"Слишком много строк: {len(certificates)}, максимум {MAX_BULK_ROWS}"
+        )
+    return certificates
+
+
+def render_merged_pptx(certificates: list[tuple[str, str]], pptx_path: str) -> None:
+    """Собирает одну презентацию, где каждый сертификат - отдельный слайд."""
+    prs = load_template(TEMPLATE_PATH)
+    source = prs.slides[0]
+    slides = [source] + [
+        duplicate_slide(prs, source) for _ in certificates[1:]
+    ]
+    for slide, (name, price) in zip(slides, certificates):
+        fill_slide(slide, certificate_replacements(name, price, get_random_number()))
+    prs.save(pptx_path)
+
+
+def unite_pdfs(pdf_paths: list[str], output_path: str) -> None:
+    """Склеивает PDF в один файл утилитой pdfunite (poppler-utils)."""
+    if len(pdf_paths) == 1:
+        os.replace(pdf_paths[0], output_path)
+        return
+    pdfunite = shutil.which('pdfunite')
+    if pdfunite is None:
+        raise Exception("pdfunite не найден. Установите poppler-utils")
+    result = subprocess.run(
+        [pdfunite, *pdf_paths, output_path],
+        capture_output=True, text=True, timeout=30 + len(pdf_paths)
+    )
+    if result.returncode != 0 or not os.path.exists(output_path):
+        raise Exception(f"Не удалось объединить PDF: {result.stderr}")
+
+
+def render_merged_pdf(certificates: list[tuple[str, str]], workdir: str) -> str:
+    """
+    Собирает один PDF со всеми сертификатами для печати.
+
+    Одна конвертация LibreOffice ограничена по времени, поэтому
+    презентации собираются и конвертируются частями по BULK_CHUNK
+    слайдов, а готовые части склеиваются pdfunite. Возвращает путь
+    к итоговому PDF в workdir.
+    """
+    parts = []
+    for start in range(0, len(certificates), BULK_CHUNK):
+        part = os.path.join(workdir, f"part{start // BULK_CHUNK + 1:04d}")
+        render_merged_pptx(certificates[start:start + BULK_CHUNK], f"{part}.pptx")
+        # Серийные номера делают каждый файл уникальным - кэш не нужен.
+        convert_pptx_to_pdf(f"{part}.pptx", f"{part}.pdf", cache=False)
+        os.unlink(f"{part}.pptx")
+        parts.append(f"{part}.pdf")
+
+    pdf_path = os.path.join(workdir, 'certificates.pdf')
+    unite_pdfs(parts, pdf_path)
+    for part in parts:
+        if os.path.exists(part):
+            os.unlink(part)
+    return pdf_path
+
+
+def iter_certificate_pdfs(certificates: list[tuple[str, str]], workdir: str):
+    """
+    Отдаёт пары (имя в архиве, PDF) по мере готовности сертификатов.
+
+    PPTX заполняются и конвертируются пакетно (см. office.batch) без
+    кэша конвертаций (у каждого сертификата свой серийный номер) частями
+    по BULK_CHUNK строк; файлы части удаляются до начала следующей, так
+    что на диске одновременно лежит не больше одной части. Рабочий
+    каталог удаляется по завершении или при обрыве соединения.
+    """
+    try:
+        for start in range(0, len(certificates), BULK_CHUNK):
+            archive_names = {}
+            chunk = certificates[start:start + BULK_CHUNK]
+            for index, (name, price) in enumerate(chunk, start=start + 1):
+                pptx_path = os.path.join(workdir, f"{index:04d}.pptx")
+                fill_template(
+                    TEMPLATE_PATH,
+                    certificate_replacements(name, price, get_random_number()),
+                    pptx_path
+                )
+                archive_names[pptx_path] = (
+                    f"{index:03d}_{safe_filename(name, 'Сертификат')}.pdf"
+                )
+
+            pptx_paths = list(archive_names)
+            for pptx_path, pdf_path in iter_convert_to_pdf(pptx_paths, workdir, cache=False):
+                with open(pdf_path, 'rb') as pdf_file:
+                    data = pdf_file.read()
+                os.unlink(pdf_path)
+                os.unlink(pptx_path)
+                yield archive_names[pptx_path], data
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def bulk_cert_handler(
+    request: Request,
+    file: UploadFile = File(...),
+    output: str | None = Form(None)
+):
+    """
+    Обработчик массовой генерации сертификатов из таблицы.
+
+    Args:
+        request: FastAPI request object
+        file: Таблица CSV/XLSX со столбцами ФИО и Сумма
+        output: zip - архив отдельных PDF (по умолчанию),
+                pdf - один PDF со всеми сертификатами для печати
+    """
+    try:
+        if not os.path.exists(TEMPLATE_PATH):
+            raise FileNotFoundError(
+                f"Файл шаблона не найден: {TEMPLATE_PATH}"
+            )
+        if not file.filename:
+            raise ValueError("Файл не был загружен")
+
+        certificates = read_certificate_rows(file.filename, file.file.read())
+        output = (output or OUTPUT_ZIP).strip().lower()
+        if output not in (OUTPUT_ZIP, OUTPUT_PDF):
+            raise ValueError(f"Неизвестный формат результата: {output}")
+
+        workdir = make_work_dir('rit-certs-')
+
+        if output == OUTPUT_PDF:
+            def cleanup_workdir():
+                shutil.rmtree(workdir, ignore_errors=True)
+
+            try:
+                pdf_path = render_merged_pdf(certificates, workdir)
+            except Exception:
+                cleanup_workdir()
+                raise
+
+            background_tasks = BackgroundTasks()
+            background_tasks.add_task(cleanup_workdir)
+
+            return FileResponse(
+                path=pdf_path,
+                filename="Сертификаты.pdf",
+                media_type='application/pdf',
+                background=background_tasks
+            )
+
+        return StreamingFileResponse(
+            iter_zip(
+                iter_certificate_pdfs(certificates, workdir),
+                compression=zipfile.ZIP_STORED
+            ),
+            filename="Сертификаты.zip",
+            media_type='application/zip'
+        )
+
+    except Exception as e:
+        status = f"Ошибка генерации сертификатов: {str(e)}"
+        response = RedirectResponse(url="/gen_rit_cert", status_code=303)
+        encoded_status = base64.b64encode(status.encode('utf-8')).decode('ascii')
+        response.set_cookie("gen_cert_status", encoded_status, max_age=10)
+        return response
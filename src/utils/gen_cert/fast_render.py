@@ -0,0 +1,311 @@
+"""
+Быстрая генерация сертификата без LibreOffice.
+
+Сертификат отличается от шаблона только тремя строками (price, name,
+serial). Поэтому при старте приложения шаблон один раз превращается в
+фоновое изображение без этих строк, а из фигур шаблона запоминаются
+положение, выравнивание и шрифт каждого поля. На запрос остаётся только
+нарисовать три строки поверх готового фона и сохранить страницу в PDF.
+
+Если шаблон нельзя отрисовать этим способом (поле разбито на несколько
+абзацев, шрифт не найден и т.п.), быстрый режим отключается и сертификаты
+генерируются через LibreOffice, как раньше.
+
+Это необязательный режим пониженного качества, только растровый:
+страница - JPEG с разрешением CERT_FAST_DPI (200 dpi), текст в PDF нельзя
+выделить, при печати он менее чёткий, чем в векторном PDF, длинная
+строка уменьшается, а не переносится. Векторный фон с наложенным текстом
+не реализован: для этого нужна запись PDF со встроенными шрифтами
+(кириллица), которой в проекте нет. Поэтому режим включается явно
+(CERT_RENDER_MODE=fast), а по умолчанию сертификат, как и раньше, -
+векторный PDF LibreOffice.
+"""
+import io
+import json
+import logging
+import os
+import subprocess
+import threading
+import time
+from functools import lru_cache
+
+from PIL import Image, ImageDraw, ImageFont
+from pptx import Presentation
+from pptx.enum.dml import MSO_COLOR_TYPE
+from pptx.enum.text import MSO_ANCHOR, PP_ALIGN
+
+from src.utils.office import (
+    Substitutions,
+    find_libreoffice,
+    get_export_profile,
+    get_slot_runner,
+    profile_uri,
+    record_export,
+    scratch_dir,
+)
+
+
+logger = logging.getLogger(__name__)
+
+RENDER_MODE = os.getenv('CERT_RENDER_MODE', 'libreoffice')
+DPI = int(os.getenv('CERT_FAST_DPI', '200'))
+PLACEHOLDERS = ('price', 'name', 'serial')
+
+EMU_PER_INCH = 914400
+DEFAULT_MARGIN_X = 91440
+DEFAULT_MARGIN_Y = 45720
+
+
+class UnsupportedTemplate(Exception):
+    """Шаблон нельзя отрисовать без LibreOffice."""
+
+
+@lru_cache(maxsize=32)
+def find_font_file(family: str, bold: bool = False, italic: bool = False) -> str | None:
+    """Ищет файл шрифта через fontconfig."""
+    pattern = family
+    if bold:
+        pattern += ':bold'
+    if italic:
+        pattern += ':italic'
+    try:
+        result = subprocess.run(
+            ['fc-match', '--format=%{file}', pattern],
+            capture_output=True, text=True, timeout=5
+        )
+    except (FileNotFoundError, subprocess.TimeoutExpired):
+        return None
+    path = result.stdout.strip()
+    return path if result.returncode == 0 and os.path.exists(path) else None
+
+
+@lru_cache(maxsize=128)
+def load_font(family: str, bold: bool, italic: bool, size_px: int):
+    path = find_font_file(family, bold, italic)
+    if path is None:
+        raise UnsupportedTemplate(f"Шрифт не найден: {family}")
+    return ImageFont.truetype(path, size_px)
+
+
+class TextField:
+    """Текстовое поле шаблона с плейсхолдером и его оформлением."""
+
+    def __init__(self, shape, scale: float):
+        text_frame = shape.text_frame
+        paragraphs = [p for p in text_frame.paragraphs if p.runs]
+        if len(paragraphs) != 1:
+            raise UnsupportedTemplate(
+                "Поле с плейсхолдером должно состоять из одного абзаца"
+            )
+        paragraph = paragraphs[0]
+        run = next(
+            (r for r in paragraph.runs if any(k in r.text for k in PLACEHOLDERS)),
+            None
+        )
+        if run is None:
+            raise UnsupportedTemplate("Плейсхолдер разбит на несколько фрагментов")
+
+        font = run.font
+        if font.size is None or font.name is None:
+            raise UnsupportedTemplate("У поля не задан явный шрифт или размер")
+        if font.color and font.color.type not in (None, MSO_COLOR_TYPE.RGB):
+            raise UnsupportedTemplate("Цвет поля задан через тему оформления")
+
+        styles = {
+            (r.font.name, r.font.size, r.font.bold, r.font.italic)
+            for r in paragraph.runs if r.text.strip()
+        }
+        if len(styles) > 1:
+            raise UnsupportedTemplate("В поле смешаны разные шрифты")
+
+        self.text = ''.join(r.text for r in paragraph.runs)
+        self.alignment = paragraph.alignment or PP_ALIGN.LEFT
+        self.anchor = text_frame.vertical_anchor or MSO_ANCHOR.TOP
+        self.color = (
+            tuple(font.color.rgb)
+            if font.color and font.color.type == MSO_COLOR_TYPE.RGB
+            else (0, 0, 0)
+        )
+
+        def margin(value, default):
+            return (default if value is None else value) * scale
+
+        self.left = shape.left * scale + margin(text_frame.margin_left, DEFAULT_MARGIN_X)
+        self.right = (shape.left + shape.width) * scale - margin(text_frame.margin_right, DEFAULT_MARGIN_X)
+        self.top = shape.top * scale + margin(text_frame.margin_top, DEFAULT_MARGIN_Y)
+        self.bottom = (shape.top + shape.height) * scale - margin(text_frame.margin_bottom, DEFAULT_MARGIN_Y)
+
+        self.size_px = max(1, round(font.size.pt * DPI / 72))
+        self.family = font.name
+        self.bold = bool(font.bold)
+        self.italic = bool(font.italic)
+        self.font = load_font(self.family, self.bold, self.italic, self.size_px)
+
+    def fill(self, replacements: dict) -> str:
+        return Substitutions(replacements).sub(self.text)
+
+    def draw(self, draw: ImageDraw.ImageDraw, text: str) -> None:
+        font = self.font
+        width = self.right - self.left
+        size = self.size_px
+        while size > 6 and font.getlength(text) > width:
+            size = int(size * 0.95)
+            font = load_font(self.family, self.bold, self.italic, size)
+
+        ascent, descent = font.getmetrics()
+        line_height = ascent + descent
+        if self.anchor == MSO_ANCHOR.MIDDLE:
+            y = (self.top + self.bottom - line_height) / 2
+        elif self.anchor == MSO_ANCHOR.BOTTOM:
+            y = self.bottom - line_height
+        else:
+            y = self.top
+
+        if self.alignment == PP_ALIGN.CENTER:
+            x, anchor = (self.left + self.right) / 2, 'ma'
+        elif self.alignment == PP_ALIGN.RIGHT:
+            x, anchor = self.right, 'ra'
+        else:
+            x, anchor = self.left, 'la'
+        draw.text((x, y), text, font=font, fill=self.color, anchor=anchor)
+
+
+def render_background(pptx_path: str, width_px: int, height_px: int) -> Image.Image:
+    """Растеризует первый слайд презентации через LibreOffice."""
+    binary = find_libreoffice()
+    if binary is None:
+        raise UnsupportedTemplate("LibreOffice не найден")
+    filter_options = json.dumps({
+        'PixelWidth': {'type': 'long', 'value': str(width_px)},
+        'PixelHeight': {'type': 'long', 'value': str(height_px)},
+    })
+    outdir = os.path.dirname(pptx_path)
+    with get_slot_runner().slot() as profile_dir:
+        result = subprocess.run(
+            [
+                binary,
+                profile_uri(profile_dir),
+                '--headless',
+                '--convert-to', f'png:impress_png_Export:{filter_options}',
+                '--outdir', outdir,
+                pptx_path
+            ],
+            capture_output=True, text=True, timeout=60
+        )
+        png_path = os.path.splitext(pptx_path)[0] + '.png'
+        if result.returncode != 0 or not os.path.exists(png_path):
+            raise UnsupportedTemplate(f"Не удалось получить фон: {result.stderr}")
+    with Image.open(png_path) as image:
+        return image.convert('RGB')
+
+
+class FastCertificateRenderer:
+    """Рисует поля сертификата поверх заранее подготовленного фона."""
+
+    def __init__(self, template_path: str, background: Image.Image | None = None):
+        self.template_path = template_path
+        self.signature = _template_signature(template_path)
+        prs = Presentation(template_path)
+        width_px = round(prs.slide_width * DPI / EMU_PER_INCH)
+        height_px = round(prs.slide_height * DPI / EMU_PER_INCH)
+        scale = width_px / prs.slide_width
+
+        self.fields = []
+        slide = prs.slides[0]
+        for shape in slide.shapes:
+            if shape.has_text_frame and any(k in shape.text_frame.text for k in PLACEHOLDERS):
+                self.fields.append(TextField(shape, scale))
+                shape.text_frame.clear()
+        if not self.fields:
+            raise UnsupportedTemplate("В шаблоне нет плейсхолдеров")
+
+        if background is None:
+            with scratch_dir('rit-cert-bg-') as workdir:
+                blank_path = os.path.join(workdir, 'background.pptx')
+                prs.save(blank_path)
+                background = render_background(blank_path, width_px, height_px)
+        self.background = background
+
+    def render(self, replacements: dict, export=None) -> bytes:
+        """
+        Возвращает PDF сертификата с подставленными значениями.
+
+        export - профиль экспорта (см. pdf_export.py): задаёт разрешение
+        и качество JPEG страницы.
+        """
+        export = export or get_export_profile()
+        started = time.monotonic()
+        image = self.background.copy()
+        draw = ImageDraw.Draw(image)
+        for field in self.fields:
+            field.draw(draw, field.fill(replacements))
+
+        resolution = DPI
+        if export.image_dpi and export.image_dpi < DPI:
+            resolution = export.image_dpi
+            image = image.resize(
+                (round(image.width * resolution / DPI), round(image.height * resolution / DPI)),
+                Image.LANCZOS
+            )
+        output = io.BytesIO()
+        image.save(
+            output, 'PDF',
+            resolution=resolution,
+            quality=export.jpeg_quality,
+            subsampling=0 if export.jpeg_quality >= 95 else -1
+        )
+        pdf_data = output.getvalue()
+        record_export(export.name, time.monotonic() - started, len(pdf_data))
+        return pdf_data
+
+
+def _template_signature(path: str):
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_ino, stat.st_size
+
+
+_renderer: FastCertificateRenderer | None = None
+_lock = threading.Lock()
+
+
+def prepare_fast_renderer(template_path: str) -> FastCertificateRenderer | None:
+    """Готовит быстрый рендерер; при неудаче остаётся режим LibreOffice."""
+    global _renderer
+    if RENDER_MODE != 'fast' or not os.path.exists(template_path):
+        return None
+    with _lock:
+        try:
+            _renderer = FastCertificateRenderer(template_path)
+            logger.info(
+                "Быстрый режим сертификатов: растровые PDF %d dpi без LibreOffice", DPI
+            )
+        except Exception as e:
+            logger.warning("Быстрый режим сертификатов отключён: %s", e)
+            _renderer = None
+        return _renderer
+
+
+def prepare_fast_renderer_async(template_path: str) -> None:
+    threading.Thread(
+        target=prepare_fast_renderer, args=(template_path,), daemon=True
+    ).start()
+
+
+def get_fast_renderer() -> FastCertificateRenderer | None:
+    """
+    Возвращает готовый рендерер, если шаблон с момента подготовки
+    не менялся. При замене шаблона рендерер пересобирается в фоне.
+    """
+    global _renderer
+    renderer = _renderer
+    if renderer is None:
+        return None
+    try:
+        signature = _template_signature(renderer.template_path)
+    except OSError:
+        signature = None
+    if signature != renderer.signature:
+        _renderer = None
+        prepare_fast_renderer_async(renderer.template_path)
+        return None
+    return renderer
@@ -1,11 +1,35 @@
 import os
 import random
-import tempfile
 import base64
 import subprocess
-from fastapi import Form, Request, BackgroundTasks
-from fastapi.responses import FileResponse, RedirectResponse
-from pptx import Presentation
+import time
+from fastapi import Form, Request
+from fastapi.responses import RedirectResponse
+
+from src.utils.office import (
+    conversion_key,
+    find_libreoffice,
+    get_export_profile,
+    get_conversion_cache,
+    get_pool,
+    get_slot_runner,
+    linearize_pdf,
+    profile_uri,
+    record_export,
+    render_template,
+    reset_converter,
+    scratch_dir,
+    Substitutions,
+    LIBREOFFICE_NOT_FOUND,
+)
+from src.utils.gen_cert.fast_render import get_fast_renderer
+from src.utils.responses import MemoryFileResponse
+
+
+TEMPLATE_PATH = os.path.join(
+    os.path.dirname(__file__),
+    'Сертификат_шаблон.pptx'
+)
 
 
 def get_random_number():
@@ -13,134 +37,151 @@ def get_random_number():
     return random.randint(100000, 999999)
 
 
-def convert_pptx_to_pdf(pptx_path, pdf_path):
-    """Конвертирует PPTX файл в PDF используя LibreOffice."""
-    try:
-        libreoffice_paths = [
-            'libreoffice',
-            '/usr/bin/libreoffice',
-            '/usr/local/bin/libreoffice',
-            '/snap/bin/libreoffice',
-            '/opt/libreoffice/program/soffice',
-            '/Applications/LibreOffice.app/Contents/MacOS/soffice'
-        ]
-        libreoffice_cmd = None
-
-        for path in libreoffice_paths:
-            try:
-                result = subprocess.run(
-                    [path, '--version'], capture_output=True, timeout=5
-                )
-                if result.returncode == 0:
-                    libreoffice_cmd = path
-                    break
-            except (FileNotFoundError, subprocess.TimeoutExpired):
-                continue
-
-        if not libreoffice_cmd:
-            raise Exception(
-                "LibreOffice не найден. Установите LibreOffice:\n"
-                "Ubuntu/Debian: sudo apt-get install libreoffice\n"
-                "CentOS/RHEL: sudo yum install libreoffice\n"
-                "macOS: brew install --cask libreoffice"
-            )
+def _convert_in_slot(pptx_path, pdf_path, export):
+    """Конвертирует файл отдельным процессом soffice в свободном слоте."""
+    libreoffice_cmd = find_libreoffice()
 
+    if not libreoffice_cmd:
+        raise Exception(LIBREOFFICE_NOT_FOUND)
+
+    with get_slot_runner().slot() as profile_dir:
         cmd = [
             libreoffice_cmd,
+            profile_uri(profile_dir),
             '--headless',
-            '--convert-to', 'pdf',
+            '--convert-to', export.convert_to(),
             '--outdir', os.path.dirname(pdf_path),
             pptx_path
         ]
 
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
+        try:
+            result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
+        except FileNotFoundError:
+            reset_converter()
+            raise Exception(LIBREOFFICE_NOT_FOUND)
 
+        # Проверки внутри слота: при ошибке его профиль будет пересоздан.
         if result.returncode != 0:
             raise Exception(f"LibreOffice error: {result.stderr}")
 
-
         base_name = os.path.splitext(os.path.basename(pptx_path))[0]
         generated_pdf = os.path.join(os.path.dirname(pdf_path), f"{base_name}.pdf")
 
         if not os.path.exists(generated_pdf):
             raise Exception("PDF файл не был создан")
 
-        if generated_pdf != pdf_path:
-            os.rename(generated_pdf, pdf_path)
+    if generated_pdf != pdf_path:
+        os.rename(generated_pdf, pdf_path)
 
-    except subprocess.TimeoutExpired:
-        raise Exception("Превышено время ожидания конвертации")
-    except Exception as e:
-        raise Exception(f"Ошибка конвертации: {str(e)}")
 
+def convert_pptx_to_pdf(pptx_path, pdf_path, profile=None, cache=True):
+    """
+    Конвертирует PPTX файл в PDF используя LibreOffice.
 
-def gen_cert_handler(
-    request: Request,
-    name: str | None = Form(None),
-    price: str | None = Form(None)
-):
-    """Обработчик для генерации сертификатов"""
+    Сначала результат ищется в кэше конвертаций по содержимому PPTX
+    и профилю экспорта (см. pdf_export.py). С cache=False кэш не
+    используется: для документов, которые не повторяются (сертификаты
+    со случайным серийным номером), ключ не вычисляется и копия PDF
+    в кэш не пишется. Если запущен пул LibreOffice,
+    конвертация выполняется свободным экземпляром пула, иначе запускается
+    отдельный процесс soffice в свободном слоте со своим профилем, чтобы
+    параллельные конвертации не мешали друг другу.
+    """
     try:
-        template_path = os.path.join(
-            os.path.dirname(__file__),
-            'Сертификат_шаблон.pptx'
-        )
-
-        if not os.path.exists(template_path):
-            raise FileNotFoundError(
-                f"Файл шаблона не найден: {template_path}"
-            )
+        export = get_export_profile(profile)
+        started = time.monotonic()
+        conversions = get_conversion_cache()
+        cache_key = conversion_key(pptx_path, export.variant) if cache else None
+        if cache_key is not None and conversions.get(cache_key, pdf_path):
+            record_export(export.name, 0.0, 0, cached=True)
+            return
+
+        pool = get_pool()
+        if pool is not None:
+            pool.convert(pptx_path, pdf_path, export.filter_data)
+        else:
+            _convert_in_slot(pptx_path, pdf_path, export)
+        if export.linearize:
+            linearize_pdf(pdf_path)
+
+        if cache_key is not None:
+            conversions.put(cache_key, pdf_path)
+        size = os.path.getsize(pdf_path) if os.path.exists(pdf_path) else 0
+        record_export(export.name, time.monotonic() - started, size)
 
-        name_value = name.strip() if name else ""
-        price_value = price.strip() if price else ""
-        serial_number = get_random_number()
-        prs = Presentation(template_path)
-
-        replacements = {
-            'price': f"{price_value} ₽" if price_value and price_value.isdigit() else price_value,
-            'name': str(name_value),
-            'serial': str(serial_number),
-        }
-
-        slide = prs.slides[0]
-        for shape in slide.shapes:
-            if not shape.has_text_frame:
-                continue
-            for paragraph in shape.text_frame.paragraphs:
-                for run in paragraph.runs:
-                    for key, value in replacements.items():
-                        if key in run.text:
-                            run.text = run.text.replace(key, value)
+    except subprocess.TimeoutExpired:
+        raise Exception("Превышено время ожидания конвертации")
+    except Exception as e:
+        raise Exception(f"Ошибка конвертации: {str(e)}")
 
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pptx') as temp_pptx:
-            temp_pptx_path = temp_pptx.name
 
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp_pdf:
-            temp_pdf_path = temp_pdf.name
+def convert_pptx_bytes_to_pdf(pptx_data: bytes, profile=None, cache=True) -> bytes:
+    """
+    Конвертирует PPTX из памяти и возвращает PDF.
 
-        prs.save(temp_pptx_path)
+    LibreOffice нужны пути к файлам, поэтому промежуточные файлы
+    создаются в рабочем каталоге в tmpfs и сразу удаляются.
+    """
+    with scratch_dir('rit-cert-') as workdir:
+        pptx_path = os.path.join(workdir, 'document.pptx')
+        pdf_path = os.path.join(workdir, 'document.pdf')
+        with open(pptx_path, 'wb') as pptx_file:
+            pptx_file.write(pptx_data)
+        convert_pptx_to_pdf(pptx_path, pdf_path, profile, cache)
+        with open(pdf_path, 'rb') as pdf_file:
+            return pdf_file.read()
 
-        convert_pptx_to_pdf(temp_pptx_path, temp_pdf_path)
 
-        output_filename = "Сертификат.pdf"
+def certificate_replacements(name: str | None, price: str | None, serial) -> dict:
+    """Значения для подстановки в шаблон сертификата."""
+    name_value = name.strip() if name else ""
+    price_value = price.strip() if price else ""
+    return {
+        'price': f"{price_value} ₽" if price_value and price_value.isdigit() else price_value,
+        'name': str(name_value),
+        'serial': str(serial),
+    }
 
-        def cleanup_temp_files():
-            try:
-                os.unlink(temp_pptx_path)
-                os.unlink(temp_pdf_path)
-            except OSError:
-                pass
 
-        media_type = 'application/pdf'
+def fill_slide(slide, replacements: dict) -> int:
+    """Подставляет значения в текст всех фигур слайда, возвращает число замен."""
+    return Substitutions(replacements).apply_shapes(slide.shapes)
 
-        background_tasks = BackgroundTasks()
-        background_tasks.add_task(cleanup_temp_files)
 
-        return FileResponse(
-            path=temp_pdf_path,
-            filename=output_filename,
-            media_type=media_type,
-            background=background_tasks
+def gen_cert_handler(
+    request: Request,
+    name: str | None = Form(None),
+    price: str | None = Form(None),
+    profile: str | None = None
+):
+    """
+    Обработчик для генерации сертификатов.
+
+    Если включён и готов быстрый рендерер (CERT_RENDER_MODE=fast, см.
+    fast_render.py), PDF рисуется в процессе без LibreOffice растровой
+    страницей пониженного качества, иначе шаблон конвертируется
+    LibreOffice в векторный PDF.
+    PDF собирается в памяти и отдаётся без временных файлов.
+    profile - имя профиля экспорта PDF (screen, print, ...); профили без
+    растрового вывода (print) всегда идут через LibreOffice.
+    """
+    try:
+        export = get_export_profile(profile)
+        serial_number = get_random_number()
+        replacements = certificate_replacements(name, price, serial_number)
+        renderer = get_fast_renderer() if export.raster else None
+
+        if renderer is not None:
+            pdf_data = renderer.render(replacements, export)
+        else:
+            pptx_data = render_template(TEMPLATE_PATH, replacements)
+            # Серийный номер каждый раз новый - кэш не поможет.
+            pdf_data = convert_pptx_bytes_to_pdf(pptx_data, export.name, cache=False)
+
+        return MemoryFileResponse(
+            content=pdf_data,
+            filename="Сертификат.pdf",
+            media_type='application/pdf'
         )
 
     except Exception as e:
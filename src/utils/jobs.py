@@ -0,0 +1,422 @@
+"""
+Фоновые задачи генерации документов.
+
+По умолчанию /gen_rit_cert, /doctor_form и /remove_bg работают как раньше:
+файл отдаётся в ответ на запрос. Если клиент просит асинхронный режим
+(заголовок «Prefer: respond-async» или параметр ?async=1), обработчик
+ставится в очередь ограниченного пула потоков, а клиент сразу получает
+202 с номером задачи и ссылками:
+
+    /jobs/{id}         - состояние задачи (JSON, для опроса)
+    /jobs/{id}/events  - то же в виде Server-Sent Events
+    /jobs/{id}/result  - готовый файл
+
+Потоковый ответ обработчика (StreamingFileResponse: ZIP по страницам и
+т.п.) задача записывает в файл на диске, читая его синхронный генератор
+в своём потоке. Заголовки X-* ответа (X-Page-Count, X-Output-Format...)
+сохраняются и отдаются вместе с результатом.
+
+Готовые результаты хранятся JOB_RESULT_TTL секунд, после чего задача
+удаляется вместе с временными файлами и результатом в памяти. Истёкшие
+задачи удаляет фоновый поток раз в JOB_SWEEP_INTERVAL секунд, не дожидаясь
+следующего обращения к API. Общий объём хранимых результатов ограничен
+JOB_MAX_RESULT_MB: пока он превышен, новые задачи не принимаются (503),
+иначе клиент, забирающий задачи быстрее, чем они истекают, мог бы занять
+сколько угодно памяти.
+"""
+import asyncio
+import base64
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.cookies import SimpleCookie
+
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
+
+from src.utils.office import make_work_dir
+from src.utils.responses import MemoryFileResponse, StreamingFileResponse, attachment_headers
+
+
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', str(os.cpu_count() or 2)))
+JOB_MAX_PENDING = int(os.getenv('JOB_MAX_PENDING', '100'))
+JOB_RESULT_TTL = int(os.getenv('JOB_RESULT_TTL', '600'))
+JOB_SWEEP_INTERVAL = float(os.getenv('JOB_SWEEP_INTERVAL', '30'))
+JOB_MAX_RESULT_MB = int(os.getenv('JOB_MAX_RESULT_MB', '512'))
+EVENTS_POLL_INTERVAL = 0.25
+RETRY_AFTER = 5
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+FINISHED = (DONE, FAILED)
+
+
+class JobQueueFull(Exception):
+    """Очередь задач или хранилище их результатов заполнено."""
+
+
+class Job:
+    """Задача генерации и её результат."""
+
+    def __init__(self, kind: str, ttl: int = JOB_RESULT_TTL):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.ttl = ttl
+        self.status = QUEUED
+        self.error: str | None = None
+        self.created = time.time()
+        self.started: float | None = None
+        self.finished: float | None = None
+        self.result_path: str | None = None
+        self.result_body: bytes | None = None
+        self.result_size = 0
+        self.filename: str | None = None
+        self.media_type: str | None = None
+        self.headers: dict[str, str] = {}
+        self.version = 0
+        self._cleanup = None
+
+    def to_dict(self, position: int | None = None) -> dict:
+        data = {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'error': self.error,
+            'created': self.created,
+            'finished': self.finished,
+            'status_url': f'/jobs/{self.id}',
+            'events_url': f'/jobs/{self.id}/events',
+        }
+        if position is not None:
+            data['position'] = position
+        if self.status == DONE:
+            data['result_url'] = f'/jobs/{self.id}/result'
+            data['filename'] = self.filename
+            data['expires'] = self.finished + self.ttl
+        return data
+
+    def cleanup(self) -> None:
+        if self._cleanup is not None:
+            cleanup, self._cleanup = self._cleanup, None
+            _run_background(cleanup)
+
+
+def _run_background(background) -> None:
+    """Выполняет BackgroundTasks/BackgroundTask ответа синхронно."""
+    tasks = getattr(background, 'tasks', None) or [background]
+    for task in tasks:
+        try:
+            task.func(*task.args, **task.kwargs)
+        except Exception:
+            pass
+
+
+def _result_headers(response) -> dict[str, str]:
+    """Заголовки X-* ответа обработчика, которые сохраняются с результатом."""
+    return {
+        name: value for name, value in response.headers.items()
+        if name.lower().startswith('x-')
+    }
+
+
+def _store_stream(response: StreamingFileResponse) -> tuple[str, int]:
+    """
+    Записывает тело потокового ответа из его генератора в файл на диске
+    (в потоке задачи). Возвращает путь к файлу и его размер.
+    """
+    workdir = make_work_dir('rit-job-')
+    path = os.path.join(workdir, 'result')
+    size = 0
+    try:
+        with open(path, 'wb') as result:
+            for chunk in response.chunks:
+                result.write(chunk)
+                size += len(chunk)
+    except Exception:
+        shutil.rmtree(workdir, ignore_errors=True)
+        raise
+    finally:
+        if response.background is not None:
+            _run_background(response.background)
+    return path, size
+
+
+def _redirect_error(response) -> str:
+    """Текст ошибки из cookie статуса, которую ставит обработчик при редиректе."""
+    cookie = SimpleCookie()
+    for name, value in response.raw_headers:
+        if name == b'set-cookie':
+            cookie.load(value.decode('latin-1'))
+    for morsel in cookie.values():
+        try:
+            return base64.b64decode(morsel.value.encode('ascii')).decode('utf-8')
+        except Exception:
+            continue
+    return "Ошибка обработки задачи"
+
+
+class JobManager:
+    """Очередь задач с ограниченным пулом потоков и сроком хранения результатов."""
+
+    def __init__(
+        self,
+        workers: int = JOB_WORKERS,
+        max_pending: int = JOB_MAX_PENDING,
+        ttl: int = JOB_RESULT_TTL,
+        sweep_interval: float = JOB_SWEEP_INTERVAL,
+        max_result_bytes: int = JOB_MAX_RESULT_MB * 1024 * 1024
+    ):
+        self.workers = max(1, workers)
+        self.max_pending = max_pending
+        self.ttl = ttl
+        self.max_result_bytes = max_result_bytes
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix='rit-job'
+        )
+        self._jobs: dict[str, Job] = {}
+        self._queue: list[str] = []
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        threading.Thread(
+            target=self._sweep, args=(sweep_interval,),
+            name='rit-job-sweeper', daemon=True
+        ).start()
+
+    def _sweep(self, interval: float) -> None:
+        """Периодически удаляет истёкшие задачи до остановки менеджера."""
+        while not self._stopped.wait(interval):
+            try:
+                self.expire()
+            except Exception:
+                pass
+
+    def submit(self, kind: str, func, *args, **kwargs) -> Job:
+        """
+        Ставит обработчик в очередь.
+
+        Обработчик должен вернуть FileResponse/MemoryFileResponse,
+        StreamingFileResponse (тело собирается из его генератора) или
+        RedirectResponse с cookie статуса (как обработчики форм).
+
+        Raises:
+            JobQueueFull: Если в очереди уже max_pending задач или
+                          хранимые результаты занимают max_result_bytes
+        """
+        self.expire()
+        job = Job(kind, self.ttl)
+        with self._lock:
+            pending = sum(1 for item in self._jobs.values() if item.status not in FINISHED)
+            if pending >= self.max_pending:
+                raise JobQueueFull("Очередь задач заполнена")
+            if self._result_bytes() >= self.max_result_bytes:
+                raise JobQueueFull("Хранилище результатов задач заполнено")
+            self._jobs[job.id] = job
+            self._queue.append(job.id)
+        self._executor.submit(self._run, job, func, args, kwargs)
+        return job
+
+    def _run(self, job: Job, func, args, kwargs) -> None:
+        with self._lock:
+            if job.id in self._queue:
+                self._queue.remove(job.id)
+            job.status = RUNNING
+            job.started = time.time()
+            job.version += 1
+        try:
+            response = func(*args, **kwargs)
+            if isinstance(response, MemoryFileResponse):
+                job.result_body = response.body
+                job.result_size = len(response.body)
+                job.filename = response.filename
+                job.media_type = response.media_type
+                job.headers = _result_headers(response)
+                status, error = DONE, None
+            elif isinstance(response, FileResponse):
+                job.result_path = response.path
+                job.result_size = os.path.getsize(response.path)
+                job.filename = response.filename
+                job.media_type = response.media_type
+                job._cleanup = response.background
+                status, error = DONE, None
+            elif isinstance(response, StreamingFileResponse):
+                job.result_path, job.result_size = _store_stream(response)
+                job._cleanup = BackgroundTask(
+                    shutil.rmtree, os.path.dirname(job.result_path), ignore_errors=True
+                )
+                job.filename = response.filename
+                job.media_type = response.media_type
+                job.headers = _result_headers(response)
+                status, error = DONE, None
+            else:
+                status, error = FAILED, _redirect_error(response)
+        except Exception as e:
+            status, error = FAILED, str(e)
+        with self._lock:
+            job.status = status
+            job.error = error
+            job.finished = time.time()
+            job.version += 1
+
+    def _result_bytes(self) -> int:
+        """Объём хранимых результатов (вызывается под self._lock)."""
+        return sum(job.result_size for job in self._jobs.values())
+
+    def get(self, job_id: str) -> Job | None:
+        self.expire()
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def position(self, job: Job) -> int | None:
+        with self._lock:
+            if job.id in self._queue:
+                return self._queue.index(job.id) + 1
+        return None
+
+    def expire(self) -> None:
+        """Удаляет задачи, результаты которых хранятся дольше ttl."""
+        now = time.time()
+        with self._lock:
+            expired = [
+                job for job in self._jobs.values()
+                if job.finished is not None and now - job.finished > self.ttl
+            ]
+            for job in expired:
+                del self._jobs[job.id]
+        for job in expired:
+            job.cleanup()
+
+    def shutdown(self) -> None:
+        self._stopped.set()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        with self._lock:
+            jobs = list(self._jobs.values())
+            self._jobs.clear()
+            self._queue.clear()
+        for job in jobs:
+            job.cleanup()
+
+    def stats(self) -> dict:
+        self.expire()
+        with self._lock:
+            statuses = [job.status for job in self._jobs.values()]
+            result_bytes = self._result_bytes()
+        return {
+            'workers': self.workers,
+            'max_pending': self.max_pending,
+            'result_ttl': self.ttl,
+            'result_bytes': result_bytes,
+            'max_result_bytes': self.max_result_bytes,
+            **{status: statuses.count(status) for status in (QUEUED, RUNNING, DONE, FAILED)},
+        }
+
+
+_manager: JobManager | None = None
+_manager_lock = threading.Lock()
+
+
+def get_job_manager() -> JobManager:
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = JobManager()
+        return _manager
+
+
+def stop_jobs() -> None:
+    """Останавливает пул задач и удаляет их файлы (при остановке приложения)."""
+    global _manager
+    with _manager_lock:
+        manager, _manager = _manager, None
+    if manager is not None:
+        manager.shutdown()
+
+
+def wants_async(request) -> bool:
+    """Клиент просит вернуть номер задачи вместо готового файла."""
+    if request.query_params.get('async', '').lower() in ('1', 'true', 'yes'):
+        return True
+    return 'respond-async' in request.headers.get('prefer', '').lower()
+
+
+def submit_job_response(kind: str, func, *args, **kwargs):
+    """Ставит задачу и возвращает 202 со ссылками на её состояние."""
+    try:
+        job = get_job_manager().submit(kind, func, *args, **kwargs)
+    except JobQueueFull as e:
+        return JSONResponse(
+            {'error': str(e)},
+            status_code=503,
+            headers={'Retry-After': str(RETRY_AFTER)}
+        )
+    return JSONResponse(
+        job.to_dict(position=get_job_manager().position(job)),
+        status_code=202,
+        headers={'Location': f'/jobs/{job.id}'}
+    )
+
+
+def _not_found():
+    return JSONResponse({'error': "Задача не найдена или срок её хранения истёк"}, status_code=404)
+
+
+def job_status_response(job_id: str):
+    manager = get_job_manager()
+    job = manager.get(job_id)
+    if job is None:
+        return _not_found()
+    return JSONResponse(job.to_dict(position=manager.position(job)))
+
+
+def job_events_response(job_id: str):
+    """Поток Server-Sent Events с состоянием задачи до её завершения."""
+    manager = get_job_manager()
+    job = manager.get(job_id)
+    if job is None:
+        return _not_found()
+
+    async def events():
+        version = None
+        position = None
+        while True:
+            current_position = manager.position(job)
+            if job.version != version or current_position != position:
+                version, position = job.version, current_position
+                data = json.dumps(job.to_dict(position=position), ensure_ascii=False)
+                yield f"event: {job.status}\ndata: {data}\n\n"
+                if job.status in FINISHED:
+                    return
+            await asyncio.sleep(EVENTS_POLL_INTERVAL)
+
+    return StreamingResponse(
+        events(),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+def job_result_response(job_id: str):
+    job = get_job_manager().get(job_id)
+    if job is None:
+        return _not_found()
+    if job.status != DONE:
+        return JSONResponse(job.to_dict(), status_code=409)
+    if job.result_body is not None:
+        return MemoryFileResponse(
+            content=job.result_body,
+            filename=job.filename or 'result',
+            media_type=job.media_type,
+            headers=job.headers
+        )
+    if not job.result_path or not os.path.exists(job.result_path):
+        return JSONResponse(job.to_dict(), status_code=409)
+    return FileResponse(
+        path=job.result_path,
+        media_type=job.media_type,
+        headers={**attachment_headers(job.filename or 'result'), **job.headers}
+    )
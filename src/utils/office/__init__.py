@@ -0,0 +1,49 @@
+from .libreoffice import (
+    find_libreoffice,
+    discover_converter,
+    reset_converter,
+    LIBREOFFICE_NOT_FOUND,
+)
+from .profiles import get_slot_runner, profile_uri, warm_template, remove_profiles
+from .conversion_cache import conversion_key, get_conversion_cache
+from .pdf_export import (
+    EXPORT_PROFILES,
+    export_stats,
+    get_export_profile,
+    linearize_pdf,
+    record_export,
+)
+from .templates import fill_template, load_package, load_template, render_template
+from .scratch import make_scratch_dir, make_work_dir, scratch_dir
+from .substitution import Substitutions
+from .libreoffice_pool import start_pool, stop_pool, get_pool, converter_status
+
+__all__ = [
+    'find_libreoffice',
+    'discover_converter',
+    'reset_converter',
+    'LIBREOFFICE_NOT_FOUND',
+    'conversion_key',
+    'get_conversion_cache',
+    'EXPORT_PROFILES',
+    'export_stats',
+    'get_export_profile',
+    'linearize_pdf',
+    'record_export',
+    'load_template',
+    'load_package',
+    'fill_template',
+    'render_template',
+    'make_scratch_dir',
+    'make_work_dir',
+    'scratch_dir',
+    'Substitutions',
+    'get_slot_runner',
+    'profile_uri',
+    'warm_template',
+    'remove_profiles',
+    'start_pool',
+    'stop_pool',
+    'get_pool',
+    'converter_status',
+]
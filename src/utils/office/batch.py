@@ -0,0 +1,145 @@
+"""
+Пакетная конвертация PPTX -> PDF.
+
+Уже сконвертированные ранее файлы берутся из кэша конвертаций.
+Если запущен пул LibreOffice, файлы распределяются по его экземплярам.
+Иначе файлы делятся на группы (не больше BATCH_CHUNK файлов), и каждая
+группа конвертируется одним запуском soffice - так стоимость запуска офиса
+делится на все файлы группы, а группы идут параллельно по слотам.
+"""
+import math
+import os
+import subprocess
+import time
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from src.utils.office.conversion_cache import conversion_key, get_conversion_cache
+from src.utils.office.libreoffice import LIBREOFFICE_NOT_FOUND, find_libreoffice
+from src.utils.office.libreoffice_pool import get_pool
+from src.utils.office.pdf_export import (
+    ExportProfile,
+    get_export_profile,
+    linearize_pdf,
+    record_export,
+)
+from src.utils.office.profiles import get_slot_runner, profile_uri
+
+
+BATCH_CHUNK = int(os.getenv('LIBREOFFICE_BATCH_CHUNK', '20'))
+
+
+def _pdf_path(pptx_path: str, outdir: str) -> str:
+    base_name = os.path.splitext(os.path.basename(pptx_path))[0]
+    return os.path.join(outdir, f"{base_name}.pdf")
+
+
+def _convert_group(
+    binary: str, group: list[str], outdir: str, export: ExportProfile
+) -> list[str]:
+    with get_slot_runner().slot() as profile_dir:
+        cmd = [
+            binary,
+            profile_uri(profile_dir),
+            '--headless',
+            '--convert-to', export.convert_to(),
+            '--outdir', outdir,
+            *group
+        ]
+        result = subprocess.run(
+            cmd, capture_output=True, text=True, timeout=30 + 5 * len(group)
+        )
+        if result.returncode != 0:
+            raise Exception(f"LibreOffice error: {result.stderr}")
+    return group
+
+
+def iter_convert_to_pdf(
+    pptx_paths: list[str],
+    outdir: str,
+    profile: str | None = None,
+    cache: bool = True
+) -> Iterator[tuple[str, str]]:
+    """
+    Конвертирует файлы и отдаёт пары (pptx, pdf) по мере готовности.
+
+    Args:
+        pptx_paths: Пути к исходным PPTX (имена файлов должны различаться)
+        outdir: Каталог для PDF
+        profile: Имя профиля экспорта PDF (см. pdf_export.py)
+        cache: Искать и сохранять результаты в кэше конвертаций; False -
+               для файлов, которые не повторяются (сертификаты)
+    """
+    export = get_export_profile(profile)
+    conversions = get_conversion_cache()
+    cache_keys = {}
+    pending = []
+    for path in pptx_paths:
+        cache_key = conversion_key(path, export.variant) if cache else None
+        if cache_key is not None and conversions.get(cache_key, _pdf_path(path, outdir)):
+            record_export(export.name, 0.0, 0, cached=True)
+            yield path, _pdf_path(path, outdir)
+            continue
+        cache_keys[path] = cache_key
+        pending.append(path)
+
+    if not pending:
+        return
+
+    previous = time.monotonic()
+    for path, pdf_path in _iter_convert(pending, outdir, export):
+        if export.linearize:
+            linearize_pdf(pdf_path)
+        if cache_keys[path] is not None:
+            conversions.put(cache_keys[path], pdf_path)
+        # Файлы конвертируются параллельно, поэтому на файл записывается
+        # время с момента готовности предыдущего (в сумме - время пакета).
+        now = time.monotonic()
+        record_export(
+            export.name,
+            now - previous,
+            os.path.getsize(pdf_path) if os.path.exists(pdf_path) else 0
+        )
+        previous = now
+        yield path, pdf_path
+
+
+def _iter_convert(
+    pptx_paths: list[str], outdir: str, export: ExportProfile
+) -> Iterator[tuple[str, str]]:
+    pool = get_pool()
+    if pool is not None:
+        with ThreadPoolExecutor(max_workers=pool.size) as executor:
+            futures = {
+                executor.submit(
+                    pool.convert, path, _pdf_path(path, outdir), export.filter_data
+                ): path
+                for path in pptx_paths
+            }
+            for future in as_completed(futures):
+                future.result()
+                path = futures[future]
+                yield path, _pdf_path(path, outdir)
+        return
+
+    binary = find_libreoffice()
+    if binary is None:
+        raise Exception(LIBREOFFICE_NOT_FOUND)
+
+    slots = get_slot_runner().slots
+    chunk = max(1, min(BATCH_CHUNK, math.ceil(len(pptx_paths) / slots)))
+    groups = [
+        pptx_paths[start:start + chunk]
+        for start in range(0, len(pptx_paths), chunk)
+    ]
+    with ThreadPoolExecutor(max_workers=slots) as executor:
+        futures = [
+            executor.submit(_convert_group, binary, group, outdir, export)
+            for group in groups
+        ]
+        for future in as_completed(futures):
+            for path in future.result():
+                pdf_path = _pdf_path(path, outdir)
+                if not os.path.exists(pdf_path):
+                    raise Exception("PDF файл не был создан")
+                yield path, pdf_path
@@ -0,0 +1,153 @@
+"""
+Кэш результатов конвертации PPTX -> PDF с адресацией по содержимому.
+
+Ключ - SHA-256 от нормализованного содержимого PPTX (имена и данные
+частей пакета без меток времени ZIP) и версии конвертера. PDF хранятся
+на диске, индекс LRU с размерами файлов - в памяти. При превышении
+лимита удаляются давно не использованные записи.
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import zipfile
+from collections import OrderedDict
+
+from src.utils.office.libreoffice import discover_converter
+
+
+CACHE_DIR = os.getenv(
+    'CONVERSION_CACHE_DIR',
+    os.path.join(tempfile.gettempdir(), 'rit-conversion-cache')
+)
+CACHE_MAX_BYTES = int(os.getenv('CONVERSION_CACHE_MAX_MB', '256')) * 1024 * 1024
+
+
+def conversion_key(pptx_path: str, variant: str = '') -> str | None:
+    """
+    Вычисляет ключ кэша для файла или None, если файл недоступен.
+
+    Args:
+        pptx_path: Путь к PPTX
+        variant: Дополнительные параметры конвертации, влияющие на результат
+    """
+    digest = hashlib.sha256()
+    try:
+        with zipfile.ZipFile(pptx_path) as archive:
+            for info in sorted(archive.infolist(), key=lambda item: item.filename):
+                digest.update(info.filename.encode('utf-8'))
+                digest.update(b'\0')
+                digest.update(archive.read(info))
+    except zipfile.BadZipFile:
+        with open(pptx_path, 'rb') as source:
+            digest.update(source.read())
+    except OSError:
+        return None
+    digest.update(b'\0')
+    digest.update(str(discover_converter()['version']).encode('utf-8'))
+    digest.update(b'\0')
+    digest.update(variant.encode('utf-8'))
+    return digest.hexdigest()
+
+
+class ConversionCache:
+    """Дисковый LRU-кэш PDF с индексом в памяти и счётчиками попаданий."""
+
+    def __init__(self, directory: str = CACHE_DIR, max_bytes: int = CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._index: OrderedDict[str, int] = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._load_index()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f'{key}.pdf')
+
+    def _load_index(self) -> None:
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name.endswith('.pdf'):
+                stat = entry.stat()
+                entries.append((stat.st_atime, entry.name[:-4], stat.st_size))
+        for _, key, size in sorted(entries):
+            self._index[key] = size
+            self._size += size
+        self._evict()
+
+    def _evict(self) -> None:
+        while self._size > self.max_bytes and self._index:
+            key, size = self._index.popitem(last=False)
+            self._size -= size
+            self.evictions += 1
+            try:
+                os.unlink(self._path(key))
+            except OSError:
+                pass
+
+    def get(self, key: str, pdf_path: str) -> bool:
+        """Копирует PDF из кэша в pdf_path. Возвращает True при попадании."""
+        with self._lock:
+            if key not in self._index:
+                self.misses += 1
+                return False
+            self._index.move_to_end(key)
+        try:
+            shutil.copyfile(self._path(key), pdf_path)
+        except OSError:
+            with self._lock:
+                size = self._index.pop(key, None)
+                if size is not None:
+                    self._size -= size
+                self.misses += 1
+            return False
+        with self._lock:
+            self.hits += 1
+        return True
+
+    def put(self, key: str, pdf_path: str) -> None:
+        """Сохраняет результат конвертации в кэш."""
+        size = os.path.getsize(pdf_path)
+        if size > self.max_bytes:
+            return
+        descriptor, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        os.close(descriptor)
+        shutil.copyfile(pdf_path, temp_path)
+        os.replace(temp_path, self._path(key))
+        with self._lock:
+            previous = self._index.pop(key, None)
+            if previous is not None:
+                self._size -= previous
+            self._index[key] = size
+            self._size += size
+            self._evict()
+
+    def stats(self) -> dict:
+        with self._lock:
+            requests = self.hits + self.misses
+            return {
+                'entries': len(self._index),
+                'size_bytes': self._size,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / requests, 3) if requests else 0.0,
+            }
+
+
+_cache: ConversionCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_conversion_cache() -> ConversionCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ConversionCache()
+        return _cache
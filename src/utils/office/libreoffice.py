@@ -0,0 +1,95 @@
+"""
+Поиск исполняемого файла LibreOffice и выбор бэкенда конвертации.
+
+Бинарник ищется один раз (при старте приложения или при первой
+конвертации), результат вместе с версией запоминается и дальше
+используется без повторного запуска ``--version``.
+"""
+import os
+import subprocess
+import threading
+
+try:
+    import uno
+except ImportError:
+    uno = None
+
+
+LIBREOFFICE_PATHS = [
+    'libreoffice',
+    '/usr/bin/libreoffice',
+    '/usr/local/bin/libreoffice',
+    '/snap/bin/libreoffice',
+    '/opt/libreoffice/program/soffice',
+    '/Applications/LibreOffice.app/Contents/MacOS/soffice'
+]
+
+LIBREOFFICE_NOT_FOUND = (
+    "LibreOffice не найден. Установите LibreOffice:\n"
+    "Ubuntu/Debian: sudo apt-get install libreoffice\n"
+    "CentOS/RHEL: sudo yum install libreoffice\n"
+    "macOS: brew install --cask libreoffice"
+)
+
+POOL_SIZE = int(os.getenv('LIBREOFFICE_POOL_SIZE', '2'))
+
+BACKEND_POOL = 'uno-pool'
+BACKEND_SUBPROCESS = 'subprocess'
+
+_lock = threading.Lock()
+_backend: dict | None = None
+
+
+def probe_libreoffice() -> tuple[str, str] | tuple[None, None]:
+    """Перебирает известные пути и возвращает (путь, версия) первого рабочего."""
+    for path in LIBREOFFICE_PATHS:
+        try:
+            result = subprocess.run(
+                [path, '--version'], capture_output=True, timeout=5
+            )
+            if result.returncode == 0:
+                version = result.stdout
+                if isinstance(version, bytes):
+                    version = version.decode('utf-8', errors='replace')
+                return path, str(version or '').strip()
+        except (FileNotFoundError, subprocess.TimeoutExpired):
+            continue
+    return None, None
+
+
+def discover_converter(force: bool = False) -> dict:
+    """
+    Определяет бэкенд конвертации и кэширует результат.
+
+    Returns:
+        dict: backend (uno-pool / subprocess / None), binary, version
+    """
+    global _backend
+    with _lock:
+        if _backend is not None and not force:
+            return _backend
+        binary, version = probe_libreoffice()
+        if binary is None:
+            backend = None
+        elif uno is not None and POOL_SIZE > 0:
+            backend = BACKEND_POOL
+        else:
+            backend = BACKEND_SUBPROCESS
+        _backend = {
+            'backend': backend,
+            'binary': binary,
+            'version': version,
+        }
+        return _backend
+
+
+def reset_converter() -> None:
+    """Сбрасывает кэш обнаружения (например, если бинарник пропал)."""
+    global _backend
+    with _lock:
+        _backend = None
+
+
+def find_libreoffice() -> str | None:
+    """Возвращает путь к LibreOffice из кэша обнаружения."""
+    return discover_converter()['binary']
@@ -0,0 +1,329 @@
+"""
+Пул долгоживущих headless-экземпляров LibreOffice.
+
+Экземпляры запускаются один раз при старте приложения, каждый со своим
+профилем пользователя (копией подготовленного шаблона, см. profiles.py)
+и своим UNO-каналом (pipe). Конвертация отправляется
+свободному экземпляру, поэтому время запроса складывается только из времени
+самой конвертации, без запуска офиса. Упавшие и зависшие экземпляры
+перезапускаются автоматически.
+
+Для работы нужен модуль ``uno`` (пакет python3-uno). Если он недоступен,
+пул не запускается, конвертация выполняется отдельным процессом, а при
+заданном LIBREOFFICE_POOL_SIZE это пишется в лог как ошибка и /ready
+сообщает degraded.
+"""
+import logging
+import os
+import queue
+import subprocess
+import threading
+import time
+
+try:
+    import uno
+    from com.sun.star.beans import PropertyValue
+except ImportError:
+    uno = None
+    PropertyValue = None
+
+from src.utils.office.libreoffice import (
+    BACKEND_POOL,
+    POOL_SIZE,
+    discover_converter,
+)
+from src.utils.office.profiles import PROFILE_ROOT, profile_uri, seed_profile
+
+
+logger = logging.getLogger(__name__)
+
+CONVERT_TIMEOUT = float(os.getenv('LIBREOFFICE_TIMEOUT', '30'))
+ACQUIRE_TIMEOUT = float(os.getenv('LIBREOFFICE_ACQUIRE_TIMEOUT', '60'))
+STARTUP_TIMEOUT = 60
+RESTART_DELAY_MAX = 30
+
+
+def _props(**kwargs):
+    """Собирает кортеж PropertyValue для вызовов UNO."""
+    result = []
+    for name, value in kwargs.items():
+        prop = PropertyValue()
+        prop.Name = name
+        prop.Value = value
+        result.append(prop)
+    return tuple(result)
+
+
+class LibreOfficeWorker:
+    """Один headless-экземпляр LibreOffice, доступный через UNO pipe."""
+
+    def __init__(self, binary: str, name: str):
+        self.binary = binary
+        self.name = name
+        self.process: subprocess.Popen | None = None
+        self.desktop = None
+        self.profile_dir: str | None = None
+
+    @property
+    def connection(self) -> str:
+        return f"pipe,name={self.name};urp;StarOffice.ComponentContext"
+
+    def start(self) -> None:
+        """Запускает процесс и ждёт готовности UNO-канала."""
+        self.profile_dir = os.path.join(PROFILE_ROOT, self.name)
+        seed_profile(self.profile_dir)
+        cmd = [
+            self.binary,
+            '--headless',
+            '--invisible',
+            '--nologo',
+            '--nodefault',
+            '--norestore',
+            '--nolockcheck',
+            f'--accept={self.connection}',
+            profile_uri(self.profile_dir),
+        ]
+        self.process = subprocess.Popen(
+            cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        self.desktop = self._connect()
+
+    def _connect(self):
+        local_context = uno.getComponentContext()
+        resolver = local_context.ServiceManager.createInstanceWithContext(
+            'com.sun.star.bridge.UnoUrlResolver', local_context
+        )
+        deadline = time.monotonic() + STARTUP_TIMEOUT
+        while True:
+            if not self.alive():
+                raise Exception("Процесс LibreOffice завершился при запуске")
+            try:
+                context = resolver.resolve(f"uno:{self.connection}")
+                break
+            except Exception:
+                if time.monotonic() > deadline:
+                    raise Exception("LibreOffice не ответил при запуске")
+                time.sleep(0.25)
+        return context.ServiceManager.createInstanceWithContext(
+            'com.sun.star.frame.Desktop', context
+        )
+
+    def alive(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def convert(self, pptx_path: str, pdf_path: str, filter_data: dict | None = None) -> None:
+        """Конвертирует документ в PDF силами этого экземпляра."""
+        document = self.desktop.loadComponentFromURL(
+            uno.systemPathToFileUrl(os.path.abspath(pptx_path)),
+            '_blank', 0,
+            _props(Hidden=True, ReadOnly=True)
+        )
+        if document is None:
+            raise Exception("LibreOffice не смог открыть документ")
+        store_props = {'FilterName': 'impress_pdf_Export'}
+        if filter_data:
+            store_props['FilterData'] = uno.Any(
+                '[]com.sun.star.beans.PropertyValue', _props(**filter_data)
+            )
+        try:
+            document.storeToURL(
+                uno.systemPathToFileUrl(os.path.abspath(pdf_path)),
+                _props(**store_props)
+            )
+        finally:
+            document.close(True)
+
+    def stop(self) -> None:
+        """Останавливает процесс."""
+        if self.desktop is not None and self.alive():
+            try:
+                self.desktop.terminate()
+            except Exception:
+                pass
+        self.desktop = None
+        if self.process is not None:
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+        self.profile_dir = None
+
+    def kill(self) -> None:
+        """Принудительно завершает процесс (для зависших экземпляров)."""
+        if self.alive():
+            self.process.kill()
+
+
+class LibreOfficePool:
+    """Пул экземпляров LibreOffice с очередью свободных обработчиков."""
+
+    def __init__(
+        self,
+        binary: str,
+        size: int = POOL_SIZE,
+        convert_timeout: float = CONVERT_TIMEOUT,
+        acquire_timeout: float = ACQUIRE_TIMEOUT
+    ):
+        self.binary = binary
+        self.size = size
+        self.convert_timeout = convert_timeout
+        self.acquire_timeout = acquire_timeout
+        self._idle: queue.Queue[LibreOfficeWorker] = queue.Queue()
+        self._workers: list[LibreOfficeWorker] = []
+        self._ready = threading.Event()
+        self._closed = False
+
+    def start(self) -> None:
+        """Запускает экземпляры в фоне, не блокируя старт приложения."""
+        prefix = f"rit-lo-{os.getpid()}"
+        for index in range(self.size):
+            worker = LibreOfficeWorker(self.binary, f"{prefix}-{index}")
+            self._workers.append(worker)
+            self._boot_async(worker)
+
+    @property
+    def ready(self) -> bool:
+        """Хотя бы один экземпляр успешно запустился."""
+        return self._ready.is_set()
+
+    def _boot_async(self, worker: LibreOfficeWorker) -> None:
+        threading.Thread(
+            target=self._boot, args=(worker,), daemon=True
+        ).start()
+
+    def _boot(self, worker: LibreOfficeWorker) -> None:
+        delay = 1
+        while not self._closed:
+            try:
+                worker.start()
+            except Exception as e:
+                logger.warning("Не удалось запустить %s: %s", worker.name, e)
+                worker.kill()
+                worker.stop()
+                time.sleep(delay)
+                delay = min(delay * 2, RESTART_DELAY_MAX)
+                continue
+            if self._closed:
+                worker.stop()
+                return
+            self._ready.set()
+            self._idle.put(worker)
+            return
+
+    def _restart(self, worker: LibreOfficeWorker) -> None:
+        worker.kill()
+        worker.stop()
+        self._boot_async(worker)
+
+    def _acquire(self) -> LibreOfficeWorker:
+        deadline = time.monotonic() + self.acquire_timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise Exception("Нет свободного обработчика LibreOffice")
+            try:
+                worker = self._idle.get(timeout=remaining)
+            except queue.Empty:
+                continue
+            if worker.alive():
+                return worker
+            logger.warning("%s завершился, перезапуск", worker.name)
+            self._restart(worker)
+
+    def convert(self, pptx_path: str, pdf_path: str, filter_data: dict | None = None) -> None:
+        """
+        Конвертирует PPTX в PDF на свободном экземпляре.
+
+        Если конвертация не уложилась в convert_timeout, процесс экземпляра
+        убивается, а сам экземпляр перезапускается в фоне.
+        """
+        worker = self._acquire()
+        watchdog = threading.Timer(self.convert_timeout, worker.kill)
+        watchdog.start()
+        failed = True
+        try:
+            worker.convert(pptx_path, pdf_path, filter_data)
+            failed = False
+        except Exception as e:
+            if not worker.alive():
+                raise Exception("Превышено время ожидания конвертации") from e
+            raise
+        finally:
+            watchdog.cancel()
+            if failed or not worker.alive():
+                self._restart(worker)
+            else:
+                self._idle.put(worker)
+
+    def stop(self) -> None:
+        self._closed = True
+        for worker in self._workers:
+            worker.stop()
+
+
+_pool: LibreOfficePool | None = None
+
+
+def start_pool(size: int = POOL_SIZE) -> LibreOfficePool | None:
+    """Запускает пул при старте приложения, если это возможно."""
+    global _pool
+    if _pool is not None:
+        return _pool
+    converter = discover_converter()
+    if converter['binary'] is None:
+        logger.warning("LibreOffice не найден, пул конвертации не запущен")
+        return None
+    if size <= 0:
+        return None
+    if uno is None:
+        logger.error(
+            "Модуль uno недоступен (python3-uno): пул LibreOffice не запущен, "
+            "каждая конвертация запускает отдельный процесс soffice"
+        )
+        return None
+    if converter['backend'] != BACKEND_POOL:
+        return None
+    _pool = LibreOfficePool(converter['binary'], size)
+    _pool.start()
+    return _pool
+
+
+def stop_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.stop()
+        _pool = None
+
+
+def get_pool() -> LibreOfficePool | None:
+    """Возвращает пул, если в нём есть хотя бы один готовый экземпляр."""
+    if _pool is not None and _pool.ready:
+        return _pool
+    return None
+
+
+def converter_status() -> dict:
+    """
+    Состояние подсистемы конвертации для readiness-проверки.
+
+    status: ok - всё готово; degraded - пул ещё запускается или не может
+    быть запущен без uno, конвертация идёт отдельными процессами;
+    unavailable - LibreOffice не найден.
+    """
+    converter = discover_converter()
+    if converter['binary'] is None:
+        status = 'unavailable'
+    elif converter['backend'] == BACKEND_POOL and get_pool() is None:
+        status = 'degraded'
+    elif uno is None and POOL_SIZE > 0:
+        status = 'degraded'
+    else:
+        status = 'ok'
+    return {
+        'status': status,
+        'backend': converter['backend'],
+        'binary': converter['binary'],
+        'version': converter['version'],
+        'pool_size': _pool.size if _pool is not None else 0,
+    }
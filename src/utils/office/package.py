@@ -0,0 +1,239 @@
+"""
+Подстановка значений в PPTX на уровне ZIP-архива.
+
+prs.save() заново сериализует и сжимает каждую часть пакета, включая
+картинки и макеты, хотя плейсхолдеры есть только в нескольких слайдах.
+Здесь шаблон один раз читается в память вместе с текстом абзацев его
+слайдов, а при генерации пересобираются только слайды, где есть ключи
+замены. Остальные файлы архива копируются в результат как есть - теми же
+сжатыми байтами, без распаковки. Время и память при генерации зависят от
+объёма изменённого текста, а не от размера картинок шаблона.
+"""
+import io
+import re
+import struct
+import zipfile
+import zlib
+from collections.abc import Iterator
+from dataclasses import dataclass
+
+from lxml import etree
+
+from src.utils.office.substitution import Substitutions
+
+
+A_NS = 'http://schemas.openxmlformats.org/drawingml/2006/main'
+PARAGRAPH = f'{{{A_NS}}}p'
+RUN = f'{{{A_NS}}}r'
+TEXT = f'{{{A_NS}}}t'
+SLIDE_PART = re.compile(r'^ppt/slides/slide\d+\.xml$')
+
+LOCAL_HEADER = struct.Struct('<4sHHHHHIIIHH')
+CENTRAL_HEADER = struct.Struct('<4sHHHHHHIIIHHHHHII')
+END_RECORD = struct.Struct('<4sHHHHIIH')
+LOCAL_SIGNATURE = b'PK\x03\x04'
+CENTRAL_SIGNATURE = b'PK\x01\x02'
+END_SIGNATURE = b'PK\x05\x06'
+
+FLAG_ENCRYPTED = 0x1
+FLAG_DATA_DESCRIPTOR = 0x8
+ZIP_VERSION = 20
+ZIP64_LIMIT = 0xFFFFFFFF
+
+
+@dataclass
+class Member:
+    """Файл архива: заголовок и сжатые данные."""
+    part: str
+    name: bytes
+    flags: int
+    method: int
+    dos_time: int
+    dos_date: int
+    crc: int
+    compressed_size: int
+    size: int
+    external_attr: int
+    data: bytes | memoryview
+
+
+class _Run:
+    """Фрагмент абзаца (a:t) с интерфейсом run.text для Substitutions."""
+
+    __slots__ = ('element',)
+
+    def __init__(self, element):
+        self.element = element
+
+    @property
+    def text(self) -> str:
+        return self.element.text or ''
+
+    @text.setter
+    def text(self, value: str) -> None:
+        self.element.text = value
+
+
+def _paragraph_runs(paragraph) -> list[_Run]:
+    return [
+        _Run(text)
+        for run in paragraph.iterchildren(RUN)
+        for text in run.iterchildren(TEXT)
+    ]
+
+
+def _dos_datetime(date_time: tuple) -> tuple[int, int]:
+    year, month, day, hour, minute, second = date_time
+    dos_date = (year - 1980) << 9 | month << 5 | day
+    dos_time = hour << 11 | minute << 5 | second // 2
+    return dos_time, dos_date
+
+
+def _deflate(data: bytes) -> bytes:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+    return compressor.compress(data) + compressor.flush()
+
+
+class PptxPackage:
+    """Шаблон PPTX, готовый к многократной подстановке значений."""
+
+    def __init__(self, path: str | None = None, data: bytes | None = None):
+        if data is None:
+            with open(path, 'rb') as source:
+                data = source.read()
+        self.data = data
+        if len(self.data) >= ZIP64_LIMIT:
+            raise ValueError("Шаблон слишком большой")
+
+        view = memoryview(self.data)
+        self.members: list[Member] = []
+        self.slides: dict[str, bytes] = {}
+        self.slide_texts: dict[str, list[str]] = {}
+
+        with zipfile.ZipFile(io.BytesIO(self.data)) as archive:
+            for info in archive.infolist():
+                if info.flag_bits & FLAG_ENCRYPTED:
+                    raise ValueError("Зашифрованные шаблоны не поддерживаются")
+                header = LOCAL_HEADER.unpack_from(self.data, info.header_offset)
+                if header[0] != LOCAL_SIGNATURE:
+                    raise zipfile.BadZipFile(f"Повреждён заголовок {info.filename}")
+                name_start = info.header_offset + LOCAL_HEADER.size
+                start = name_start + header[9] + header[10]
+                dos_time, dos_date = _dos_datetime(info.date_time)
+                self.members.append(Member(
+                    part=info.filename,
+                    name=self.data[name_start:name_start + header[9]],
+                    flags=info.flag_bits & ~FLAG_DATA_DESCRIPTOR,
+                    method=info.compress_type,
+                    dos_time=dos_time,
+                    dos_date=dos_date,
+                    crc=info.CRC,
+                    compressed_size=info.compress_size,
+                    size=info.file_size,
+                    external_attr=info.external_attr,
+                    data=view[start:start + info.compress_size],
+                ))
+                if SLIDE_PART.match(info.filename):
+                    xml = archive.read(info)
+                    self.slides[info.filename] = xml
+                    self.slide_texts[info.filename] = [
+                        ''.join(run.text for run in _paragraph_runs(paragraph))
+                        for paragraph in etree.fromstring(xml).iter(PARAGRAPH)
+                    ]
+
+    def _needs_rewrite(self, part: str, substitutions: Substitutions) -> bool:
+        if substitutions.pattern is None or part not in self.slide_texts:
+            return False
+        return any(
+            substitutions.pattern.search(text) for text in self.slide_texts[part]
+        )
+
+    def _rewrite(self, member: Member, substitutions: Substitutions) -> tuple[Member, int]:
+        root = etree.fromstring(self.slides[member.part])
+        count = sum(
+            substitutions.apply_runs(_paragraph_runs(paragraph))
+            for paragraph in root.iter(PARAGRAPH)
+        )
+        xml = etree.tostring(
+            root, xml_declaration=True, encoding='UTF-8', standalone=True
+        )
+        data = _deflate(xml)
+        return Member(
+            part=member.part,
+            name=member.name,
+            flags=member.flags & 0x800,
+            method=zipfile.ZIP_DEFLATED,
+            dos_time=member.dos_time,
+            dos_date=member.dos_date,
+            crc=zlib.crc32(xml),
+            compressed_size=len(data),
+            size=len(xml),
+            external_attr=member.external_attr,
+            data=data,
+        ), count
+
+    def iter_render(
+        self, replacements: dict, counts: list[int] | None = None
+    ) -> Iterator[bytes]:
+        """
+        Отдаёт по частям PPTX с подставленными значениями.
+
+        Изменяются только слайды с ключами замены, остальные файлы
+        архива копируются без распаковки.
+
+        Args:
+            replacements: Словарь замен
+            counts: Если передан, в него добавляется число замен по слайдам
+        """
+        substitutions = Substitutions(replacements)
+        central = []
+        offset = 0
+        for member in self.members:
+            if self._needs_rewrite(member.part, substitutions):
+                member, count = self._rewrite(member, substitutions)
+                if counts is not None:
+                    counts.append(count)
+
+            header = LOCAL_HEADER.pack(
+                LOCAL_SIGNATURE, ZIP_VERSION, member.flags, member.method,
+                member.dos_time, member.dos_date, member.crc,
+                member.compressed_size, member.size, len(member.name), 0
+            )
+            yield header + member.name
+            yield bytes(member.data)
+
+            central.append(CENTRAL_HEADER.pack(
+                CENTRAL_SIGNATURE, ZIP_VERSION, ZIP_VERSION, member.flags,
+                member.method, member.dos_time, member.dos_date, member.crc,
+                member.compressed_size, member.size, len(member.name),
+                0, 0, 0, 0, member.external_attr, offset
+            ) + member.name)
+            offset += len(header) + len(member.name) + member.compressed_size
+            if offset >= ZIP64_LIMIT:
+                raise ValueError("Результат слишком большой")
+
+        directory = b''.join(central)
+        yield directory
+        yield END_RECORD.pack(
+            END_SIGNATURE, 0, 0, len(central), len(central),
+            len(directory), offset, 0
+        )
+
+    def render_bytes(self, replacements: dict) -> bytes:
+        """Возвращает PPTX с подставленными значениями."""
+        return b''.join(self.iter_render(replacements))
+
+    def bake(self, replacements: dict) -> 'PptxPackage':
+        """
+        Новый шаблон, в котором часть значений уже подставлена
+        (например, дата, общая для всех запросов за день).
+        """
+        return PptxPackage(data=self.render_bytes(replacements))
+
+    def render(self, replacements: dict, output_path: str) -> int:
+        """Записывает PPTX с подставленными значениями, возвращает число замен."""
+        counts = []
+        with open(output_path, 'wb') as output:
+            for chunk in self.iter_render(replacements, counts):
+                output.write(chunk)
+        return sum(counts)
@@ -0,0 +1,207 @@
+"""
+Профили экспорта PDF.
+
+Профиль задаёт параметры фильтра impress_pdf_Export LibreOffice
+(FilterData) и то же самое для быстрого рендерера сертификатов:
+
+    default - параметры LibreOffice по умолчанию (как было раньше)
+    screen  - для почты и просмотра: изображения уменьшены до 150 dpi,
+              сильное JPEG-сжатие, PDF линеаризован для быстрого
+              открытия в браузере
+    print   - для печати: изображения без уменьшения и без потерь;
+              только векторный PDF LibreOffice, быстрый растровый
+              рендерер сертификатов для него не используется
+
+LibreOffice не умеет сохранять линеаризованный PDF, поэтому для
+профиля screen файл после экспорта обрабатывается qpdf, если он
+установлен; без qpdf шаг пропускается. Одностраничный PDF быстрого
+рендерера сертификатов не линеаризуется - для него это ничего не даёт.
+
+Для каждого профиля считаются число конвертаций, попадания в кэш,
+время и размер результата (см. /stats).
+"""
+import json
+import os
+import shutil
+import subprocess
+import threading
+
+
+DEFAULT_PROFILE = os.getenv('PDF_EXPORT_PROFILE', 'default')
+PDF_FILTER = 'impress_pdf_Export'
+
+
+class ExportProfile:
+    """
+    Набор параметров экспорта PDF.
+
+    Args:
+        name: Имя профиля
+        title: Название для формы
+        filter_data: Параметры FilterData фильтра PDF LibreOffice
+        image_dpi: Разрешение изображений быстрого рендерера (None - без уменьшения)
+        jpeg_quality: Качество JPEG быстрого рендерера
+        linearize: Линеаризовать PDF (Fast Web View)
+        raster: Разрешён ли растровый PDF быстрого рендерера сертификатов
+    """
+
+    def __init__(
+        self,
+        name: str,
+        title: str,
+        filter_data: dict | None = None,
+        image_dpi: int | None = None,
+        jpeg_quality: int = 92,
+        linearize: bool = False,
+        raster: bool = True
+    ):
+        self.name = name
+        self.title = title
+        self.filter_data = filter_data or {}
+        self.image_dpi = image_dpi
+        self.jpeg_quality = jpeg_quality
+        self.linearize = linearize
+        self.raster = raster
+
+    @property
+    def variant(self) -> str:
+        """Часть ключа кэша конвертаций; пустая для параметров по умолчанию."""
+        if not self.filter_data and not self.linearize:
+            return ''
+        options = json.dumps(
+            {'filter': self.filter_data, 'linearize': self.linearize},
+            sort_keys=True
+        )
+        return f"{self.name}:{options}"
+
+    def convert_to(self) -> str:
+        """Аргумент --convert-to для soffice с параметрами фильтра."""
+        if not self.filter_data:
+            return 'pdf'
+        return f"pdf:{PDF_FILTER}:{json.dumps(_typed(self.filter_data))}"
+
+
+def _typed(filter_data: dict) -> dict:
+    """FilterData в JSON-формате командной строки LibreOffice (7.4+)."""
+    result = {}
+    for name, value in filter_data.items():
+        if isinstance(value, bool):
+            result[name] = {'type': 'boolean', 'value': str(value).lower()}
+        elif isinstance(value, int):
+            result[name] = {'type': 'long', 'value': str(value)}
+        else:
+            result[name] = {'type': 'string', 'value': str(value)}
+    return result
+
+
+EXPORT_PROFILES = {
+    'default': ExportProfile('default', "Стандартный"),
+    'screen': ExportProfile(
+        'screen', "Для экрана и почты",
+        filter_data={
+            'ReduceImageResolution': True,
+            'MaxImageResolution': 150,
+            'UseLosslessCompression': False,
+            'Quality': 60,
+        },
+        image_dpi=150,
+        jpeg_quality=60,
+        linearize=True
+    ),
+    'print': ExportProfile(
+        'print', "Для печати",
+        filter_data={
+            'ReduceImageResolution': False,
+            'UseLosslessCompression': True,
+        },
+        jpeg_quality=95,
+        raster=False
+    ),
+}
+
+
+def get_export_profile(name: str | None = None) -> ExportProfile:
+    """
+    Возвращает профиль по имени; пустое имя - профиль по умолчанию.
+
+    Raises:
+        ValueError: Если профиля с таким именем нет
+    """
+    name = (name or '').strip() or DEFAULT_PROFILE
+    profile = EXPORT_PROFILES.get(name)
+    if profile is None:
+        raise ValueError(
+            f"Неизвестный профиль PDF: {name}. "
+            f"Доступны: {', '.join(EXPORT_PROFILES)}"
+        )
+    return profile
+
+
+def linearize_pdf(pdf_path: str) -> bool:
+    """Линеаризует PDF на месте с помощью qpdf. Возвращает False без qpdf."""
+    qpdf = shutil.which('qpdf')
+    if qpdf is None:
+        return False
+    linearized_path = pdf_path + '.linearized'
+    try:
+        result = subprocess.run(
+            [qpdf, '--linearize', pdf_path, linearized_path],
+            capture_output=True, timeout=30
+        )
+    except subprocess.TimeoutExpired:
+        result = None
+    # Код 3 - предупреждения, файл при этом записан.
+    if result is None or result.returncode not in (0, 3) or not os.path.exists(linearized_path):
+        if os.path.exists(linearized_path):
+            os.remove(linearized_path)
+        return False
+    os.replace(linearized_path, pdf_path)
+    return True
+
+
+class ExportStats:
+    """Время и размер результатов конвертации по профилям."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._profiles: dict[str, dict] = {}
+
+    def record(self, profile: str, seconds: float, size: int, cached: bool = False) -> None:
+        with self._lock:
+            entry = self._profiles.setdefault(profile, {
+                'conversions': 0,
+                'cache_hits': 0,
+                'seconds': 0.0,
+                'bytes': 0,
+            })
+            if cached:
+                entry['cache_hits'] += 1
+                return
+            entry['conversions'] += 1
+            entry['seconds'] += seconds
+            entry['bytes'] += size
+
+    def stats(self) -> dict:
+        with self._lock:
+            result = {}
+            for name, entry in self._profiles.items():
+                count = entry['conversions']
+                result[name] = {
+                    'conversions': count,
+                    'cache_hits': entry['cache_hits'],
+                    'avg_seconds': round(entry['seconds'] / count, 3) if count else None,
+                    'avg_bytes': entry['bytes'] // count if count else None,
+                }
+            return result
+
+
+_stats = ExportStats()
+
+
+def record_export(profile: str, seconds: float, size: int, cached: bool = False) -> None:
+    _stats.record(profile, seconds, size, cached)
+
+
+def export_stats() -> dict:
+    """Статистика по профилям для /stats."""
+    return _stats.stats()
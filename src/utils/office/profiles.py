@@ -0,0 +1,120 @@
+"""
+Изолированные профили LibreOffice для параллельной конвертации.
+
+Экземпляры soffice с общим профилем пользователя не работают параллельно:
+второй процесс либо ждёт первый, либо завершается с ошибкой. Поэтому
+каждая конвертация выполняется в своём слоте со своим профилем
+(``-env:UserInstallation``). Профили слотов копируются из шаблона,
+который один раз инициализируется при старте приложения.
+"""
+import os
+import queue
+import shutil
+import subprocess
+import tempfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+
+SLOTS = int(os.getenv('LIBREOFFICE_SLOTS', str(os.cpu_count() or 2)))
+SLOT_TIMEOUT = float(os.getenv('LIBREOFFICE_SLOT_TIMEOUT', '60'))
+PROFILE_ROOT = os.getenv(
+    'LIBREOFFICE_PROFILE_DIR',
+    os.path.join(tempfile.gettempdir(), f'rit-lo-profiles-{os.getpid()}')
+)
+TEMPLATE_DIR = os.path.join(PROFILE_ROOT, 'template')
+
+
+def profile_uri(profile_dir: str) -> str:
+    """Аргумент командной строки для запуска soffice с данным профилем."""
+    return f'-env:UserInstallation={Path(profile_dir).as_uri()}'
+
+
+def warm_template(binary: str) -> bool:
+    """
+    Инициализирует шаблон профиля, запуская LibreOffice один раз.
+
+    Returns:
+        bool: True, если шаблон готов
+    """
+    if os.path.isdir(os.path.join(TEMPLATE_DIR, 'user')):
+        return True
+    os.makedirs(TEMPLATE_DIR, exist_ok=True)
+    try:
+        subprocess.run(
+            [binary, '--headless', '--terminate_after_init',
+             profile_uri(TEMPLATE_DIR)],
+            capture_output=True, timeout=60
+        )
+    except (FileNotFoundError, subprocess.TimeoutExpired):
+        return False
+    return os.path.isdir(os.path.join(TEMPLATE_DIR, 'user'))
+
+
+def seed_profile(profile_dir: str) -> None:
+    """Создаёт профиль заново, копируя подготовленный шаблон (если он есть)."""
+    shutil.rmtree(profile_dir, ignore_errors=True)
+    if os.path.isdir(TEMPLATE_DIR):
+        shutil.copytree(TEMPLATE_DIR, profile_dir)
+    else:
+        os.makedirs(profile_dir, exist_ok=True)
+
+
+class SlotRunner:
+    """Ограничивает число параллельных soffice и выдаёт каждому свой профиль."""
+
+    def __init__(self, slots: int = SLOTS, slot_timeout: float = SLOT_TIMEOUT):
+        self.slots = max(1, slots)
+        self.slot_timeout = slot_timeout
+        self._free: queue.Queue[int] = queue.Queue()
+        self._seeded: set[int] = set()
+        self._lock = threading.Lock()
+        for index in range(self.slots):
+            self._free.put(index)
+
+    def profile_dir(self, index: int) -> str:
+        return os.path.join(PROFILE_ROOT, f'slot-{index}')
+
+    @contextmanager
+    def slot(self):
+        """
+        Занимает свободный слот и возвращает путь к его профилю.
+
+        Если внутри блока произошла ошибка, профиль слота пересоздаётся,
+        чтобы следующая конвертация не наткнулась на брошенный lock-файл.
+        """
+        try:
+            index = self._free.get(timeout=self.slot_timeout)
+        except queue.Empty:
+            raise Exception("Нет свободного слота конвертации")
+        profile_dir = self.profile_dir(index)
+        try:
+            with self._lock:
+                if index not in self._seeded:
+                    seed_profile(profile_dir)
+                    self._seeded.add(index)
+            yield profile_dir
+        except BaseException:
+            with self._lock:
+                self._seeded.discard(index)
+            raise
+        finally:
+            self._free.put(index)
+
+
+_runner: SlotRunner | None = None
+_runner_lock = threading.Lock()
+
+
+def get_slot_runner() -> SlotRunner:
+    global _runner
+    with _runner_lock:
+        if _runner is None:
+            _runner = SlotRunner()
+        return _runner
+
+
+def remove_profiles() -> None:
+    """Удаляет все профили при остановке приложения."""
+    shutil.rmtree(PROFILE_ROOT, ignore_errors=True)
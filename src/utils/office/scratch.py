@@ -0,0 +1,49 @@
+"""
+Рабочие каталоги для промежуточных файлов LibreOffice.
+
+LibreOffice читает документ по пути и пишет результат в каталог --outdir,
+имя PDF выводится из имени исходного файла, поэтому без файлов ему не
+обойтись. Чтобы они не попадали на overlay-ФС контейнера, каталоги
+создаются в tmpfs (/dev/shm), если он доступен; SCRATCH_DIR задаёт
+другое место явно.
+
+tmpfs небольшой (в production 256 МБ) и делится с памятью пула
+обработки изображений, поэтому пакетная генерация (сотни файлов)
+работает в каталогах на диске: make_work_dir, WORK_DIR или системный
+временный каталог.
+"""
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+
+def _default_root() -> str | None:
+    shm = '/dev/shm'
+    if os.path.isdir(shm) and os.access(shm, os.W_OK):
+        return shm
+    return None
+
+
+SCRATCH_ROOT = os.getenv('SCRATCH_DIR') or _default_root()
+WORK_ROOT = os.getenv('WORK_DIR') or None
+
+
+def make_scratch_dir(prefix: str = 'rit-') -> str:
+    """Создаёт рабочий каталог; удалять его должен вызывающий код."""
+    return tempfile.mkdtemp(prefix=prefix, dir=SCRATCH_ROOT)
+
+
+def make_work_dir(prefix: str = 'rit-') -> str:
+    """Создаёт рабочий каталог на диске для больших пакетов; удаляет вызывающий код."""
+    return tempfile.mkdtemp(prefix=prefix, dir=WORK_ROOT)
+
+
+@contextmanager
+def scratch_dir(prefix: str = 'rit-'):
+    """Рабочий каталог, удаляемый при выходе из блока."""
+    path = make_scratch_dir(prefix)
+    try:
+        yield path
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
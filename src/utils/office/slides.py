@@ -0,0 +1,58 @@
+"""
+Копирование слайдов внутри одной презентации python-pptx.
+"""
+import copy
+
+from pptx.opc.constants import RELATIONSHIP_TYPE as RT
+
+
+_R_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+_R_ATTRIBUTES = tuple(f'{{{_R_NS}}}{name}' for name in ('embed', 'link', 'id'))
+
+
+def duplicate_slide(prs, source):
+    """
+    Добавляет в конец презентации копию слайда source.
+
+    Копируются фон, все фигуры и связи слайда (картинки, гиперссылки),
+    поэтому копия выглядит так же, как исходный слайд.
+    """
+    slide = prs.slides.add_slide(source.slide_layout)
+    sp_tree = slide.shapes._spTree
+    for shape in list(slide.shapes):
+        sp_tree.remove(shape._element)
+
+    rid_map = {}
+    for rel in list(source.part.rels.values()):
+        if rel.reltype in (RT.SLIDE_LAYOUT, RT.NOTES_SLIDE):
+            continue
+        if rel.is_external:
+            rid_map[rel.rId] = slide.part.rels.get_or_add_ext_rel(
+                rel.reltype, rel.target_ref
+            )
+        else:
+            rid_map[rel.rId] = slide.part.rels.get_or_add(
+                rel.reltype, rel.target_part
+            )
+
+    source_c_sld = source._element.cSld
+    if source_c_sld.bg is not None:
+        background = copy.deepcopy(source_c_sld.bg)
+        _remap_rids(background, rid_map)
+        slide._element.cSld.insert(0, background)
+
+    for element in source.shapes._spTree.iterchildren():
+        if element.tag.endswith('}nvGrpSpPr') or element.tag.endswith('}grpSpPr'):
+            continue
+        clone = copy.deepcopy(element)
+        _remap_rids(clone, rid_map)
+        sp_tree.append(clone)
+    return slide
+
+
+def _remap_rids(element, rid_map: dict) -> None:
+    for node in element.iter():
+        for attribute in _R_ATTRIBUTES:
+            value = node.get(attribute)
+            if value in rid_map:
+                node.set(attribute, rid_map[value])
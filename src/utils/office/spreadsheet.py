@@ -0,0 +1,153 @@
+"""
+Чтение таблиц CSV/XLSX без сторонних зависимостей.
+
+Первая строка таблицы считается заголовком. Каждая следующая строка
+возвращается словарём {заголовок в нижнем регистре: значение}.
+"""
+import csv
+import io
+import os
+import posixpath
+import zipfile
+from xml.etree import ElementTree
+
+
+SPREADSHEET_EXTENSIONS = {'.csv', '.xlsx'}
+
+_NS = {
+    'main': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main',
+    'rel': 'http://schemas.openxmlformats.org/package/2006/relationships',
+}
+_R_ID = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id'
+
+
+def _decode_csv(content: bytes) -> str:
+    for encoding in ('utf-8-sig', 'cp1251'):
+        try:
+            return content.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+    raise ValueError("Не удалось определить кодировку CSV файла")
+
+
+def _read_csv(content: bytes) -> list[list[str]]:
+    text = _decode_csv(content)
+    try:
+        dialect = csv.Sniffer().sniff(text[:4096], delimiters=',;\t')
+    except csv.Error:
+        dialect = csv.excel
+    return [row for row in csv.reader(io.StringIO(text), dialect)]
+
+
+def _column_index(reference: str) -> int:
+    """Номер столбца по ссылке на ячейку: A1 -> 0, AB12 -> 27."""
+    index = 0
+    for char in reference:
+        if not char.isalpha():
+            break
+        index = index * 26 + (ord(char.upper()) - ord('A') + 1)
+    return index - 1
+
+
+def _first_sheet_path(archive: zipfile.ZipFile) -> str:
+    workbook = ElementTree.fromstring(archive.read('xl/workbook.xml'))
+    sheet = workbook.find('main:sheets/main:sheet', _NS)
+    if sheet is None:
+        raise ValueError("В файле XLSX нет листов")
+    rels = ElementTree.fromstring(archive.read('xl/_rels/workbook.xml.rels'))
+    for rel in rels.findall('rel:Relationship', _NS):
+        if rel.get('Id') == sheet.get(_R_ID):
+            target = rel.get('Target')
+            if target.startswith('/'):
+                return target.lstrip('/')
+            return posixpath.normpath(posixpath.join('xl', target))
+    raise ValueError("Не найден первый лист XLSX")
+
+
+def _shared_strings(archive: zipfile.ZipFile) -> list[str]:
+    if 'xl/sharedStrings.xml' not in archive.namelist():
+        return []
+    root = ElementTree.fromstring(archive.read('xl/sharedStrings.xml'))
+    return [
+        ''.join(node.text or '' for node in item.iter(f"{{{_NS['main']}}}t"))
+        for item in root.findall('main:si', _NS)
+    ]
+
+
+def _cell_value(cell, shared: list[str]) -> str:
+    cell_type = cell.get('t')
+    if cell_type == 'inlineStr':
+        return ''.join(
+            node.text or '' for node in cell.iter(f"{{{_NS['main']}}}t")
+        )
+    value = cell.find('main:v', _NS)
+    if value is None or value.text is None:
+        return ''
+    if cell_type == 's':
+        return shared[int(value.text)]
+    text = value.text
+    if cell_type is None and text.endswith('.0'):
+        text = text[:-2]
+    return text
+
+
+def _read_xlsx(content: bytes) -> list[list[str]]:
+    try:
+        archive = zipfile.ZipFile(io.BytesIO(content))
+    except zipfile.BadZipFile:
+        raise ValueError("Файл XLSX повреждён")
+    with archive:
+        shared = _shared_strings(archive)
+        sheet = ElementTree.fromstring(archive.read(_first_sheet_path(archive)))
+    rows = []
+    for row in sheet.iterfind('main:sheetData/main:row', _NS):
+        values: list[str] = []
+        for cell in row.findall('main:c', _NS):
+            reference = cell.get('r')
+            index = _column_index(reference) if reference else len(values)
+            values.extend([''] * (index - len(values) + 1))
+            values[index] = _cell_value(cell, shared)
+        rows.append(values)
+    return rows
+
+
+def read_rows(filename: str, content: bytes) -> list[dict[str, str]]:
+    """
+    Читает таблицу из загруженного файла.
+
+    Args:
+        filename: Имя файла (по расширению выбирается формат)
+        content: Содержимое файла
+
+    Returns:
+        list[dict[str, str]]: Непустые строки таблицы
+    """
+    extension = os.path.splitext(filename)[1].lower()
+    if extension == '.csv':
+        rows = _read_csv(content)
+    elif extension == '.xlsx':
+        rows = _read_xlsx(content)
+    else:
+        raise ValueError(
+            f"Неподдерживаемый формат таблицы. "
+            f"Поддерживаемые форматы: {', '.join(sorted(SPREADSHEET_EXTENSIONS))}"
+        )
+    if not rows:
+        return []
+    header = [column.strip().lower() for column in rows[0]]
+    result = []
+    for row in rows[1:]:
+        values = [value.strip() for value in row]
+        if not any(values):
+            continue
+        values.extend([''] * (len(header) - len(values)))
+        result.append(dict(zip(header, values)))
+    return result
+
+
+def pick(row: dict[str, str], *aliases: str) -> str:
+    """Возвращает значение первого найденного столбца из списка синонимов."""
+    for alias in aliases:
+        if row.get(alias):
+            return row[alias]
+    return ''
@@ -0,0 +1,82 @@
+"""
+Подстановка значений в текст слайдов PPTX.
+
+Все ключи словаря замен собираются в одно регулярное выражение, и текст
+каждого абзаца просматривается один раз, а не по разу на каждый ключ.
+Поиск идёт по склеенному тексту всех фрагментов (run) абзаца, поэтому
+находятся и плейсхолдеры, которые PowerPoint разбил на несколько
+фрагментов. Значение записывается во фрагмент, где начинается
+плейсхолдер, и получает его оформление; остальные части плейсхолдера
+из следующих фрагментов удаляются.
+"""
+import re
+
+
+class Substitutions:
+    """Заранее скомпилированный набор замен."""
+
+    def __init__(self, replacements: dict[str, str]):
+        self.replacements = {
+            key: str(value) for key, value in replacements.items() if key
+        }
+        # Длинные ключи раньше коротких: 'Doctor_10' не должен
+        # совпасть как 'Doctor_1' + '0'.
+        keys = sorted(self.replacements, key=len, reverse=True)
+        self.pattern = (
+            re.compile('|'.join(re.escape(key) for key in keys)) if keys else None
+        )
+
+    def sub(self, text: str) -> str:
+        """Подставляет значения в строку."""
+        if self.pattern is None:
+            return text
+        return self.pattern.sub(lambda match: self.replacements[match.group()], text)
+
+    def apply_paragraph(self, paragraph) -> int:
+        """Подставляет значения в абзац, возвращает число замен."""
+        return self.apply_runs(paragraph.runs)
+
+    def apply_runs(self, runs) -> int:
+        """
+        Подставляет значения в последовательность фрагментов одного абзаца
+        (объектов с атрибутом text), возвращает число замен.
+        """
+        if self.pattern is None:
+            return 0
+        runs = list(runs)
+        texts = [run.text for run in runs]
+        full_text = ''.join(texts)
+        matches = list(self.pattern.finditer(full_text))
+        if not matches:
+            return 0
+
+        owners = [index for index, text in enumerate(texts) for _ in text]
+        new_texts = [[] for _ in runs]
+        position = 0
+        for match in matches:
+            for offset in range(position, match.start()):
+                new_texts[owners[offset]].append(full_text[offset])
+            new_texts[owners[match.start()]].append(self.replacements[match.group()])
+            position = match.end()
+        for offset in range(position, len(full_text)):
+            new_texts[owners[offset]].append(full_text[offset])
+
+        for run, old_text, parts in zip(runs, texts, new_texts):
+            new_text = ''.join(parts)
+            if new_text != old_text:
+                run.text = new_text
+        return len(matches)
+
+    def apply_shapes(self, shapes) -> int:
+        """Подставляет значения во все текстовые фигуры, возвращает число замен."""
+        count = 0
+        for shape in shapes:
+            if not shape.has_text_frame:
+                continue
+            for paragraph in shape.text_frame.paragraphs:
+                count += self.apply_paragraph(paragraph)
+        return count
+
+    def apply_slides(self, slides) -> int:
+        """Подставляет значения на всех слайдах, возвращает число замен."""
+        return sum(self.apply_shapes(slide.shapes) for slide in slides)
@@ -0,0 +1,95 @@
+"""
+Кэш разобранных шаблонов PPTX.
+
+Шаблон разбирается python-pptx один раз и хранится в памяти, а каждый
+запрос получает независимую глубокую копию - это заметно дешевле, чем
+распаковывать и разбирать весь XML пакета заново. Запись сверяется с
+mtime, inode и размером файла, поэтому подменённый шаблон (например,
+смонтированный заново в docker-compose) подхватывается без перезапуска.
+
+Если нужно только подставить значения в текст, fill_template обходится
+без python-pptx и переписывает архив шаблона напрямую (см. package.py).
+"""
+import copy
+import os
+import threading
+
+from pptx import Presentation
+
+from src.utils.office.package import PptxPackage
+
+
+def _signature(path: str) -> tuple[int, int, int]:
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_ino, stat.st_size
+
+
+class TemplateCache:
+    """
+    Разобранные шаблоны с проверкой подмены файла.
+
+    Args:
+        loader: Разбирает файл шаблона
+        clone: Делает копию для вызывающего кода; None - отдавать общий объект
+    """
+
+    def __init__(self, loader=Presentation, clone=copy.deepcopy):
+        self.loader = loader
+        self.clone = clone
+        self._entries: dict[str, tuple[tuple[int, int, int], object]] = {}
+        self._lock = threading.Lock()
+        self.loads = 0
+
+    def load(self, path: str):
+        """
+        Возвращает шаблон; при заданном clone - копию, которую можно менять.
+
+        Raises:
+            FileNotFoundError: Если файла шаблона нет
+        """
+        try:
+            signature = _signature(path)
+        except OSError:
+            raise FileNotFoundError(f"Файл шаблона не найден: {path}")
+
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is None or entry[0] != signature:
+                entry = (signature, self.loader(path))
+                self._entries[path] = entry
+                self.loads += 1
+            template = entry[1]
+        return self.clone(template) if self.clone else template
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+_cache = TemplateCache()
+_packages = TemplateCache(PptxPackage, clone=None)
+
+
+def load_template(path: str):
+    """Копия разобранного шаблона из общего кэша (см. TemplateCache.load)."""
+    return _cache.load(path)
+
+
+def load_package(path: str) -> PptxPackage:
+    """Общий разобранный пакет шаблона для подстановок на уровне ZIP."""
+    return _packages.load(path)
+
+
+def fill_template(path: str, replacements: dict, output_path: str) -> int:
+    """
+    Записывает в output_path шаблон с подставленными значениями.
+
+    Returns:
+        Число выполненных замен
+    """
+    return _packages.load(path).render(replacements, output_path)
+
+
+def render_template(path: str, replacements: dict) -> bytes:
+    """Шаблон с подставленными значениями в памяти, без записи на диск."""
+    return _packages.load(path).render_bytes(replacements)
@@ -0,0 +1,179 @@
+"""
+Batch background removal: many images in, one ZIP out.
+
+Images are processed in parallel by the image pool (one submitting
+thread per pool worker) and each result is added to the streamed ZIP as
+soon as it is ready, so archive order follows completion order. A file
+that fails does not fail the batch: the error is recorded in
+manifest.json, which is written last.
+"""
+import base64
+import json
+import os
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from fastapi import File, Form, Request, UploadFile
+from fastapi.responses import RedirectResponse
+
+from src.utils.remove_bg.encoding import (
+    DEFAULT_PNG_COMPRESSION,
+    OutputFormat,
+    get_output_format,
+    png_compression_level,
+)
+from src.utils.remove_bg.image_pool import get_image_pool, remove_background_bytes
+from src.utils.remove_bg.remove_bg_document import ImageDecodeError, parse_rgb_color
+from src.utils.responses import StreamingFileResponse
+from src.utils.streaming_zip import MANIFEST_NAME, iter_zip, safe_filename
+
+
+MAX_BATCH_FILES = int(os.getenv('REMOVE_BG_BATCH_MAX_FILES', '100'))
+ALLOWED_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.bmp', '.tiff', '.tif'}
+
+
+def _process(data: bytes, text_color, output_format: OutputFormat, compression: str):
+    started = time.perf_counter()
+    try:
+        result = remove_background_bytes(
+            data,
+            invert=False,
+            text_color=text_color,
+            output_format=output_format,
+            compression=compression
+        )
+    except ImageDecodeError:
+        raise ValueError(
+            "Не удалось прочитать изображение: файл повреждён "
+            "или его формат не поддерживается"
+        )
+    return result, time.perf_counter() - started
+
+
+def iter_batch_results(
+    uploads: list[tuple[str, bytes]],
+    text_color: tuple[int, int, int] | None,
+    output_format: OutputFormat,
+    compression: str
+):
+    """
+    Yields (name in archive, data) as images finish, then the manifest.
+
+    Args:
+        uploads: Pairs (original file name, encoded image)
+        text_color: Text colour in BGR format
+        output_format: Result encoding
+        compression: PNG compression name
+    """
+    manifest = [None] * len(uploads)
+    pending = {}
+    workers = max(1, min(get_image_pool().size, len(uploads)))
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='remove-bg-batch')
+    try:
+        for index, (filename, data) in enumerate(uploads):
+            extension = os.path.splitext(filename)[1].lower()
+            if extension not in ALLOWED_EXTENSIONS:
+                manifest[index] = {
+                    'file': filename,
+                    'status': 'error',
+                    'error': f"Неподдерживаемый формат файла: {extension or 'без расширения'}",
+                }
+                continue
+            future = executor.submit(_process, data, text_color, output_format, compression)
+            pending[future] = index
+
+        for future in as_completed(pending):
+            index = pending.pop(future)
+            filename = uploads[index][0]
+            try:
+                result, seconds = future.result()
+            except Exception as e:
+                manifest[index] = {'file': filename, 'status': 'error', 'error': str(e)}
+                continue
+            stem = safe_filename(os.path.splitext(filename)[0], 'image')
+            archive_name = f"{index + 1:03d}_{stem}_no_bg{output_format.extension}"
+            manifest[index] = {
+                'file': filename,
+                'status': 'ok',
+                'output': archive_name,
+                'bytes': len(result),
+                'seconds': round(seconds, 3),
+            }
+            yield archive_name, result
+    finally:
+        # On client disconnect the files not started yet are dropped.
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    summary = {
+        'format': output_format.name,
+        'compression': compression,
+        'processed': sum(1 for entry in manifest if entry['status'] == 'ok'),
+        'failed': sum(1 for entry in manifest if entry['status'] == 'error'),
+        'files': manifest,
+    }
+    yield MANIFEST_NAME, json.dumps(summary, ensure_ascii=False, indent=2).encode('utf-8')
+
+
+def remove_bg_batch_handler(
+    request: Request,
+    files: list[UploadFile] = File(...),
+    color: str | None = Form(None),
+    output_format: str | None = None,
+    compression: str | None = None
+):
+    """
+    Handler for removing background from many uploaded images.
+
+    Args:
+        request: FastAPI request object
+        files: Uploaded image files
+        color: RGB color string in format "R,G,B" (default: black "0,0,0")
+        output_format: Result encoding: png, indexed, gray or webp (see encoding)
+        compression: PNG compression: fast or small
+
+    Returns a streamed ZIP with the results and manifest.json describing
+    every file; errors of single files are reported only in the manifest.
+    """
+    try:
+        files = [file for file in files or [] if file.filename]
+        if not files:
+            raise ValueError("Файлы не были загружены")
+        if len(files) > MAX_BATCH_FILES:
+            raise ValueError(
+                f"Слишком много файлов: {len(files)}, максимум {MAX_BATCH_FILES}"
+            )
+
+        text_color = (0, 0, 0)
+        if color:
+            try:
+                text_color = parse_rgb_color(color)
+            except ValueError as e:
+                raise ValueError(f"Неверный формат цвета: {e}. Используйте формат 'R,G,B' (например, '255,0,0')")
+
+        try:
+            fmt = get_output_format(output_format)
+            compression = (compression or '').strip() or DEFAULT_PNG_COMPRESSION
+            png_compression_level(compression)
+        except ValueError as e:
+            raise ValueError(f"Неверный формат результата: {e}")
+
+        # Uploads are closed when the request ends, while the archive is
+        # streamed after that, so their content is read up front.
+        uploads = [(file.filename, file.file.read()) for file in files]
+
+        return StreamingFileResponse(
+            iter_zip(
+                iter_batch_results(uploads, text_color, fmt, compression),
+                compression=zipfile.ZIP_STORED
+            ),
+            filename="Без фона.zip",
+            media_type='application/zip'
+        )
+
+    except Exception as e:
+        status = f"Ошибка обработки изображений: {str(e)}"
+        response = RedirectResponse(url="/remove_bg", status_code=303)
+        encoded_status = base64.b64encode(status.encode('utf-8')).decode('ascii')
+        response.set_cookie("remove_bg_status", encoded_status, max_age=10)
+        return response
@@ -0,0 +1,160 @@
+"""
+Output encodings for background-removed images.
+
+The result is almost always one ink colour over transparent pixels, so a
+full 8-bit BGRA PNG wastes both encoding time and bytes:
+
+    png     - BGRA PNG (as before)
+    indexed - palette PNG; with a known text colour it has two entries
+              (transparent and ink) and is stored at 1 bit per pixel,
+              otherwise the colours are quantized to 256
+    gray    - grayscale + alpha PNG
+    webp    - lossless WebP
+
+PNG compression is either 'fast' (zlib level 1) or 'small' (level 9).
+"""
+import io
+import os
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from src.utils.remove_bg.remove_bg_document import ImageEncodeError
+
+
+DEFAULT_OUTPUT_FORMAT = os.getenv('REMOVE_BG_OUTPUT_FORMAT', 'png')
+DEFAULT_PNG_COMPRESSION = os.getenv('REMOVE_BG_PNG_COMPRESSION', 'fast')
+
+PNG_COMPRESSION = {'fast': 1, 'small': 9}
+
+
+class OutputFormat:
+    """
+    Output encoding of the result.
+
+    Args:
+        name: Format name (form value)
+        title: Title for the form
+        extension: Result file extension
+        media_type: Result media type
+    """
+
+    def __init__(self, name: str, title: str, extension: str, media_type: str):
+        self.name = name
+        self.title = title
+        self.extension = extension
+        self.media_type = media_type
+
+
+OUTPUT_FORMATS = {
+    'png': OutputFormat('png', "PNG", '.png', 'image/png'),
+    'indexed': OutputFormat('indexed', "PNG с палитрой (меньше размер)", '.png', 'image/png'),
+    'gray': OutputFormat('gray', "PNG в оттенках серого", '.png', 'image/png'),
+    'webp': OutputFormat('webp', "WebP без потерь", '.webp', 'image/webp'),
+}
+
+
+def get_output_format(name: str | None = None) -> OutputFormat:
+    """
+    Returns the output format by name; empty name - the default format.
+
+    Raises:
+        ValueError: If there is no such format
+    """
+    name = (name or '').strip() or DEFAULT_OUTPUT_FORMAT
+    output_format = OUTPUT_FORMATS.get(name)
+    if output_format is None:
+        raise ValueError(
+            f"Unknown output format: {name}. Available: {', '.join(OUTPUT_FORMATS)}"
+        )
+    return output_format
+
+
+def png_compression_level(name: str | None = None) -> int:
+    """
+    zlib level for a compression name ('fast' or 'small').
+
+    Raises:
+        ValueError: If there is no such compression
+    """
+    name = (name or '').strip() or DEFAULT_PNG_COMPRESSION
+    level = PNG_COMPRESSION.get(name)
+    if level is None:
+        raise ValueError(
+            f"Unknown PNG compression: {name}. Available: {', '.join(PNG_COMPRESSION)}"
+        )
+    return level
+
+
+def _save_png(image: Image.Image, level: int, **params) -> bytes:
+    output = io.BytesIO()
+    try:
+        image.save(output, 'PNG', compress_level=level, **params)
+    except (OSError, ValueError) as e:
+        raise ImageEncodeError(f"Cannot encode result as PNG: {e}")
+    return output.getvalue()
+
+
+def _encode_indexed(
+    img: np.ndarray,
+    level: int,
+    text_color: tuple[int, int, int] | None
+) -> bytes:
+    height, width = img.shape[:2]
+    if text_color is not None:
+        # Only two colours: index 0 - transparent, index 1 - ink.
+        indices = np.ascontiguousarray(img[:, :, 3] > 0, dtype=np.uint8)
+        image = Image.frombuffer('P', (width, height), indices, 'raw', 'P', 0, 1)
+        blue, green, red = text_color
+        image.putpalette([0, 0, 0, red, green, blue])
+        return _save_png(image, level, transparency=0, bits=1)
+
+    rgba = Image.fromarray(cv2.cvtColor(img, cv2.COLOR_BGRA2RGBA))
+    image = rgba.quantize(256, method=Image.Quantize.FASTOCTREE)
+    return _save_png(image, level)
+
+
+def _encode_gray(img: np.ndarray, level: int) -> bytes:
+    gray_alpha = np.empty(img.shape[:2] + (2,), dtype=np.uint8)
+    gray_alpha[:, :, 0] = cv2.cvtColor(img, cv2.COLOR_BGRA2GRAY)
+    gray_alpha[:, :, 1] = img[:, :, 3]
+    return _save_png(Image.fromarray(gray_alpha), level)
+
+
+def encode_result(
+    img: np.ndarray,
+    output_format: OutputFormat | str | None = None,
+    compression: str | None = None,
+    text_color: tuple[int, int, int] | None = None
+) -> bytes:
+    """
+    Encodes a BGRA result of remove_background_image.
+
+    Args:
+        img: BGRA result
+        output_format: OutputFormat or its name (None - default)
+        compression: PNG compression 'fast' or 'small' (None - default)
+        text_color: Text colour the result was painted with, BGR
+
+    Raises:
+        ValueError: If the format or compression is unknown
+        ImageEncodeError: If the result cannot be encoded
+    """
+    if not isinstance(output_format, OutputFormat):
+        output_format = get_output_format(output_format)
+    level = png_compression_level(compression)
+
+    if output_format.name == 'indexed':
+        return _encode_indexed(img, level, text_color)
+    if output_format.name == 'gray':
+        return _encode_gray(img, level)
+
+    if output_format.name == 'webp':
+        params = [cv2.IMWRITE_WEBP_QUALITY, 101]  # above 100 - lossless
+    else:
+        params = [cv2.IMWRITE_PNG_COMPRESSION, level]
+    ok, encoded = cv2.imencode(output_format.extension, img, params)
+    if not ok:
+        raise ImageEncodeError(f"Cannot encode result as {output_format.name}")
+    return encoded.tobytes()
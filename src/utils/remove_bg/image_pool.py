@@ -0,0 +1,500 @@
+"""
+Process pool for background removal.
+
+OpenCV calls release the GIL, but the numpy masking in
+remove_background_image does not, so large scans processed in the
+server's threadpool stall request handling. Here the pixel work runs in
+a separate pool of worker processes.
+
+Pixels are not pickled: an encoded upload is copied into a
+multiprocessing.shared_memory segment as is, the worker decodes it
+(with max_dimension and crop, see decode_image) and writes the BGRA
+result straight into a second segment, and the parent encodes the result
+(see encoding.encode_result) from that segment. The parent never holds
+the decoded image. Already decoded arrays (pages of multi-page
+documents) are copied into the first segment instead. Only segment
+names, sizes and options cross the process boundary. With trim_padding
+the result is cut to its content before encoding.
+
+Segments live in /dev/shm, which is small in containers (shm_size), and
+a write past its end kills the process with SIGBUS. So the space of both
+segments is reserved with posix_fallocate before any pixel is written:
+an image larger than the whole of /dev/shm is rejected with
+ImageTooLargeError, and when the space is taken by other images the
+caller gets ImagePoolBusy.
+Colour variants are encoded from one result, so the worker runs once
+however many colours are requested.
+
+Backpressure: at most IMAGE_POOL_SIZE images are processed and
+IMAGE_POOL_MAX_PENDING wait; further callers wait up to
+IMAGE_POOL_QUEUE_TIMEOUT seconds and then get ImagePoolBusy. A task that
+runs longer than IMAGE_POOL_TASK_TIMEOUT has its worker processes
+terminated and the pool recycled, so a timed-out image does not keep
+using CPU and memory after its slot is released.
+IMAGE_POOL_SIZE=0 disables the pool (images are processed in the calling
+thread).
+"""
+import errno
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from src.utils.remove_bg.encoding import encode_result
+from src.utils.remove_bg.remove_bg_document import (
+    ImageTooLargeError,
+    RemoveBackgroundError,
+    check_image_size,
+    decode_image,
+    decoded_pixels_bound,
+    recolor_variants,
+    remove_background_image,
+    trim_to_content,
+)
+
+
+IMAGE_POOL_SIZE = int(os.getenv('IMAGE_POOL_SIZE', str(os.cpu_count() or 2)))
+IMAGE_POOL_MAX_PENDING = int(os.getenv('IMAGE_POOL_MAX_PENDING', str(2 * IMAGE_POOL_SIZE)))
+IMAGE_POOL_QUEUE_TIMEOUT = float(os.getenv('IMAGE_POOL_QUEUE_TIMEOUT', '30'))
+IMAGE_POOL_TASK_TIMEOUT = float(os.getenv('IMAGE_POOL_TASK_TIMEOUT', '120'))
+SHARED_MEMORY_ROOT = '/dev/shm'
+
+
+class ImagePoolBusy(RemoveBackgroundError):
+    """All workers are busy and the queue is full."""
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    """Opens a segment created by another process without taking ownership."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13: spawned workers share the parent's resource
+        # tracker, where the segment is already registered by its creator.
+        return shared_memory.SharedMemory(name=name)
+
+
+def _shared_memory_capacity() -> int | None:
+    try:
+        stat = os.statvfs(SHARED_MEMORY_ROOT)
+    except OSError:
+        return None
+    return stat.f_blocks * stat.f_frsize
+
+
+def _create_segment(size: int) -> shared_memory.SharedMemory:
+    """
+    Creates a segment with its memory reserved up front.
+
+    Raises:
+        ImageTooLargeError: If the segment cannot fit into shared memory at all
+        ImagePoolBusy: If shared memory is currently taken by other images
+    """
+    segment = shared_memory.SharedMemory(create=True, size=max(1, size))
+    fallocate = getattr(os, 'posix_fallocate', None)
+    if fallocate is None:
+        return segment
+    try:
+        # SharedMemory only truncates the file; without a reservation a
+        # full tmpfs is discovered by SIGBUS on the first write.
+        fallocate(segment._fd, 0, segment.size)
+    except OSError as e:
+        segment.close()
+        segment.unlink()
+        if e.errno not in (errno.ENOSPC, errno.EFBIG):
+            raise
+        capacity = _shared_memory_capacity()
+        if capacity is not None and size > capacity:
+            raise ImageTooLargeError(
+                f"Image needs {size} bytes of shared memory, only {capacity} available"
+            )
+        raise ImagePoolBusy("Not enough shared memory for the image")
+    return segment
+
+
+def _release(*segments) -> None:
+    for segment in segments:
+        if segment is not None:
+            segment.close()
+            segment.unlink()
+
+
+class EncodedImage:
+    """
+    Encoded upload decoded by the worker (see decode_image).
+
+    Args:
+        data: Encoded image as a bytes-like object
+        max_dimension: Longest side of the decoded image
+        crop: Region cut out of the decoded image, (x, y, width, height)
+    """
+
+    def __init__(
+        self,
+        data,
+        max_dimension: int | None = None,
+        crop: tuple[int, int, int, int] | None = None
+    ):
+        self.data = data
+        self.max_dimension = max_dimension
+        self.crop = crop
+
+    def decode(self) -> np.ndarray:
+        return decode_image(self.data, self.max_dimension, crop=self.crop)
+
+    def result_bytes(self) -> int:
+        """
+        Size of a segment that holds the BGRA result (from the header).
+
+        Raises:
+            ImageDecodeError: If the header cannot be read
+            ImageTooLargeError: If the image exceeds the pixel budget
+        """
+        width, height = check_image_size(self.data)
+        return 4 * decoded_pixels_bound(width, height, self.max_dimension, self.crop)
+
+
+def _process_encoded(
+    source_name: str,
+    source_size: int,
+    result_name: str,
+    result_size: int,
+    max_dimension: int | None,
+    crop: tuple[int, int, int, int] | None,
+    invert: bool,
+    text_color: tuple[int, int, int] | None,
+    method: str = 'otsu'
+) -> tuple[int, int]:
+    """
+    Worker entry point: decodes an encoded image from one segment and
+    writes the BGRA result into another. Returns the result (height, width).
+    """
+    source = _attach(source_name)
+    result = _attach(result_name)
+    try:
+        # Only the encoded bytes are copied: no view of the segment outlives it.
+        img = decode_image(bytes(source.buf[:source_size]), max_dimension, crop=crop)
+        height, width = img.shape[:2]
+        if height * width * 4 > result_size:
+            raise RemoveBackgroundError("Decoded image does not fit the result segment")
+        out = np.ndarray((height, width, 4), dtype=np.uint8, buffer=result.buf)
+        remove_background_image(img, invert, text_color, out=out, method=method)
+        del img, out
+        return height, width
+    finally:
+        source.close()
+        result.close()
+
+
+def _process_shared(
+    source_name: str,
+    result_name: str,
+    shape: tuple[int, ...],
+    invert: bool,
+    text_color: tuple[int, int, int] | None,
+    method: str = 'otsu'
+) -> None:
+    """Worker entry point: reads pixels from one segment, writes BGRA to another."""
+    source = _attach(source_name)
+    result = _attach(result_name)
+    try:
+        img = np.ndarray(shape, dtype=np.uint8, buffer=source.buf)
+        out = np.ndarray((shape[0], shape[1], 4), dtype=np.uint8, buffer=result.buf)
+        remove_background_image(img, invert, text_color, out=out, method=method)
+        del img, out
+    finally:
+        source.close()
+        result.close()
+
+
+class ImagePool:
+    """
+    Worker processes for background removal with bounded queue.
+
+    Args:
+        size: Number of worker processes (0 - process in the calling thread)
+        max_pending: Images allowed to wait for a free worker
+        queue_timeout: Seconds to wait for a place in the queue
+        task_timeout: Seconds to wait for a worker result
+    """
+
+    def __init__(
+        self,
+        size: int = IMAGE_POOL_SIZE,
+        max_pending: int = IMAGE_POOL_MAX_PENDING,
+        queue_timeout: float = IMAGE_POOL_QUEUE_TIMEOUT,
+        task_timeout: float = IMAGE_POOL_TASK_TIMEOUT
+    ):
+        self.size = max(0, size)
+        self.max_pending = max(0, max_pending)
+        self.queue_timeout = queue_timeout
+        self.task_timeout = task_timeout
+        self._slots = threading.BoundedSemaphore(max(1, self.size) + self.max_pending)
+        self._executor: ProcessPoolExecutor | None = None
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.processed = 0
+        self.rejected = 0
+        self.restarts = 0
+        self.timeouts = 0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # spawn: fork of a multithreaded server process is unsafe.
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.size,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+            return self._executor
+
+    def _reset_executor(self, executor: ProcessPoolExecutor, terminate: bool = False) -> None:
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+                self.restarts += 1
+        if terminate:
+            # shutdown() does not stop a running task.
+            terminate_workers = getattr(executor, 'terminate_workers', None)
+            if terminate_workers is not None:
+                terminate_workers()
+                return
+            for process in list((getattr(executor, '_processes', None) or {}).values()):
+                process.terminate()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, img, invert: bool, text_color, encode=None, method: str = 'otsu'):
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            with self._lock:
+                self.rejected += 1
+            raise ImagePoolBusy("Image processing queue is full")
+        with self._lock:
+            self.in_flight += 1
+        try:
+            if self.size == 0:
+                if isinstance(img, EncodedImage):
+                    img = img.decode()
+                result = remove_background_image(img, invert, text_color, method=method)
+                return encode(result) if encode else result
+            if isinstance(img, EncodedImage):
+                return self._run_encoded(img, invert, text_color, encode, method)
+            return self._run_shared(img, invert, text_color, encode, method)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+                self.processed += 1
+            self._slots.release()
+
+    def _submit(self, func, *args):
+        """Runs func in a worker process and returns its result."""
+        executor = self._get_executor()
+        try:
+            return executor.submit(func, *args).result(timeout=self.task_timeout)
+        except BrokenProcessPool:
+            self._reset_executor(executor)
+            raise RemoveBackgroundError("Image worker process crashed")
+        except FutureTimeout:
+            self._reset_executor(executor, terminate=True)
+            with self._lock:
+                self.timeouts += 1
+            raise RemoveBackgroundError(
+                f"Image processing took longer than {self.task_timeout:g} s"
+            )
+
+    @staticmethod
+    def _finish(result: shared_memory.SharedMemory, height: int, width: int, encode):
+        out = np.ndarray((height, width, 4), dtype=np.uint8, buffer=result.buf)
+        try:
+            return encode(out) if encode else out.copy()
+        finally:
+            del out
+
+    def _run_shared(self, img: np.ndarray, invert: bool, text_color, encode, method: str):
+        height, width = img.shape[:2]
+        source = result = None
+        try:
+            source = _create_segment(img.nbytes)
+            result = _create_segment(height * width * 4)
+            np.copyto(np.ndarray(img.shape, dtype=np.uint8, buffer=source.buf), img)
+            self._submit(
+                _process_shared, source.name, result.name,
+                img.shape, invert, text_color, method
+            )
+            return self._finish(result, height, width, encode)
+        finally:
+            _release(source, result)
+
+    def _run_encoded(self, image: EncodedImage, invert: bool, text_color, encode, method: str):
+        data = memoryview(image.data).cast('B')
+        result_size = image.result_bytes()
+        source = result = None
+        try:
+            source = _create_segment(data.nbytes)
+            result = _create_segment(result_size)
+            source.buf[:data.nbytes] = data
+            height, width = self._submit(
+                _process_encoded, source.name, data.nbytes, result.name, result_size,
+                image.max_dimension, image.crop, invert, text_color, method
+            )
+            return self._finish(result, height, width, encode)
+        finally:
+            data.release()
+            _release(source, result)
+
+    def remove_background_image(
+        self,
+        img: np.ndarray | EncodedImage,
+        invert: bool = False,
+        text_color: tuple[int, int, int] | None = None,
+        method: str = 'otsu'
+    ) -> np.ndarray:
+        """Pool-backed remove_background_image: returns the BGRA array."""
+        return self._run(img, invert, text_color, method=method)
+
+    def remove_background_encoded(
+        self,
+        img: np.ndarray | EncodedImage,
+        invert: bool = False,
+        text_color: tuple[int, int, int] | None = None,
+        output_format=None,
+        compression: str | None = None,
+        method: str = 'otsu',
+        trim_padding: int | None = None
+    ) -> bytes:
+        """
+        Processes a decoded image and returns the encoded result (see encoding).
+
+        With trim_padding the result is cropped to the text plus that many
+        pixels before encoding (see trim_to_content).
+        """
+        def encode(result: np.ndarray) -> bytes:
+            if trim_padding is not None:
+                result = trim_to_content(result, trim_padding)
+            return encode_result(result, output_format, compression, text_color)
+        return self._run(img, invert, text_color, encode, method)
+
+    def remove_background_variants(
+        self,
+        img: np.ndarray | EncodedImage,
+        text_colors: list[tuple[int, int, int]],
+        invert: bool = False,
+        output_format=None,
+        compression: str | None = None,
+        method: str = 'otsu',
+        trim_padding: int | None = None
+    ) -> list[bytes]:
+        """
+        Processes a decoded image once and encodes it in every text colour.
+
+        Returns the encoded results in the order of text_colors.
+        """
+        def encode(result: np.ndarray) -> list[bytes]:
+            if trim_padding is not None:
+                result = trim_to_content(result, trim_padding)
+            return [
+                encode_result(variant, output_format, compression, text_color)
+                for text_color, variant in recolor_variants(result, text_colors)
+            ]
+        return self._run(img, invert, None, encode, method)
+
+    def remove_background_bytes(
+        self,
+        data,
+        invert: bool = False,
+        text_color: tuple[int, int, int] | None = None,
+        output_format=None,
+        compression: str | None = None,
+        method: str = 'otsu',
+        max_dimension: int | None = None,
+        crop: tuple[int, int, int, int] | None = None,
+        trim_padding: int | None = None
+    ) -> bytes:
+        """
+        Pool-backed remove_background_bytes: returns the encoded result (PNG by default).
+
+        The upload is decoded by the worker (see decode_image for the pixel
+        budget, max_dimension and crop); its header is checked first.
+        """
+        return self.remove_background_encoded(
+            EncodedImage(data, max_dimension, crop), invert, text_color,
+            output_format, compression, method, trim_padding
+        )
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'size': self.size,
+                'max_pending': self.max_pending,
+                'in_flight': self.in_flight,
+                'processed': self.processed,
+                'rejected': self.rejected,
+                'restarts': self.restarts,
+                'timeouts': self.timeouts,
+            }
+
+
+_pool: ImagePool | None = None
+_pool_lock = threading.Lock()
+
+
+def get_image_pool() -> ImagePool:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ImagePool()
+        return _pool
+
+
+def stop_image_pool() -> None:
+    """Stops worker processes (on application shutdown)."""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown()
+
+
+def remove_background_bytes(
+    data,
+    invert: bool = False,
+    text_color: tuple[int, int, int] | None = None,
+    output_format=None,
+    compression: str | None = None,
+    method: str = 'otsu',
+    max_dimension: int | None = None,
+    crop: tuple[int, int, int, int] | None = None,
+    trim_padding: int | None = None
+) -> bytes:
+    """remove_background_bytes executed in the shared image pool."""
+    return get_image_pool().remove_background_bytes(
+        data, invert, text_color, output_format, compression, method,
+        max_dimension, crop, trim_padding
+    )
+
+
+def remove_background_variants(
+    data,
+    text_colors: list[tuple[int, int, int]],
+    invert: bool = False,
+    output_format=None,
+    compression: str | None = None,
+    method: str = 'otsu',
+    max_dimension: int | None = None,
+    crop: tuple[int, int, int, int] | None = None,
+    trim_padding: int | None = None
+) -> list[bytes]:
+    """Decodes an upload once and returns it encoded in every text colour (shared pool)."""
+    return get_image_pool().remove_background_variants(
+        EncodedImage(data, max_dimension, crop), text_colors, invert,
+        output_format, compression, method, trim_padding
+    )
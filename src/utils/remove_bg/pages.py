@@ -0,0 +1,433 @@
+"""
+Multi-page scans (TIFF, PDF) for background removal.
+
+cv2.imdecode reads only the first page of a TIFF and does not read PDF.
+Pages are decoded lazily, one at a time: TIFF frames with Pillow (seek
+to the next frame), PDF pages rasterized by pdftoppm (poppler-utils)
+one page per call. Decoded pages go to the image pool, and at most
+pool size + 1 pages are decoded or processed at once, so memory stays
+bounded to a few pages regardless of document length. Results are
+returned in page order.
+
+The result is either a ZIP with one image per page or a single
+multi-page TIFF (RGBA, deflate), written page by page. The ZIP is
+streamed, so a page that fails does not cut the archive short: the
+error is recorded in manifest.json, which is written last (as in
+batch_handler).
+
+Every page is checked against the pixel budget before it is decoded
+(TIFF frame header, PDF page size at the rendering DPI). With a
+max_dimension, pdftoppm renders pages straight at that size.
+
+A crop rectangle (in pixels of the rendered page) is applied to every
+page before processing, and with trim_padding every result is cut to
+its content.
+"""
+import io
+import json
+import os
+import re
+import shutil
+import subprocess
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+from PIL import Image, TiffImagePlugin
+
+from src.utils.office import make_scratch_dir
+from src.utils.remove_bg.encoding import OutputFormat
+from src.utils.remove_bg.image_pool import get_image_pool
+from src.utils.streaming_zip import MANIFEST_NAME
+from src.utils.remove_bg.remove_bg_document import (
+    MAX_IMAGE_PIXELS,
+    ImageDecodeError,
+    ImageTooLargeError,
+    RemoveBackgroundError,
+    crop_image,
+    decode_image,
+    fit_dimension,
+    trim_to_content,
+)
+
+
+PDF_DPI = int(os.getenv('REMOVE_BG_PDF_DPI', '300'))
+MAX_PAGES = int(os.getenv('REMOVE_BG_MAX_PAGES', '200'))
+PDF_PAGE_TIMEOUT = 60
+
+TIFF_EXTENSIONS = {'.tif', '.tiff'}
+PDF_EXTENSIONS = {'.pdf'}
+
+PAGES_ZIP = 'zip'
+PAGES_TIFF = 'tiff'
+
+
+def _tiff_frame_to_array(frame: Image.Image) -> np.ndarray:
+    if frame.mode not in ('L', 'RGB'):
+        frame = frame.convert('L' if frame.mode in ('1', 'I;16', 'I', 'F') else 'RGB')
+    pixels = np.asarray(frame)
+    if pixels.ndim == 3:
+        return cv2.cvtColor(pixels, cv2.COLOR_RGB2BGR)
+    return pixels
+
+
+def _open_tiff(data) -> Image.Image:
+    try:
+        image = Image.open(io.BytesIO(data))
+        if image.format != 'TIFF':
+            raise ImageDecodeError("Not a TIFF image")
+        return image
+    except (OSError, SyntaxError) as e:
+        raise ImageDecodeError(f"Cannot decode TIFF: {e}")
+
+
+def tiff_page_count(data) -> int:
+    """
+    Number of pages in a TIFF.
+
+    Raises:
+        ImageDecodeError: If the data is not a TIFF image
+    """
+    return getattr(_open_tiff(data), 'n_frames', 1)
+
+
+def _check_page_size(width: int, height: int, number: int) -> None:
+    if width * height > MAX_IMAGE_PIXELS:
+        raise ImageTooLargeError(
+            f"Page {number} is too large: {width}x{height}, limit {MAX_IMAGE_PIXELS} pixels"
+        )
+
+
+def _read_tiff_page(image: Image.Image, index: int, max_dimension: int | None) -> np.ndarray:
+    try:
+        image.seek(index)
+        _check_page_size(*image.size, index + 1)
+        page = _tiff_frame_to_array(image)
+    except (OSError, SyntaxError, ValueError) as e:
+        if isinstance(e, ImageTooLargeError):
+            raise
+        raise ImageDecodeError(f"Cannot decode TIFF page {index + 1}: {e}")
+    return fit_dimension(page, max_dimension)
+
+
+def iter_tiff_pages(data, max_dimension: int | None = None):
+    """Yields TIFF pages as BGR or grayscale arrays, one frame at a time."""
+    image = _open_tiff(data)
+    for index in range(getattr(image, 'n_frames', 1)):
+        yield _read_tiff_page(image, index, max_dimension)
+
+
+def _poppler(tool: str) -> str:
+    path = shutil.which(tool)
+    if path is None:
+        raise RemoveBackgroundError(f"PDF input requires {tool} (poppler-utils)")
+    return path
+
+
+def _pdfinfo(pdf_path: str, *options: str) -> bytes:
+    result = subprocess.run(
+        [_poppler('pdfinfo'), *options, pdf_path],
+        capture_output=True, timeout=PDF_PAGE_TIMEOUT
+    )
+    if result.returncode != 0:
+        raise ImageDecodeError("Cannot read PDF")
+    return result.stdout
+
+
+def pdf_page_count(pdf_path: str) -> int:
+    """
+    Number of pages in a PDF file (pdfinfo).
+
+    Raises:
+        ImageDecodeError: If the file is not a readable PDF
+    """
+    match = re.search(rb'^Pages:\s+(\d+)', _pdfinfo(pdf_path), re.MULTILINE)
+    if match is None:
+        raise ImageDecodeError("Cannot read PDF")
+    return int(match.group(1))
+
+
+def check_pdf_page_sizes(pdf_path: str, page_count: int, dpi: int = PDF_DPI) -> None:
+    """
+    Checks that every page rendered at dpi fits the pixel budget.
+
+    Raises:
+        ImageTooLargeError: If a page is over MAX_IMAGE_PIXELS
+    """
+    info = _pdfinfo(pdf_path, '-f', '1', '-l', str(page_count))
+    sizes = re.findall(rb'^Page\s+(\d+) size:\s+([\d.]+) x ([\d.]+) pts', info, re.MULTILINE)
+    for number, width, height in sizes:
+        _check_page_size(
+            round(float(width) / 72 * dpi), round(float(height) / 72 * dpi), int(number)
+        )
+
+
+def render_pdf_page(
+    pdf_path: str,
+    page: int,
+    dpi: int = PDF_DPI,
+    max_dimension: int | None = None
+) -> np.ndarray:
+    """
+    Rasterizes one PDF page (1-based) into a BGR array.
+
+    With max_dimension the page is rendered with its longest side of that
+    size instead of at dpi.
+
+    Raises:
+        ImageDecodeError: If the page cannot be rendered
+    """
+    size = ['-scale-to', str(max_dimension)] if max_dimension else ['-r', str(dpi)]
+    result = subprocess.run(
+        [_poppler('pdftoppm'), '-f', str(page), '-l', str(page), *size, pdf_path],
+        capture_output=True, timeout=PDF_PAGE_TIMEOUT
+    )
+    if result.returncode != 0 or not result.stdout:
+        raise ImageDecodeError(f"Cannot render PDF page {page}")
+    return decode_image(result.stdout)
+
+
+def iter_pdf_pages(
+    pdf_path: str,
+    page_count: int,
+    dpi: int = PDF_DPI,
+    max_dimension: int | None = None
+):
+    """Yields PDF pages as BGR arrays, rendering one page per call."""
+    for page in range(1, page_count + 1):
+        yield render_pdf_page(pdf_path, page, dpi, max_dimension)
+
+
+def is_multipage(filename: str, data) -> bool:
+    """True for PDF and for TIFF with more than one page."""
+    extension = os.path.splitext(filename)[1].lower()
+    if extension in PDF_EXTENSIONS:
+        return True
+    if extension not in TIFF_EXTENSIONS:
+        return False
+    try:
+        return tiff_page_count(data) > 1
+    except ImageDecodeError:
+        # Unreadable TIFF is reported by the single-image path.
+        return False
+
+
+class PageSource:
+    """
+    Lazily decoded pages of a multi-page document.
+
+    open() reads the page count; a PDF is written to a scratch file for
+    pdftoppm, which is removed by close(). Also usable as a context
+    manager.
+    """
+
+    def __init__(
+        self,
+        filename: str,
+        data,
+        dpi: int = PDF_DPI,
+        max_dimension: int | None = None
+    ):
+        self.filename = filename
+        self.data = data
+        self.dpi = dpi
+        self.max_dimension = max_dimension
+        self.is_pdf = os.path.splitext(filename)[1].lower() in PDF_EXTENSIONS
+        self.page_count = 0
+        self._workdir = None
+        self._pdf_path = None
+
+    def open(self) -> 'PageSource':
+        """
+        Raises:
+            ValueError: If the document has more than MAX_PAGES pages
+            ImageDecodeError: If the document cannot be read
+            ImageTooLargeError: If a PDF page at the rendering DPI is over the budget
+        """
+        try:
+            if self.is_pdf:
+                self._workdir = make_scratch_dir('rit-pages-')
+                self._pdf_path = os.path.join(self._workdir, 'input.pdf')
+                with open(self._pdf_path, 'wb') as pdf_file:
+                    pdf_file.write(self.data)
+                self.data = None
+                self.page_count = pdf_page_count(self._pdf_path)
+            else:
+                self.page_count = tiff_page_count(self.data)
+            if self.page_count > MAX_PAGES:
+                raise ValueError(f"Too many pages: {self.page_count}, maximum {MAX_PAGES}")
+            if self.is_pdf and not self.max_dimension:
+                check_pdf_page_sizes(self._pdf_path, self.page_count, self.dpi)
+        except Exception:
+            self.close()
+            raise
+        return self
+
+    def close(self) -> None:
+        if self._workdir is not None:
+            shutil.rmtree(self._workdir, ignore_errors=True)
+            self._workdir = None
+
+    def __enter__(self) -> 'PageSource':
+        return self.open()
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def __iter__(self):
+        if self.is_pdf:
+            return iter_pdf_pages(self._pdf_path, self.page_count, self.dpi, self.max_dimension)
+        return iter_tiff_pages(self.data, self.max_dimension)
+
+    def iter_pages(self):
+        """
+        Yields (page number, page array or the exception it failed with),
+        so that one broken page does not stop the others.
+        """
+        image = None if self.is_pdf else _open_tiff(self.data)
+        for number in range(1, self.page_count + 1):
+            try:
+                if self.is_pdf:
+                    page = render_pdf_page(self._pdf_path, number, self.dpi, self.max_dimension)
+                else:
+                    page = _read_tiff_page(image, number - 1, self.max_dimension)
+            except Exception as e:
+                yield number, e
+                continue
+            yield number, page
+            del page
+
+
+def iter_processed_pages(pages, process, workers: int | None = None):
+    """
+    Runs process(page) for each page in parallel, yielding results in order.
+
+    The next page is decoded only when fewer than workers + 1 pages are
+    in flight, so at most that many pages are held in memory.
+    """
+    if workers is None:
+        workers = max(1, get_image_pool().size)
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='remove-bg-pages')
+    in_flight = deque()
+    try:
+        for page in pages:
+            in_flight.append(executor.submit(process, page))
+            del page
+            if len(in_flight) > workers:
+                yield in_flight.popleft().result()
+        while in_flight:
+            yield in_flight.popleft().result()
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def write_multipage_tiff(results) -> bytes:
+    """Writes BGRA page arrays into one multi-page TIFF, page by page."""
+    output = io.BytesIO()
+    with TiffImagePlugin.AppendingTiffWriter(output) as writer:
+        for result in results:
+            page = Image.fromarray(cv2.cvtColor(result, cv2.COLOR_BGRA2RGBA))
+            del result
+            page.save(writer, 'TIFF', compression='tiff_adobe_deflate')
+            writer.newFrame()
+    if not output.getvalue():
+        raise ImageDecodeError("Document has no pages")
+    return output.getvalue()
+
+
+def page_error_message(error: Exception) -> str:
+    """Error of one page for the manifest."""
+    if isinstance(error, ImageTooLargeError):
+        return f"Страница слишком большая: {error}"
+    if isinstance(error, ImageDecodeError):
+        return "Не удалось прочитать страницу"
+    if isinstance(error, subprocess.TimeoutExpired):
+        return "Превышено время ожидания отрисовки страницы"
+    return str(error)
+
+
+def iter_page_images(
+    source: PageSource,
+    stem: str,
+    text_color: tuple[int, int, int] | None,
+    output_format: OutputFormat,
+    compression: str | None = None,
+    method: str = 'otsu',
+    crop: tuple[int, int, int, int] | None = None,
+    trim_padding: int | None = None
+):
+    """
+    Yields (name in archive, encoded result) per page, then the manifest;
+    closes the source at the end. Failed pages are listed in the manifest.
+
+    Args:
+        source: Opened PageSource
+        stem: Base name of the page files
+        text_color: Text colour in BGR format
+        output_format: Result encoding
+        compression: PNG compression name
+        method: Threshold method (see remove_bg_document)
+        crop: Region of every page to process, (x, y, width, height)
+        trim_padding: Padding around the content when trimming (None - no trim)
+    """
+    pool = get_image_pool()
+
+    def process(item) -> tuple[int, bytes | Exception]:
+        number, page = item
+        if isinstance(page, Exception):
+            return number, page
+        try:
+            return number, pool.remove_background_encoded(
+                crop_image(page, crop), False, text_color, output_format, compression,
+                method, trim_padding
+            )
+        except Exception as e:
+            return number, e
+
+    try:
+        width = max(3, len(str(source.page_count)))
+        manifest = []
+        for number, result in iter_processed_pages(source.iter_pages(), process):
+            if isinstance(result, Exception):
+                manifest.append({
+                    'page': number, 'status': 'error', 'error': page_error_message(result)
+                })
+                continue
+            name = f"{stem}_{number:0{width}d}{output_format.extension}"
+            manifest.append({'page': number, 'status': 'ok', 'output': name, 'bytes': len(result)})
+            yield name, result
+    finally:
+        source.close()
+
+    summary = {
+        'pages': source.page_count,
+        'format': output_format.name,
+        'compression': compression,
+        'processed': sum(1 for entry in manifest if entry['status'] == 'ok'),
+        'failed': sum(1 for entry in manifest if entry['status'] == 'error'),
+        'files': manifest,
+    }
+    yield MANIFEST_NAME, json.dumps(summary, ensure_ascii=False, indent=2).encode('utf-8')
+
+
+def multipage_tiff(
+    source: PageSource,
+    text_color: tuple[int, int, int] | None,
+    method: str = 'otsu',
+    crop: tuple[int, int, int, int] | None = None,
+    trim_padding: int | None = None
+) -> bytes:
+    """Processes all pages of an opened source into one multi-page TIFF."""
+    pool = get_image_pool()
+
+    def process(page: np.ndarray) -> np.ndarray:
+        result = pool.remove_background_image(crop_image(page, crop), False, text_color, method)
+        if trim_padding is not None:
+            result = trim_to_content(result, trim_padding)
+        return result
+
+    try:
+        return write_multipage_tiff(iter_processed_pages(source, process))
+    finally:
+        source.close()
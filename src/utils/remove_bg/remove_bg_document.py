@@ -1,12 +1,90 @@
 """
 Utility for removing background from documents and text images.
-Uses Otsu's method for automatic threshold determination.
+Uses Otsu's method for automatic threshold determination, or a local
+threshold (Sauvola, Bradley) for unevenly lit photos.
+
+Images are processed in memory: encoded bytes are decoded with
+cv2.imdecode and the result is returned as an ndarray or re-encoded
+with cv2.imencode. Failures raise RemoveBackgroundError subclasses.
+
+Before decoding, the image size is read from the header (Pillow opens
+files lazily) and images over MAX_IMAGE_PIXELS are rejected. With a
+max_dimension, JPEG is decoded at 1/2, 1/4 or 1/8 scale
+(IMREAD_REDUCED_COLOR_*, scaled DCT in libjpeg), so the full-size
+bitmap is never built; the remaining reduction is done with INTER_AREA.
+
+Images larger than TILED_MIN_PIXELS are processed in tiled mode: the
+Otsu threshold and mean brightness are computed from the histogram of a
+decimated sample, then the threshold is applied band by band straight
+into the output array. Peak memory stays at about the input, the output
+and one band, instead of several full-size intermediate arrays.
+
+Local thresholds compare each pixel with the mean (and for Sauvola the
+standard deviation) of a window around it. Window sums are taken from
+integral images (cv2.integral2), so a pixel costs four lookups whatever
+the window size. Integrals are built per band (band rows plus half a
+window above and below), so local modes always run band by band.
+
+A crop rectangle limits processing to a region of the image:
+cv2.imdecode has no region decoding, so the whole image is still decoded
+(at reduced scale for JPEG when max_dimension allows it, the reduction
+being chosen for the region) and the region is then taken as a view.
+Thresholding, recolouring and encoding only touch the region. With the
+image pool the decode happens in the worker process. trim_to_content
+cuts the result down to the bounding box of the text, so work and
+output size follow the content, not the photo.
+
+Several ink colours are produced from one result (recolor_variants):
+the mask is computed once and each variant is a masked fill of a
+reused buffer.
 """
 
-import sys
+import io
+import os
+import warnings
 from pathlib import Path
 
 import cv2
+import numpy as np
+from PIL import Image
+
+
+TILED_MIN_PIXELS = int(os.getenv('REMOVE_BG_TILED_MIN_PIXELS', str(16_000_000)))
+TILE_ROWS = int(os.getenv('REMOVE_BG_TILE_ROWS', '256'))
+SAMPLE_PIXELS = int(os.getenv('REMOVE_BG_SAMPLE_PIXELS', str(4_000_000)))
+MAX_IMAGE_PIXELS = int(os.getenv('REMOVE_BG_MAX_PIXELS', str(120_000_000)))
+TRIM_PADDING = int(os.getenv('REMOVE_BG_TRIM_PADDING', '16'))
+MAX_COLOR_VARIANTS = int(os.getenv('REMOVE_BG_MAX_VARIANTS', '16'))
+
+THRESHOLD_METHODS = ('otsu', 'sauvola', 'bradley')
+LOCAL_WINDOW = int(os.getenv('REMOVE_BG_LOCAL_WINDOW', '0'))
+SAUVOLA_K = 0.2
+SAUVOLA_R = 128.0
+BRADLEY_T = 0.15
+
+
+class RemoveBackgroundError(Exception):
+    """Base error of background removal."""
+
+
+class ImageNotFoundError(RemoveBackgroundError, FileNotFoundError):
+    """Input image file does not exist."""
+
+
+class ImageDecodeError(RemoveBackgroundError, ValueError):
+    """Input data is not a supported image."""
+
+
+class ImageEncodeError(RemoveBackgroundError):
+    """Result cannot be encoded or written."""
+
+
+class ImageTooLargeError(RemoveBackgroundError, ValueError):
+    """Image dimensions exceed the pixel budget."""
+
+
+class CropOutsideImageError(RemoveBackgroundError, ValueError):
+    """Crop rectangle does not overlap the image."""
 
 
 def parse_rgb_color(color_str: str) -> tuple[int, int, int]:
@@ -36,6 +114,134 @@ def parse_rgb_color(color_str: str) -> tuple[int, int, int]:
         raise ValueError(f"Invalid color format: {e}")
 
 
+def parse_rgb_colors(colors_str: str) -> list[tuple[int, int, int]]:
+    """
+    Parses a list of RGB colours separated by ";" into unique BGR tuples.
+
+    Args:
+        colors_str: Colours in format "R,G,B;R,G,B" (e.g., "0,0,0;0,0,255")
+
+    Raises:
+        ValueError: If a colour is invalid or there are more than MAX_COLOR_VARIANTS
+    """
+    colors = []
+    for part in colors_str.split(';'):
+        if part.strip():
+            color = parse_rgb_color(part)
+            if color not in colors:
+                colors.append(color)
+    if not colors:
+        raise ValueError("No colors given")
+    if len(colors) > MAX_COLOR_VARIANTS:
+        raise ValueError(f"Too many colors: {len(colors)}, maximum {MAX_COLOR_VARIANTS}")
+    return colors
+
+
+def parse_crop(crop_str: str) -> tuple[int, int, int, int]:
+    """
+    Parses a crop rectangle string.
+
+    Args:
+        crop_str: Rectangle in format "X,Y,W,H" in pixels (e.g., "100,50,800,300")
+
+    Returns:
+        Tuple (x, y, width, height)
+    """
+    try:
+        parts = crop_str.split(',')
+        if len(parts) != 4:
+            raise ValueError("Crop must be in format 'X,Y,W,H'")
+
+        x, y, width, height = (int(part.strip()) for part in parts)
+
+        if x < 0 or y < 0 or width <= 0 or height <= 0:
+            raise ValueError("X and Y must not be negative, W and H must be positive")
+
+        return (x, y, width, height)
+    except ValueError as e:
+        raise ValueError(f"Invalid crop format: {e}")
+
+
+def crop_image(
+    img: np.ndarray,
+    crop: tuple[int, int, int, int] | None,
+    scale: float = 1.0
+) -> np.ndarray:
+    """
+    Returns the crop rectangle of an image as a view (no copy).
+
+    The rectangle is clipped to the image.
+
+    Args:
+        img: Image array
+        crop: (x, y, width, height); None - the whole image
+        scale: Factor applied to the rectangle (image decoded at reduced size)
+
+    Raises:
+        CropOutsideImageError: If the rectangle lies outside the image
+    """
+    if crop is None:
+        return img
+    height, width = img.shape[:2]
+    x, y, crop_width, crop_height = crop
+    left = int(x * scale)
+    top = int(y * scale)
+    if left >= width or top >= height:
+        raise CropOutsideImageError(f"Crop rectangle is outside the image ({width}x{height})")
+    right = min(width, max(left + 1, round((x + crop_width) * scale)))
+    bottom = min(height, max(top + 1, round((y + crop_height) * scale)))
+    return img[top:bottom, left:right]
+
+
+def content_bounds(
+    result: np.ndarray,
+    padding: int = TRIM_PADDING
+) -> tuple[int, int, int, int] | None:
+    """
+    Bounding box (left, top, right, bottom) of the opaque pixels of a BGRA
+    result, widened by padding and clipped to the image.
+
+    Returns None if the result has no opaque pixels.
+    """
+    alpha = result[:, :, 3]
+    x, y, width, height = cv2.boundingRect(alpha)
+    if width == 0 or height == 0:
+        return None
+    rows, columns = alpha.shape
+    return (
+        max(0, x - padding),
+        max(0, y - padding),
+        min(columns, x + width + padding),
+        min(rows, y + height + padding),
+    )
+
+
+def trim_to_content(result: np.ndarray, padding: int = TRIM_PADDING) -> np.ndarray:
+    """Crops a BGRA result to its content plus padding (a view; unchanged if empty)."""
+    bounds = content_bounds(result, padding)
+    if bounds is None:
+        return result
+    left, top, right, bottom = bounds
+    return result[top:bottom, left:right]
+
+
+def recolor_variants(result: np.ndarray, text_colors):
+    """
+    Yields (text_color, BGRA array) for every colour from one result.
+
+    result must come from remove_background_image with text_color=None;
+    each variant equals a run with that text_color. The text mask is
+    computed once and all variants are written into the same buffer, so
+    a yielded array is valid only until the next one is requested.
+    """
+    mask = result[:, :, 3] > 0
+    variant = np.empty_like(result)
+    for text_color in text_colors:
+        np.copyto(variant, result)
+        variant[mask, :3] = text_color
+        yield text_color, variant
+
+
 def remove_background(
     input_path: str,
     output_path: str,
@@ -43,48 +249,454 @@ def remove_background(
     text_color: tuple[int, int, int] | None = None
 ) -> None:
     """
-    Removes background from document using Otsu's method.
+    Removes background from an image file using Otsu's method.
 
     Args:
         input_path: Path to input image
         output_path: Path to save result
         invert: Invert result (for dark text on light background)
         text_color: Text color in BGR format (B, G, R). If None, preserves original color.
+
+    Raises:
+        ImageNotFoundError: If the input file does not exist
+        ImageDecodeError: If the input file is not a supported image
+        ImageEncodeError: If the result cannot be written
     """
-    input_file = Path(input_path)
+    if not Path(input_path).exists():
+        raise ImageNotFoundError(f"Input file not found: {input_path}")
+
+    img = cv2.imread(input_path)
+    if img is None:
+        raise ImageDecodeError(f"Cannot decode image: {input_path}")
+
+    if not cv2.imwrite(output_path, remove_background_image(img, invert, text_color)):
+        raise ImageEncodeError(f"Cannot write result: {output_path}")
 
-    if not input_file.exists():
-        sys.exit(1)
 
+_REDUCED_COLOR = {
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+
+def image_size(data) -> tuple[int, int]:
+    """
+    Reads (width, height) from the image header without decoding pixels.
+
+    Raises:
+        ImageDecodeError: If the data is not a supported image
+        ImageTooLargeError: If Pillow refuses the image as a decompression bomb
+    """
     try:
-        img = cv2.imread(input_path)
-        if img is None:
-            sys.exit(1)
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', Image.DecompressionBombWarning)
+            with Image.open(io.BytesIO(data)) as image:
+                return image.size
+    except Image.DecompressionBombError as e:
+        raise ImageTooLargeError(str(e))
+    except (OSError, SyntaxError, ValueError):
+        raise ImageDecodeError("Cannot decode image")
 
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
 
-        _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+def check_image_size(data, max_pixels: int | None = None) -> tuple[int, int]:
+    """
+    Returns (width, height) of an encoded image within the pixel budget.
 
-        if not invert:
-            mean_brightness = float(gray.mean())
-            if mean_brightness > 128:
-                invert = True
+    Args:
+        data: Encoded image as a bytes-like object
+        max_pixels: Pixel budget (None - MAX_IMAGE_PIXELS)
+
+    Raises:
+        ImageDecodeError: If the header cannot be read
+        ImageTooLargeError: If width * height exceeds the budget
+    """
+    max_pixels = MAX_IMAGE_PIXELS if max_pixels is None else max_pixels
+    width, height = image_size(data)
+    if width * height > max_pixels:
+        raise ImageTooLargeError(
+            f"Image is too large: {width}x{height}, limit {max_pixels} pixels"
+        )
+    return width, height
+
+
+def reduction_factor(width: int, height: int, max_dimension: int) -> int:
+    """Largest decoder scale (1, 2, 4, 8) that keeps the longest side >= max_dimension."""
+    longest = max(width, height)
+    factor = 1
+    for candidate in _REDUCED_COLOR:
+        if longest // candidate >= max_dimension:
+            factor = candidate
+    return factor
+
+
+def fit_dimension(img: np.ndarray, max_dimension: int | None) -> np.ndarray:
+    """Downscales the image so that its longest side is at most max_dimension."""
+    height, width = img.shape[:2]
+    if not max_dimension or max(height, width) <= max_dimension:
+        return img
+    scale = max_dimension / max(height, width)
+    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    return cv2.resize(img, size, interpolation=cv2.INTER_AREA)
+
+
+def decode_image(
+    data,
+    max_dimension: int | None = None,
+    max_pixels: int | None = None,
+    crop: tuple[int, int, int, int] | None = None
+) -> np.ndarray:
+    """
+    Decodes an encoded image held in memory into a BGR array.
+
+    Args:
+        data: Encoded image as bytes, bytearray or memoryview (not copied)
+        max_dimension: Longest side of the result; None - full resolution
+        max_pixels: Pixel budget checked on the header (None - MAX_IMAGE_PIXELS)
+        crop: (x, y, width, height) in full-size pixels, cut out after the
+              whole image is decoded; max_dimension then applies to the
+              cropped region
+
+    Raises:
+        ImageDecodeError: If the data is not a supported image
+        ImageTooLargeError: If the image exceeds the pixel budget
+        CropOutsideImageError: If the crop rectangle lies outside the image
+    """
+    width, height = check_image_size(data, max_pixels)
+    flags = cv2.IMREAD_COLOR
+    if max_dimension:
+        region = (min(crop[2], width), min(crop[3], height)) if crop else (width, height)
+        flags = _REDUCED_COLOR.get(reduction_factor(*region, max_dimension), flags)
+    buffer = np.frombuffer(data, dtype=np.uint8)
+    img = cv2.imdecode(buffer, flags)
+    if img is None:
+        raise ImageDecodeError("Cannot decode image")
+    # Reduced decoding shrinks the image; EXIF rotation may swap its sides.
+    scale = max(img.shape[:2]) / max(width, height)
+    return fit_dimension(crop_image(img, crop, scale), max_dimension)
 
-        if invert:
-            mask = cv2.bitwise_not(binary)
-        else:
-            mask = binary
 
-        result = cv2.cvtColor(img, cv2.COLOR_BGR2BGRA)
+def decoded_pixels_bound(
+    width: int,
+    height: int,
+    max_dimension: int | None = None,
+    crop: tuple[int, int, int, int] | None = None
+) -> int:
+    """
+    Upper bound of the pixel count decode_image returns for an image of
+    width x height, without decoding it. EXIF rotation may swap the
+    sides, so the crop is clipped to the longest side only.
+    """
+    pixels = width * height
+    if crop is not None:
+        longest = max(width, height)
+        pixels = min(pixels, min(crop[2], longest) * min(crop[3], longest))
+    if max_dimension:
+        pixels = min(pixels, max_dimension * max_dimension)
+    return max(1, pixels)
+
+
+def encode_image(img: np.ndarray, extension: str = '.png') -> bytes:
+    """
+    Encodes an image array (e.g. the BGRA result) into bytes.
+
+    Raises:
+        ImageEncodeError: If OpenCV cannot encode the image
+    """
+    ok, encoded = cv2.imencode(extension, img)
+    if not ok:
+        raise ImageEncodeError(f"Cannot encode result as {extension}")
+    return encoded.tobytes()
+
+
+def _check_image(img: np.ndarray) -> None:
+    if img.ndim == 2 or (img.ndim == 3 and img.shape[2] in (3, 4)):
+        return
+    raise ImageDecodeError(f"Unsupported image shape: {img.shape}")
+
+
+def _channels(img: np.ndarray) -> int:
+    return 1 if img.ndim == 2 else img.shape[2]
+
+
+_TO_GRAY = {3: cv2.COLOR_BGR2GRAY, 4: cv2.COLOR_BGRA2GRAY}
+_TO_BGRA = {1: cv2.COLOR_GRAY2BGRA, 3: cv2.COLOR_BGR2BGRA}
+
+
+def _to_gray(img: np.ndarray) -> np.ndarray:
+    channels = _channels(img)
+    return img if channels == 1 else cv2.cvtColor(img, _TO_GRAY[channels])
+
+
+def otsu_threshold(hist: np.ndarray) -> int:
+    """
+    Otsu threshold of a 256-bin grayscale histogram.
+
+    Same criterion as cv2.THRESH_OTSU: the first level with the largest
+    between-class variance, pixels above it are foreground.
+    """
+    p = hist.astype(np.float64)
+    total = p.sum()
+    if total == 0:
+        return 0
+    p /= total
+    levels = np.arange(256, dtype=np.float64)
+    q1 = np.cumsum(p)
+    m1 = np.cumsum(p * levels)
+    mu = m1[-1]
+    q2 = 1.0 - q1
+    eps = np.finfo(np.float32).eps
+    valid = (np.minimum(q1, q2) >= eps) & (np.maximum(q1, q2) <= 1.0 - eps)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sigma = q1 * q2 * (m1 / q1 - (mu - m1) / q2) ** 2
+    sigma[~valid] = 0.0
+    return int(np.argmax(sigma)) if sigma.any() else 0
+
+
+def sample_histogram(
+    img: np.ndarray,
+    sample_pixels: int = SAMPLE_PIXELS,
+    tile_rows: int = TILE_ROWS
+) -> np.ndarray:
+    """
+    Grayscale histogram of a decimated sample of the image.
+
+    Every step-th pixel of every step-th row is used, with step chosen so
+    that about sample_pixels pixels are counted; small images are counted
+    in full. The sample is converted band by band.
+    """
+    height, width = img.shape[:2]
+    step = max(1, int(np.ceil(np.sqrt(height * width / max(1, sample_pixels)))))
+    sample = img[::step, ::step]
+    hist = np.zeros(256, dtype=np.float64)
+    for start in range(0, sample.shape[0], tile_rows):
+        gray = _to_gray(np.ascontiguousarray(sample[start:start + tile_rows]))
+        hist += cv2.calcHist([gray], [0], None, [256], [0, 256]).ravel()
+    return hist
+
+
+def get_threshold_method(name: str | None = None) -> str:
+    """
+    Validates a threshold method name; empty name - 'otsu'.
+
+    Raises:
+        ValueError: If the method is unknown
+    """
+    name = (name or '').strip().lower() or 'otsu'
+    if name not in THRESHOLD_METHODS:
+        raise ValueError(
+            f"Unknown threshold method: {name}. Available: {', '.join(THRESHOLD_METHODS)}"
+        )
+    return name
+
+
+def local_window(height: int, width: int) -> int:
+    """Odd window size: REMOVE_BG_LOCAL_WINDOW or 1/16 of the shorter side."""
+    if LOCAL_WINDOW > 0:
+        return LOCAL_WINDOW | 1
+    return max(15, min(height, width) // 16) | 1
+
+
+def local_threshold_mask(
+    gray: np.ndarray,
+    method: str,
+    window: int,
+    start: int = 0,
+    stop: int | None = None
+) -> np.ndarray:
+    """
+    Mask of pixels darker than their local threshold, for rows start:stop.
+
+    gray may contain extra rows around start:stop; windows are clipped at
+    the edges of gray.
+
+    Args:
+        gray: Grayscale image or band
+        method: 'sauvola' (mean and deviation) or 'bradley' (mean only)
+        window: Window size in pixels
+        start: First row of the result in gray
+        stop: Row after the last one (None - to the end)
+
+    Returns:
+        uint8 mask, 255 for ink
+    """
+    height, width = gray.shape
+    stop = height if stop is None else stop
+    radius = window // 2
+    top = max(0, start - radius)
+    bottom = min(height, stop + radius)
+    sums, squares = cv2.integral2(gray[top:bottom], sdepth=cv2.CV_64F, sqdepth=cv2.CV_64F)
+
+    rows = np.arange(start, stop)
+    row_low = np.clip(rows - radius, 0, height) - top
+    row_high = np.clip(rows + radius + 1, 0, height) - top
+    columns = np.arange(width)
+    col_low = np.clip(columns - radius, 0, width)
+    col_high = np.clip(columns + radius + 1, 0, width)
+    count = np.outer(row_high - row_low, col_high - col_low).astype(np.float64)
+
+    def window_sum(table: np.ndarray) -> np.ndarray:
+        strip = table[row_high] - table[row_low]
+        return strip[:, col_high] - strip[:, col_low]
 
+    mean = window_sum(sums)
+    mean /= count
+    if method == 'bradley':
+        threshold = mean
+        threshold *= 1.0 - BRADLEY_T
+    else:
+        deviation = window_sum(squares)
+        deviation /= count
+        deviation -= mean * mean
+        np.maximum(deviation, 0.0, out=deviation)
+        np.sqrt(deviation, out=deviation)
+        # T = m * (1 + k * (s / R - 1))
+        deviation *= SAUVOLA_K / SAUVOLA_R
+        deviation += 1.0 - SAUVOLA_K
+        threshold = mean
+        threshold *= deviation
+    return np.where(gray[start:stop] <= threshold, 255, 0).astype(np.uint8)
+
+
+def remove_background_tiled(
+    img: np.ndarray,
+    invert: bool = False,
+    text_color: tuple[int, int, int] | None = None,
+    out: np.ndarray | None = None,
+    tile_rows: int = TILE_ROWS,
+    sample_pixels: int = SAMPLE_PIXELS,
+    method: str = 'otsu',
+    window: int | None = None
+) -> np.ndarray:
+    """
+    Bounded-memory variant of remove_background_image.
+
+    The global threshold comes from sample_histogram; the result is
+    written into out (allocated if None) band by band, so only one band
+    of temporary arrays exists at a time. For images up to sample_pixels
+    the Otsu result is identical to the untiled one. For local methods
+    each band is thresholded with local_threshold_mask.
+
+    Raises:
+        ImageDecodeError: If the array is not an 8-bit image
+    """
+    _check_image(img)
+    height, width = img.shape[:2]
+    if out is None:
+        out = np.empty((height, width, 4), dtype=np.uint8)
+
+    hist = sample_histogram(img, sample_pixels, tile_rows)
+    threshold = otsu_threshold(hist)
+    if not invert and hist.sum():
+        invert = float(np.dot(hist, np.arange(256))) / float(hist.sum()) > 128
+    mode = cv2.THRESH_BINARY_INV if invert else cv2.THRESH_BINARY
+    if method != 'otsu' and window is None:
+        window = local_window(height, width)
+
+    channels = _channels(img)
+    for start in range(0, height, tile_rows):
+        band = img[start:start + tile_rows]
+        band_out = out[start:start + tile_rows]
+        if channels == 4:
+            band_out[...] = band
+        else:
+            cv2.cvtColor(band, _TO_BGRA[channels], dst=band_out)
+        if method == 'otsu':
+            _, mask = cv2.threshold(_to_gray(band), threshold, 255, mode)
+        else:
+            top = max(0, start - window // 2)
+            gray = _to_gray(img[top:start + tile_rows + window // 2])
+            if not invert:
+                # Light text on a dark background: the ink is the bright part.
+                gray = cv2.bitwise_not(gray)
+            mask = local_threshold_mask(gray, method, window, start - top, start - top + len(band))
         if text_color is not None:
-            text_mask = mask > 0
-            result[text_mask, 0] = text_color[0]
-            result[text_mask, 1] = text_color[1]
-            result[text_mask, 2] = text_color[2]
+            band_out[mask > 0, :3] = text_color
+        band_out[:, :, 3] = mask
+    return out
+
+
+def remove_background_image(
+    img,
+    invert: bool = False,
+    text_color: tuple[int, int, int] | None = None,
+    out: np.ndarray | None = None,
+    tiled: bool | None = None,
+    method: str = 'otsu'
+):
+    """
+    Removes background from a decoded image.
+
+    Args:
+        img: BGR, BGRA or grayscale array (as returned by cv2.imread / cv2.imdecode)
+        invert: Invert result (for dark text on light background)
+        text_color: Text color in BGR format (B, G, R). If None, preserves original color.
+        out: Optional (H, W, 4) uint8 array to write the result into
+        tiled: Use remove_background_tiled; None - for images over TILED_MIN_PIXELS
+        method: Threshold: 'otsu' (global), 'sauvola' or 'bradley' (local, always tiled)
+
+    Returns:
+        BGRA image (OpenCV channel order) with transparent background
 
-        result[:, :, 3] = mask
-        cv2.imwrite(output_path, result)
+    Raises:
+        ImageDecodeError: If the array is not an 8-bit image
+    """
+    _check_image(img)
+    method = get_threshold_method(method)
+    if tiled is None:
+        tiled = img.shape[0] * img.shape[1] > TILED_MIN_PIXELS
+    if tiled or method != 'otsu':
+        return remove_background_tiled(img, invert, text_color, out=out, method=method)
+
+    if img.ndim == 2:
+        img = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+    elif img.shape[2] == 4:
+        img = cv2.cvtColor(img, cv2.COLOR_BGRA2BGR)
+
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+
+    _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+
+    if not invert:
+        mean_brightness = float(gray.mean())
+        if mean_brightness > 128:
+            invert = True
+
+    if invert:
+        mask = cv2.bitwise_not(binary)
+    else:
+        mask = binary
 
-    except Exception:
-        sys.exit(1)
+    result = cv2.cvtColor(img, cv2.COLOR_BGR2BGRA, dst=out)
+
+    if text_color is not None:
+        text_mask = mask > 0
+        result[text_mask, 0] = text_color[0]
+        result[text_mask, 1] = text_color[1]
+        result[text_mask, 2] = text_color[2]
+
+    result[:, :, 3] = mask
+    return result
+
+
+def remove_background_bytes(
+    data,
+    invert: bool = False,
+    text_color: tuple[int, int, int] | None = None
+) -> bytes:
+    """
+    Removes background from an encoded image held in memory.
+
+    Args:
+        data: Encoded image (PNG, JPEG, BMP, TIFF) as a bytes-like object
+        invert: Invert result (for dark text on light background)
+        text_color: Text color in BGR format (B, G, R). If None, preserves original color.
+
+    Returns:
+        PNG-encoded result
+
+    Raises:
+        ImageDecodeError: If the image cannot be decoded
+        ImageEncodeError: If the result cannot be encoded
+    """
+    return encode_image(remove_background_image(decode_image(data), invert, text_color))
@@ -1,32 +1,208 @@
 import os
-import tempfile
 import base64
-from fastapi import File, Form, Request, UploadFile, BackgroundTasks
-from fastapi.responses import FileResponse, RedirectResponse
+import zipfile
+from fastapi import File, Form, Request, UploadFile
+from fastapi.responses import RedirectResponse
+from starlette.background import BackgroundTask
 
-from src.utils.remove_bg.remove_bg_document import remove_background, parse_rgb_color
+from src.utils.remove_bg.encoding import (
+    DEFAULT_PNG_COMPRESSION,
+    OutputFormat,
+    get_output_format,
+    png_compression_level,
+)
+from src.utils.remove_bg.image_pool import remove_background_bytes, remove_background_variants
+from src.utils.remove_bg.pages import (
+    PAGES_TIFF,
+    PAGES_ZIP,
+    PageSource,
+    is_multipage,
+    iter_page_images,
+    multipage_tiff,
+)
+from src.utils.remove_bg.remove_bg_document import (
+    TRIM_PADDING,
+    CropOutsideImageError,
+    ImageDecodeError,
+    ImageTooLargeError,
+    get_threshold_method,
+    parse_crop,
+    parse_rgb_color,
+    parse_rgb_colors,
+)
+from src.utils.responses import MemoryFileResponse, StreamingFileResponse
+from src.utils.streaming_zip import iter_zip, safe_filename
+
+
+def parse_max_dimension(value) -> int | None:
+    """Parses the max-dimension form value; empty - full resolution."""
+    if value is None or str(value).strip() == '':
+        return None
+    try:
+        max_dimension = int(str(value).strip())
+    except ValueError:
+        max_dimension = 0
+    if max_dimension <= 0:
+        raise ValueError(
+            f"Неверный максимальный размер: {value}. Укажите число пикселей больше нуля"
+        )
+    return max_dimension
+
+
+def parse_trim(trim, padding) -> int | None:
+    """
+    Padding for trim-to-content from the form values; None - no trimming.
+
+    trim is a checkbox value ('on', '1', 'true'); empty padding - TRIM_PADDING.
+    """
+    if str(trim or '').strip().lower() not in ('1', 'on', 'true', 'yes'):
+        return None
+    if padding is None or str(padding).strip() == '':
+        return TRIM_PADDING
+    try:
+        trim_padding = int(str(padding).strip())
+    except ValueError:
+        trim_padding = -1
+    if trim_padding < 0:
+        raise ValueError(f"Неверный отступ: {padding}. Укажите число пикселей не меньше нуля")
+    return trim_padding
+
+
+def multipage_response(
+    filename: str,
+    data: bytes,
+    text_color: tuple[int, int, int] | None,
+    output_format: OutputFormat,
+    compression: str,
+    pages: str,
+    method: str = 'otsu',
+    max_dimension: int | None = None,
+    crop: tuple[int, int, int, int] | None = None,
+    trim_padding: int | None = None
+):
+    """
+    Result for a multi-page TIFF or PDF: a streamed ZIP with one image per
+    page and manifest.json, or a single multi-page TIFF.
+
+    The source is also closed by a background task, so its scratch files
+    are removed even if the archive is never read to the end.
+    """
+    stem = safe_filename(os.path.splitext(filename)[0], 'page')
+    source = PageSource(filename, data, max_dimension=max_dimension).open()
+    if pages == PAGES_TIFF:
+        return MemoryFileResponse(
+            content=multipage_tiff(source, text_color, method, crop, trim_padding),
+            filename=f"{stem}_no_bg.tiff",
+            media_type='image/tiff',
+            headers={'X-Page-Count': str(source.page_count)}
+        )
+    return StreamingFileResponse(
+        iter_zip(
+            iter_page_images(
+                source, stem, text_color, output_format, compression, method,
+                crop, trim_padding
+            ),
+            compression=zipfile.ZIP_STORED
+        ),
+        filename=f"{stem}_no_bg.zip",
+        media_type='application/zip',
+        headers={'X-Page-Count': str(source.page_count)},
+        background=BackgroundTask(source.close)
+    )
+
+
+def variant_name(stem: str, text_color: tuple[int, int, int], extension: str) -> str:
+    """File name of a colour variant: stem_no_bg_RRGGBB.ext."""
+    blue, green, red = text_color
+    return f"{stem}_no_bg_{red:02x}{green:02x}{blue:02x}{extension}"
+
+
+def output_mode(output_format: OutputFormat, compression: str) -> str:
+    """Value of the X-Output-Format header."""
+    if output_format.extension == '.webp':
+        return output_format.name
+    return f"{output_format.name}; compression={compression}"
+
+
+def variants_response(
+    filename: str,
+    text_colors: list[tuple[int, int, int]],
+    results: list[bytes],
+    output_format: OutputFormat,
+    compression: str
+) -> MemoryFileResponse:
+    """
+    ZIP with one result per text colour.
+
+    The results are already encoded and held in memory, so the archive is
+    assembled whole (stored, not deflated) and returned as a file a
+    background job can keep.
+    """
+    stem = safe_filename(os.path.splitext(filename)[0], 'image')
+    entries = (
+        (variant_name(stem, text_color, output_format.extension), result)
+        for text_color, result in zip(text_colors, results)
+    )
+    archive = b"".join(iter_zip(entries, compression=zipfile.ZIP_STORED))
+    return MemoryFileResponse(
+        content=archive,
+        filename=f"{stem}_no_bg.zip",
+        media_type='application/zip',
+        headers={
+            'X-Output-Format': output_mode(output_format, compression),
+            'X-Output-Size': str(len(archive)),
+            'X-Variant-Count': str(len(results)),
+        }
+    )
 
 
 def remove_bg_handler(
     request: Request,
-    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
-    color: str | None = Form(None)
+    color: str | None = Form(None),
+    output_format: str | None = None,
+    compression: str | None = None,
+    pages: str | None = None,
+    threshold: str | None = None,
+    max_dimension: str | int | None = None,
+    crop: str | None = None,
+    trim: str | bool | None = None,
+    trim_padding: str | int | None = None,
+    colors: str | None = None
 ):
     """
     Handler for removing background from uploaded image.
 
     Args:
         request: FastAPI request object
-        background_tasks: Background tasks for cleanup
-        file: Uploaded image file
+        file: Uploaded image file (processed by the image worker pool)
         color: RGB color string in format "R,G,B" (default: black "0,0,0")
+        output_format: Result encoding: png, indexed, gray or webp (see encoding)
+        compression: PNG compression: fast or small
+        pages: Result for multi-page TIFF/PDF: zip (image per page) or tiff
+        threshold: otsu (global, default), sauvola or bradley (local, for
+                   unevenly lit photos)
+        max_dimension: Longest side of the result in pixels; the image is
+                       decoded at reduced resolution where possible
+        crop: Region to process "X,Y,W,H" in pixels of the original image
+              (of the rendered page for multi-page documents)
+        trim: Crop the result to the text (checkbox value)
+        trim_padding: Padding around the text when trimming, pixels
+        colors: Several text colours "R,G,B;R,G,B" instead of color; the
+                image is processed once and a ZIP with a file per colour
+                is returned
+
+    Images over the pixel budget (REMOVE_BG_MAX_PIXELS) are rejected from
+    the header, before decoding.
+
+    The chosen format and the result size are reported in the
+    X-Output-Format and X-Output-Size headers.
     """
     try:
         if not file.filename:
             raise ValueError("Файл не был загружен")
 
-        allowed_extensions = {'.png', '.jpg', '.jpeg', '.bmp', '.tiff', '.tif'}
+        allowed_extensions = {'.png', '.jpg', '.jpeg', '.bmp', '.tiff', '.tif', '.pdf'}
         file_ext = os.path.splitext(file.filename)[1].lower()
 
         if file_ext not in allowed_extensions:
@@ -44,37 +220,97 @@ def remove_bg_handler(
         else:
             text_color = (0, 0, 0)
 
-        with tempfile.NamedTemporaryFile(delete=False, suffix=file_ext) as temp_input:
-            temp_input_path = temp_input.name
-            content = file.file.read()
-            temp_input.write(content)
+        text_colors = [text_color]
+        if colors and colors.strip():
+            try:
+                text_colors = parse_rgb_colors(colors)
+            except ValueError as e:
+                raise ValueError(f"Неверный список цветов: {e}. Используйте формат 'R,G,B;R,G,B'")
+            text_color = text_colors[0]
 
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.png') as temp_output:
-            temp_output_path = temp_output.name
+        try:
+            fmt = get_output_format(output_format)
+            compression = (compression or '').strip() or DEFAULT_PNG_COMPRESSION
+            png_compression_level(compression)
+        except ValueError as e:
+            raise ValueError(f"Неверный формат результата: {e}")
 
-        remove_background(
-            input_path=temp_input_path,
-            output_path=temp_output_path,
-            invert=False,
-            text_color=text_color
-        )
+        try:
+            method = get_threshold_method(threshold)
+        except ValueError as e:
+            raise ValueError(f"Неверный способ порога: {e}")
 
-        output_filename = f"{os.path.splitext(file.filename)[0]}_no_bg.png"
+        max_dimension = parse_max_dimension(max_dimension)
 
-        def cleanup_temp_files():
+        if crop and crop.strip():
             try:
-                os.unlink(temp_input_path)
-                os.unlink(temp_output_path)
-            except OSError:
-                pass
+                crop = parse_crop(crop)
+            except ValueError as e:
+                raise ValueError(f"Неверная область обработки: {e}. Используйте формат 'X,Y,W,H'")
+        else:
+            crop = None
+
+        trim_padding = parse_trim(trim, trim_padding)
+
+        pages = (pages or PAGES_ZIP).strip().lower()
+        if pages not in (PAGES_ZIP, PAGES_TIFF):
+            raise ValueError(f"Неизвестный формат многостраничного результата: {pages}")
+
+        data = file.file.read()
+        try:
+            if is_multipage(file.filename, data):
+                if len(text_colors) > 1:
+                    raise ValueError(
+                        "Несколько цветов не поддерживаются для многостраничных документов"
+                    )
+                return multipage_response(
+                    file.filename, data, text_color, fmt, compression, pages,
+                    method, max_dimension, crop, trim_padding
+                )
+            if len(text_colors) > 1:
+                results = remove_background_variants(
+                    data,
+                    text_colors,
+                    invert=False,
+                    output_format=fmt,
+                    compression=compression,
+                    method=method,
+                    max_dimension=max_dimension,
+                    crop=crop,
+                    trim_padding=trim_padding
+                )
+                return variants_response(file.filename, text_colors, results, fmt, compression)
+            result = remove_background_bytes(
+                data,
+                invert=False,
+                text_color=text_color,
+                output_format=fmt,
+                compression=compression,
+                method=method,
+                max_dimension=max_dimension,
+                crop=crop,
+                trim_padding=trim_padding
+            )
+        except ImageTooLargeError as e:
+            raise ValueError(f"Изображение слишком большое: {e}")
+        except CropOutsideImageError as e:
+            raise ValueError(f"Область обработки за пределами изображения: {e}")
+        except ImageDecodeError:
+            raise ValueError(
+                "Не удалось прочитать изображение: файл повреждён "
+                "или его формат не поддерживается"
+            )
 
-        background_tasks.add_task(cleanup_temp_files)
+        output_filename = f"{os.path.splitext(file.filename)[0]}_no_bg{fmt.extension}"
 
-        return FileResponse(
-            path=temp_output_path,
+        return MemoryFileResponse(
+            content=result,
             filename=output_filename,
-            media_type='image/png',
-            background=background_tasks
+            media_type=fmt.media_type,
+            headers={
+                'X-Output-Format': output_mode(fmt, compression),
+                'X-Output-Size': str(len(result))
+            }
         )
 
     except Exception as e:
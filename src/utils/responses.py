@@ -0,0 +1,59 @@
+"""
+Общие помощники для ответов с файлами.
+"""
+from collections.abc import Iterable
+from urllib.parse import quote
+
+from fastapi.responses import Response, StreamingResponse
+
+
+def attachment_headers(filename: str) -> dict[str, str]:
+    """Заголовок Content-Disposition для скачивания файла (в т.ч. с кириллицей)."""
+    quoted = quote(filename)
+    if quoted != filename:
+        return {'Content-Disposition': f"attachment; filename*=utf-8''{quoted}"}
+    return {'Content-Disposition': f'attachment; filename="{filename}"'}
+
+
+class MemoryFileResponse(Response):
+    """Файл для скачивания, собранный в памяти (FileResponse без диска)."""
+
+    def __init__(
+        self,
+        content: bytes,
+        filename: str,
+        media_type: str,
+        headers: dict[str, str] | None = None
+    ):
+        super().__init__(
+            content=content,
+            media_type=media_type,
+            headers={**attachment_headers(filename), **(headers or {})}
+        )
+        self.filename = filename
+
+
+class StreamingFileResponse(StreamingResponse):
+    """
+    Файл для скачивания, который отдаётся по частям (архивы).
+
+    Части берутся из синхронного генератора chunks. Фоновая задача
+    (см. jobs.py) читает его напрямую в своём потоке, без цикла событий.
+    """
+
+    def __init__(
+        self,
+        chunks: Iterable[bytes],
+        filename: str,
+        media_type: str,
+        headers: dict[str, str] | None = None,
+        background=None
+    ):
+        super().__init__(
+            chunks,
+            media_type=media_type,
+            headers={**attachment_headers(filename), **(headers or {})},
+            background=background
+        )
+        self.chunks = chunks
+        self.filename = filename
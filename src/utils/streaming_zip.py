@@ -0,0 +1,60 @@
+"""
+Потоковая сборка ZIP-архива.
+
+Архив отдаётся клиенту по частям по мере добавления файлов, без записи
+на диск и без хранения всего архива в памяти.
+"""
+import zipfile
+from collections.abc import Iterable, Iterator
+
+
+# Описание содержимого архива (обработанные файлы и ошибки), пишется последним.
+MANIFEST_NAME = 'manifest.json'
+
+
+class _ChunkBuffer:
+    """Поток только для записи, из которого можно забрать накопленные байты."""
+
+    def __init__(self):
+        self._chunks: list[bytes] = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def iter_zip(
+    entries: Iterable[tuple[str, bytes]],
+    compression: int = zipfile.ZIP_DEFLATED
+) -> Iterator[bytes]:
+    """
+    Собирает ZIP из пар (имя, содержимое) и отдаёт его по частям.
+
+    Каждая часть отдаётся сразу после того, как очередной файл готов,
+    поэтому клиент начинает получать архив до окончания обработки.
+    """
+    buffer = _ChunkBuffer()
+    with zipfile.ZipFile(buffer, 'w', compression=compression) as archive:
+        for name, data in entries:
+            archive.writestr(name, data)
+            chunk = buffer.drain()
+            if chunk:
+                yield chunk
+    yield buffer.drain()
+
+
+def safe_filename(name: str, default: str = 'file') -> str:
+    """Убирает из имени файла символы, недопустимые в архивах и ОС."""
+    cleaned = ''.join(
+        '_' if char in '\\/:*?"<>|' or ord(char) < 32 else char
+        for char in name
+    ).strip(' .')
+    return cleaned or default
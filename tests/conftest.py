@@ -1,5 +1,6 @@
 import os
 import sys
+import time
 import pytest
 import tempfile
 from pathlib import Path
@@ -126,6 +127,30 @@ def mock_pptx():
         yield mock_presentation
 
 
+@pytest.fixture
+def make_pptx(tmp_path):
+    """Создаёт настоящий PPTX с текстовыми полями (по одному на строку)"""
+    from pptx import Presentation
+    from pptx.util import Inches, Pt
+
+    def factory(*texts, name="template.pptx", slides=1):
+        prs = Presentation()
+        for _ in range(slides):
+            slide = prs.slides.add_slide(prs.slide_layouts[6])
+            for index, text in enumerate(texts):
+                box = slide.shapes.add_textbox(
+                    Inches(1), Inches(1 + index), Inches(6), Inches(0.8)
+                )
+                run = box.text_frame.paragraphs[0].add_run()
+                run.text = text
+                run.font.size = Pt(24)
+        path = tmp_path / name
+        prs.save(path)
+        return str(path)
+
+    return factory
+
+
 @pytest.fixture
 def mock_file_upload():
     """Мок для загружаемого файла"""
@@ -135,6 +160,33 @@ def mock_file_upload():
     return mock_file
 
 
+@pytest.fixture
+def make_upload():
+    """Создаёт мок загруженного файла с заданным именем и содержимым"""
+    def factory(filename, content):
+        mock_file = MagicMock()
+        mock_file.filename = filename
+        mock_file.file.read.return_value = content
+        return mock_file
+
+    return factory
+
+
+@pytest.fixture
+def wait_job():
+    """Ждёт завершения фоновой задачи и возвращает её"""
+    from src.utils.jobs import FINISHED
+
+    def wait(manager, job, timeout=5):
+        deadline = time.time() + timeout
+        while manager.get(job.id).status not in FINISHED:
+            assert time.time() < deadline
+            time.sleep(0.01)
+        return manager.get(job.id)
+
+    return wait
+
+
 @pytest.fixture(autouse=True)
 def reset_revoked_tokens():
     """Очистка отозванных токенов перед каждым тестом"""
@@ -143,4 +195,22 @@ def reset_revoked_tokens():
     yield
     REVOKED_TOKENS.clear()
 
+
+@pytest.fixture(autouse=True)
+def reset_converter_backend():
+    """Сброс кэша обнаружения LibreOffice перед каждым тестом"""
+    from src.utils.office import reset_converter
+    reset_converter()
+    yield
+    reset_converter()
+
+
+@pytest.fixture(autouse=True)
+def isolated_conversion_cache(tmp_path):
+    """Отдельный пустой кэш конвертаций для каждого теста"""
+    from src.utils.office import conversion_cache
+    cache = conversion_cache.ConversionCache(str(tmp_path / "conversion-cache"))
+    with patch.object(conversion_cache, '_cache', cache):
+        yield cache
+
 pytest_plugins = ('pytest_asyncio',)
@@ -114,13 +114,10 @@ class TestUtilityEndpoints:
         except Exception as e:
             assert "Missing" in str(e) or "Token" in str(e) or "JWT" in str(e)
 
-    @patch('src.utils.gen_cert.gen_cert_handler.convert_pptx_to_pdf')
-    @patch('src.utils.gen_cert.gen_cert_handler.Presentation')
-    @patch('src.utils.gen_cert.gen_cert_handler.os.path.exists')
-    def test_gen_cert_post_success(self, mock_exists, mock_presentation, mock_convert, client, mock_pptx):
+    @patch('src.utils.gen_cert.gen_cert_handler.convert_pptx_bytes_to_pdf')
+    @patch('src.utils.gen_cert.gen_cert_handler.render_template')
+    def test_gen_cert_post_success(self, mock_render_template, mock_convert, client):
         """Test POST /gen_rit_cert with successful generation"""
-        mock_exists.return_value = True
-        mock_presentation.return_value = mock_pptx
 
         try:
             response = client.post("/gen_rit_cert", data={
@@ -134,12 +131,9 @@ class TestUtilityEndpoints:
         except Exception as e:
             assert "Missing" in str(e) or "Token" in str(e) or "JWT" in str(e)
 
-    @patch('src.utils.doctor_form.doctor_form_handler.Presentation')
-    @patch('src.utils.doctor_form.doctor_form_handler.os.path.exists')
-    def test_doctor_form_post_success(self, mock_exists, mock_presentation, client, mock_pptx):
+    @patch('src.utils.doctor_form.doctor_form_handler.render_day_template')
+    def test_doctor_form_post_success(self, mock_render_template, client):
         """Test POST /doctor_form with successful generation"""
-        mock_exists.return_value = True
-        mock_presentation.return_value = mock_pptx
 
         try:
             response = client.post("/doctor_form", data={
@@ -177,11 +171,9 @@ class TestErrorHandling:
         except Exception as e:
             assert "Missing" in str(e) or "Token" in str(e) or "JWT" in str(e)
 
-    @patch('src.utils.gen_cert.gen_cert_handler.os.path.exists')
-    def test_gen_cert_template_not_found(self, mock_exists, client):
+    @patch('src.utils.gen_cert.gen_cert_handler.TEMPLATE_PATH', '/nonexistent/template.pptx')
+    def test_gen_cert_template_not_found(self, client):
         """Test certificate generation with missing template"""
-        mock_exists.return_value = False
-
         try:
             response = client.post("/gen_rit_cert", data={
                 "name": "Иван Иванов",
@@ -194,11 +186,9 @@ class TestErrorHandling:
         except Exception as e:
             assert "Missing" in str(e) or "Token" in str(e) or "JWT" in str(e)
 
-    @patch('src.utils.doctor_form.doctor_form_handler.os.path.exists')
-    def test_doctor_form_template_not_found(self, mock_exists, client):
+    @patch('src.utils.doctor_form.doctor_form_handler.TEMPLATE_PATH', '/nonexistent/template.pptx')
+    def test_doctor_form_template_not_found(self, client):
         """Test doctor form generation with missing template"""
-        mock_exists.return_value = False
-
         try:
             response = client.post("/doctor_form", data={
                 "doctor_1": "Доктор Иванов",
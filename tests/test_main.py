@@ -47,7 +47,14 @@ class TestMainRoutes:
             "/home",
             "/send_email",
             "/gen_rit_cert",
-            "/doctor_form"
+            "/doctor_form",
+            "/doctor_form/schedule",
+            "/remove_bg/batch",
+            "/ready",
+            "/stats",
+            "/jobs/{job_id}",
+            "/jobs/{job_id}/events",
+            "/jobs/{job_id}/result"
         ]
 
         for expected_route in expected_routes:
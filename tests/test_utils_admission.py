@@ -0,0 +1,166 @@
+"""
+Тесты для ограничения одновременных тяжёлых запросов
+"""
+import asyncio
+from unittest.mock import patch
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from src.utils.admission import AdmissionLimiter, AdmissionMiddleware
+
+
+def make_app(limiter):
+    app = FastAPI()
+    app.add_middleware(AdmissionMiddleware, limiters={'/heavy': limiter})
+
+    @app.post("/heavy")
+    def heavy():
+        return {'in_flight': limiter.in_flight}
+
+    @app.get("/heavy")
+    def heavy_page():
+        return {}
+
+    return app
+
+
+class TestAdmissionLimiter:
+    """Tests for AdmissionLimiter"""
+
+    def test_admits_up_to_concurrency_then_rejects(self):
+        """Test requests beyond concurrency and queue are rejected"""
+        async def scenario():
+            limiter = AdmissionLimiter(concurrency=1, queue_size=1, queue_timeout=5)
+            assert await limiter.acquire() is True
+
+            waiter = asyncio.create_task(limiter.acquire())
+            await asyncio.sleep(0)
+            assert limiter.queued == 1
+            assert await limiter.acquire() is False
+
+            limiter.release()
+            assert await waiter is True
+            assert limiter.in_flight == 1
+            limiter.release()
+            return limiter
+
+        limiter = asyncio.run(scenario())
+
+        assert limiter.in_flight == 0
+        assert limiter.queued == 0
+        assert limiter.stats()['admitted'] == 2
+        assert limiter.stats()['rejected'] == 1
+
+    def test_queue_is_fifo(self):
+        """Test released slots go to waiters in arrival order"""
+        async def scenario():
+            limiter = AdmissionLimiter(concurrency=1, queue_size=2, queue_timeout=5)
+            order = []
+            await limiter.acquire()
+
+            async def request(name):
+                await limiter.acquire()
+                order.append(name)
+
+            tasks = [asyncio.create_task(request(name)) for name in ("first", "second")]
+            await asyncio.sleep(0)
+            limiter.release()
+            await asyncio.sleep(0)
+            limiter.release()
+            await asyncio.gather(*tasks)
+            return order
+
+        assert asyncio.run(scenario()) == ["first", "second"]
+
+    def test_queue_timeout(self):
+        """Test waiting longer than queue_timeout rejects the request"""
+        async def scenario():
+            limiter = AdmissionLimiter(concurrency=1, queue_size=1, queue_timeout=0.01)
+            await limiter.acquire()
+            result = await limiter.acquire()
+            return limiter, result
+
+        limiter, result = asyncio.run(scenario())
+
+        assert result is False
+        assert limiter.queued == 0
+        assert limiter.stats()['timed_out'] == 1
+
+    def test_timeout_after_handoff_keeps_slot(self):
+        """Test a timeout raised after release() handed over the slot admits the request"""
+        async def scenario():
+            limiter = AdmissionLimiter(concurrency=1, queue_size=1, queue_timeout=0.02)
+            await limiter.acquire()
+
+            async def late_timeout(waiter, timeout):
+                # Слот передан, но wait_for всё равно сообщает о тайм-ауте
+                # (Python 3.12+ при задержке цикла событий).
+                limiter.release()
+                assert waiter.done()
+                raise asyncio.TimeoutError
+
+            with patch('src.utils.admission.asyncio.wait_for', late_timeout):
+                result = await limiter.acquire()
+            return limiter, result
+
+        limiter, result = asyncio.run(scenario())
+
+        assert result is True
+        assert limiter.in_flight == 1
+        assert limiter.queued == 0
+        assert limiter.stats()['timed_out'] == 0
+        limiter.release()
+        assert limiter.in_flight == 0
+
+    def test_cancelled_waiter_leaves_queue(self):
+        """Test a disconnected client does not keep its place in the queue"""
+        async def scenario():
+            limiter = AdmissionLimiter(concurrency=1, queue_size=1, queue_timeout=5)
+            await limiter.acquire()
+            waiter = asyncio.create_task(limiter.acquire())
+            await asyncio.sleep(0)
+            waiter.cancel()
+            await asyncio.gather(waiter, return_exceptions=True)
+            limiter.release()
+            return limiter
+
+        limiter = asyncio.run(scenario())
+
+        assert limiter.queued == 0
+        assert limiter.in_flight == 0
+
+
+class TestAdmissionMiddleware:
+    """Tests for AdmissionMiddleware"""
+
+    def test_request_admitted(self):
+        """Test request under the limit is processed and the slot released"""
+        limiter = AdmissionLimiter(concurrency=1, queue_size=0)
+        client = TestClient(make_app(limiter))
+
+        response = client.post("/heavy")
+
+        assert response.status_code == 200
+        assert response.json() == {'in_flight': 1}
+        assert limiter.in_flight == 0
+
+    def test_overloaded_returns_503(self):
+        """Test full queue returns 503 with Retry-After"""
+        limiter = AdmissionLimiter(concurrency=1, queue_size=0)
+        limiter.in_flight = 1
+        client = TestClient(make_app(limiter))
+
+        response = client.post("/heavy")
+
+        assert response.status_code == 503
+        assert response.headers["retry-after"].isdigit()
+        assert limiter.stats()['rejected'] == 1
+
+    def test_get_requests_not_limited(self):
+        """Test pages of heavy endpoints are not limited"""
+        limiter = AdmissionLimiter(concurrency=1, queue_size=0)
+        limiter.in_flight = 1
+        client = TestClient(make_app(limiter))
+
+        assert client.get("/heavy").status_code == 200
@@ -1,15 +1,29 @@
 """
 Tests for doctor_form/doctor_form_handler.py module
 """
+import datetime
+import io
+import os
 from unittest.mock import MagicMock, patch
 
 import pytest
-from fastapi.responses import FileResponse, RedirectResponse
+from fastapi.responses import RedirectResponse
+from pptx import Presentation
 
+from src.utils.responses import MemoryFileResponse
+from src.utils.dates import month_genitive
+from src.utils.doctor_form import day_template
+from src.utils.doctor_form.day_template import DayTemplates, seconds_until_midnight
 from src.utils.doctor_form.doctor_form_handler import (
     doctor_form_handler,
+    form_date,
     get_current_date,
 )
+from src.utils.doctor_form.schedule_handler import (
+    doctor_schedule_handler,
+    read_schedule_rows,
+    render_schedule_pptx,
+)
 
 
 class TestGetCurrentDate:
@@ -17,60 +31,39 @@ class TestGetCurrentDate:
 
     @patch('src.utils.doctor_form.doctor_form_handler.datetime')
     def test_get_current_date_success(self, mock_datetime):
-        """Test successful date retrieval"""
-        mock_now = MagicMock()
-        mock_now.day = 15
-        mock_now.strftime.return_value = "март"
-        mock_now.year = 2024
-        mock_datetime.datetime.now.return_value = mock_now
+        """Test month is returned in the genitive case"""
+        mock_datetime.date.today.return_value = datetime.date(2024, 3, 15)
 
         day, month, year = get_current_date()
 
         assert day == 15
-        assert month == "март"
+        assert month == "марта"
         assert year == 2024
 
-    @patch('src.utils.doctor_form.doctor_form_handler.datetime')
-    def test_get_current_date_locale_fallback(self, mock_datetime):
-        """Test locale fallback"""
-        mock_now = MagicMock()
-        mock_now.day = 1
-        mock_now.year = 2024
-        mock_now.strftime.side_effect = [OSError("Locale error"), "January", "January"]
-        mock_datetime.datetime.now.return_value = mock_now
-
-        day, month, year = get_current_date()
-
-        assert day == 1
-        assert month == "января"
-        assert year == 2024
+    def test_month_genitive(self):
+        """Test genitive month names do not depend on locale"""
+        assert month_genitive(1) == "января"
+        assert month_genitive(5) == "мая"
+        assert month_genitive(12) == "декабря"
 
     @patch('src.utils.doctor_form.doctor_form_handler.datetime')
-    def test_get_current_date_unknown_month(self, mock_datetime):
-        """Test unknown month handling"""
-        mock_now = MagicMock()
-        mock_now.day = 1
-        mock_now.year = 2024
-        mock_now.strftime.side_effect = [OSError("Locale error"), "UnknownMonth", "UnknownMonth"]
-        mock_datetime.datetime.now.return_value = mock_now
+    def test_form_date_custom_day(self, mock_datetime):
+        """Test day of month can be overridden"""
+        mock_datetime.date.today.return_value = datetime.date(2024, 1, 1)
 
-        day, month, year = get_current_date()
-
-        assert day == 1
-        assert month == "UnknownMonth"
-        assert year == 2024
+        assert form_date(None) == "«1» января 2024 г."
+        assert form_date("20") == "«20» января 2024 г."
+        assert form_date("abc") == "«1» января 2024 г."
 
 
 class TestDoctorFormHandler:
     """Tests for doctor form handler"""
 
-    @patch('src.utils.doctor_form.doctor_form_handler.os.path.exists')
-    @patch('src.utils.doctor_form.doctor_form_handler.Presentation')
+    @patch('src.utils.doctor_form.doctor_form_handler.render_day_template')
     @patch('src.utils.doctor_form.doctor_form_handler.get_current_date')
-    def test_doctor_form_handler_success(self, mock_get_date, mock_presentation, mock_exists, mock_request, mock_pptx):
+    def test_doctor_form_handler_success(self, mock_get_date, mock_render_template, mock_request):
         """Test successful doctor form generation"""
-        mock_exists.return_value = True
-        mock_presentation.return_value = mock_pptx
+        mock_render_template.return_value = b"PK"
         mock_get_date.return_value = (15, "марта", 2024)
 
         result = doctor_form_handler(
@@ -86,15 +79,13 @@ class TestDoctorFormHandler:
             date="20"
         )
 
-        assert isinstance(result, FileResponse)
+        assert isinstance(result, MemoryFileResponse)
         assert result.filename == "Бланк Врача на печать.pptx"
         assert result.media_type == "application/vnd.openxmlformats-officedocument.presentationml.presentation"
 
-    @patch('src.utils.doctor_form.doctor_form_handler.os.path.exists')
-    def test_doctor_form_handler_template_not_found(self, mock_exists, mock_request):
+    @patch('src.utils.doctor_form.doctor_form_handler.TEMPLATE_PATH', '/nonexistent/template.pptx')
+    def test_doctor_form_handler_template_not_found(self, mock_request):
         """Test missing template handling"""
-        mock_exists.return_value = False
-
         result = doctor_form_handler(
             request=mock_request,
             doctor_1="Доктор Иванов",
@@ -106,13 +97,11 @@ class TestDoctorFormHandler:
         assert result.headers["location"] == "/doctor_form"
         assert result.status_code == 303
 
-    @patch('src.utils.doctor_form.doctor_form_handler.os.path.exists')
-    @patch('src.utils.doctor_form.doctor_form_handler.Presentation')
+    @patch('src.utils.doctor_form.doctor_form_handler.render_day_template')
     @patch('src.utils.doctor_form.doctor_form_handler.get_current_date')
-    def test_doctor_form_handler_custom_date(self, mock_get_date, mock_presentation, mock_exists, mock_request, mock_pptx):
+    def test_doctor_form_handler_custom_date(self, mock_get_date, mock_render_template, mock_request):
         """Test with custom date"""
-        mock_exists.return_value = True
-        mock_presentation.return_value = mock_pptx
+        mock_render_template.return_value = b"PK"
         mock_get_date.return_value = (15, "марта", 2024)
 
         result = doctor_form_handler(
@@ -122,15 +111,13 @@ class TestDoctorFormHandler:
             date="25"
         )
 
-        assert isinstance(result, (FileResponse, RedirectResponse))
+        assert isinstance(result, (MemoryFileResponse, RedirectResponse))
 
-    @patch('src.utils.doctor_form.doctor_form_handler.os.path.exists')
-    @patch('src.utils.doctor_form.doctor_form_handler.Presentation')
+    @patch('src.utils.doctor_form.doctor_form_handler.render_day_template')
     @patch('src.utils.doctor_form.doctor_form_handler.get_current_date')
-    def test_doctor_form_handler_invalid_date(self, mock_get_date, mock_presentation, mock_exists, mock_request, mock_pptx):
+    def test_doctor_form_handler_invalid_date(self, mock_get_date, mock_render_template, mock_request):
         """Test with invalid date"""
-        mock_exists.return_value = True
-        mock_presentation.return_value = mock_pptx
+        mock_render_template.return_value = b"PK"
         mock_get_date.return_value = (15, "марта", 2024)
 
         result = doctor_form_handler(
@@ -140,15 +127,13 @@ class TestDoctorFormHandler:
             date="не число"
         )
 
-        assert isinstance(result, (FileResponse, RedirectResponse))
+        assert isinstance(result, (MemoryFileResponse, RedirectResponse))
 
-    @patch('src.utils.doctor_form.doctor_form_handler.os.path.exists')
-    @patch('src.utils.doctor_form.doctor_form_handler.Presentation')
+    @patch('src.utils.doctor_form.doctor_form_handler.render_day_template')
     @patch('src.utils.doctor_form.doctor_form_handler.get_current_date')
-    def test_doctor_form_handler_empty_date(self, mock_get_date, mock_presentation, mock_exists, mock_request, mock_pptx):
+    def test_doctor_form_handler_empty_date(self, mock_get_date, mock_render_template, mock_request):
         """Test with empty date"""
-        mock_exists.return_value = True
-        mock_presentation.return_value = mock_pptx
+        mock_render_template.return_value = b"PK"
         mock_get_date.return_value = (15, "марта", 2024)
 
         result = doctor_form_handler(
@@ -158,15 +143,13 @@ class TestDoctorFormHandler:
             date=""
         )
 
-        assert isinstance(result, (FileResponse, RedirectResponse))
+        assert isinstance(result, (MemoryFileResponse, RedirectResponse))
 
-    @patch('src.utils.doctor_form.doctor_form_handler.os.path.exists')
-    @patch('src.utils.doctor_form.doctor_form_handler.Presentation')
+    @patch('src.utils.doctor_form.doctor_form_handler.render_day_template')
     @patch('src.utils.doctor_form.doctor_form_handler.get_current_date')
-    def test_doctor_form_handler_none_values(self, mock_get_date, mock_presentation, mock_exists, mock_request, mock_pptx):
+    def test_doctor_form_handler_none_values(self, mock_get_date, mock_render_template, mock_request):
         """Test with None values"""
-        mock_exists.return_value = True
-        mock_presentation.return_value = mock_pptx
+        mock_render_template.return_value = b"PK"
         mock_get_date.return_value = (15, "марта", 2024)
 
         result = doctor_form_handler(
@@ -182,15 +165,13 @@ class TestDoctorFormHandler:
             date=None
         )
 
-        assert isinstance(result, FileResponse)
+        assert isinstance(result, MemoryFileResponse)
 
-    @patch('src.utils.doctor_form.doctor_form_handler.os.path.exists')
-    @patch('src.utils.doctor_form.doctor_form_handler.Presentation')
+    @patch('src.utils.doctor_form.doctor_form_handler.render_day_template')
     @patch('src.utils.doctor_form.doctor_form_handler.get_current_date')
-    def test_doctor_form_handler_patient_name_uppercase(self, mock_get_date, mock_presentation, mock_exists, mock_request, mock_pptx):
+    def test_doctor_form_handler_patient_name_uppercase(self, mock_get_date, mock_render_template, mock_request):
         """Test patient name uppercase conversion"""
-        mock_exists.return_value = True
-        mock_presentation.return_value = mock_pptx
+        mock_render_template.return_value = b"PK"
         mock_get_date.return_value = (15, "марта", 2024)
 
         result = doctor_form_handler(
@@ -200,14 +181,12 @@ class TestDoctorFormHandler:
             date="15"
         )
 
-        assert isinstance(result, (FileResponse, RedirectResponse))
+        assert isinstance(result, (MemoryFileResponse, RedirectResponse))
 
-    @patch('src.utils.doctor_form.doctor_form_handler.os.path.exists')
-    @patch('src.utils.doctor_form.doctor_form_handler.Presentation')
-    def test_doctor_form_handler_presentation_error(self, mock_exists, mock_presentation, mock_request):
+    @patch('src.utils.doctor_form.doctor_form_handler.render_day_template')
+    def test_doctor_form_handler_presentation_error(self, mock_render_template, mock_request):
         """Test presentation error handling"""
-        mock_exists.return_value = True
-        mock_presentation.side_effect = Exception("Presentation error")
+        mock_render_template.side_effect = Exception("Presentation error")
 
         result = doctor_form_handler(
             request=mock_request,
@@ -219,3 +198,144 @@ class TestDoctorFormHandler:
         assert isinstance(result, RedirectResponse)
         assert result.headers["location"] == "/doctor_form"
         assert result.status_code == 303
+
+
+SCHEDULE_CSV = "\n".join(
+    ["Врач;Пациент"] + [f"Врач {i};пациент {i}" for i in range(1, 7)] + [";"]
+).encode('utf-8')
+
+
+def schedule_upload(filename, content):
+    mock_file = MagicMock()
+    mock_file.filename = filename
+    mock_file.file.read.return_value = content
+    return mock_file
+
+
+@pytest.fixture
+def doctor_template(make_pptx):
+    """Бланк с четырьмя карточками"""
+    return make_pptx(
+        *[f"Doctor_{i}" for i in range(1, 5)],
+        *[f"Patient_{i}" for i in range(1, 5)],
+        "Дата"
+    )
+
+
+class TestDoctorSchedule:
+    """Tests for doctor cards generated from a schedule"""
+
+    def test_read_schedule_rows(self):
+        """Test schedule rows with Russian headers are parsed"""
+        rows = read_schedule_rows("schedule.csv", SCHEDULE_CSV)
+
+        assert len(rows) == 6
+        assert rows[0] == ("Врач 1", "пациент 1")
+
+    def test_read_schedule_without_known_columns(self):
+        """Test error for table without doctor/patient columns"""
+        with pytest.raises(ValueError, match="В расписании нет данных"):
+            read_schedule_rows("schedule.csv", b"a,b\n1,2\n")
+
+    @patch('src.utils.doctor_form.schedule_handler.MAX_SCHEDULE_ROWS', 2)
+    def test_read_schedule_limit(self):
+        """Test row limit"""
+        with pytest.raises(ValueError, match="Слишком много строк"):
+            read_schedule_rows("schedule.csv", SCHEDULE_CSV)
+
+    def test_cards_four_per_slide(self, doctor_template):
+        """Test cards fill slides four at a time and the rest stays blank"""
+        cards = read_schedule_rows("schedule.csv", SCHEDULE_CSV)
+
+        with patch('src.utils.doctor_form.schedule_handler.TEMPLATE_PATH', doctor_template):
+            data = render_schedule_pptx(cards, "«15» марта 2024 г.")
+
+        slides = Presentation(io.BytesIO(data)).slides
+        texts = [[shape.text_frame.text for shape in slide.shapes] for slide in slides]
+        assert len(texts) == 2
+        assert texts[0][:4] == [f"ВРАЧ: Врач {i}" for i in range(1, 5)]
+        assert texts[0][4] == "ПАЦИЕНТ: ПАЦИЕНТ 1"
+        assert texts[1][:4] == ["ВРАЧ: Врач 5", "ВРАЧ: Врач 6", "", ""]
+        assert texts[1][8] == "«15» марта 2024 г."
+
+    @patch('src.utils.doctor_form.doctor_form_handler.get_current_date')
+    def test_schedule_handler_success(self, mock_get_date, doctor_template, mock_request):
+        """Test schedule upload returns one presentation with every card"""
+        mock_get_date.return_value = (15, "марта", 2024)
+
+        with patch('src.utils.doctor_form.schedule_handler.TEMPLATE_PATH', doctor_template):
+            result = doctor_schedule_handler(
+                request=mock_request,
+                file=schedule_upload("schedule.csv", SCHEDULE_CSV),
+                date="20"
+            )
+
+        assert isinstance(result, MemoryFileResponse)
+        assert result.filename == "Бланки Врача на печать.pptx"
+        slides = Presentation(io.BytesIO(result.body)).slides
+        assert slides[0].shapes[8].text_frame.text == "«20» марта 2024 г."
+
+    def test_schedule_handler_bad_file(self, mock_request):
+        """Test unsupported file redirects with an error"""
+        result = doctor_schedule_handler(
+            request=mock_request,
+            file=schedule_upload("schedule.txt", b"data"),
+            date=None
+        )
+
+        assert isinstance(result, RedirectResponse)
+        assert result.headers["location"] == "/doctor_form"
+
+
+class TestDayTemplates:
+    """Tests for templates with the date baked in"""
+
+    def test_date_baked_once(self, doctor_template):
+        """Test the date is substituted once per day, not per request"""
+        templates = DayTemplates()
+
+        first = templates.render(doctor_template, "«15» марта 2024 г.", {'Doctor_1': 'ВРАЧ: Иванов'})
+        templates.render(doctor_template, "«15» марта 2024 г.", {'Doctor_1': 'ВРАЧ: Петров'})
+
+        assert templates.bakes == 1
+        texts = [shape.text_frame.text for shape in Presentation(io.BytesIO(first)).slides[0].shapes]
+        assert texts[0] == "ВРАЧ: Иванов"
+        assert texts[8] == "«15» марта 2024 г."
+
+    def test_new_day_bakes_again(self, doctor_template):
+        """Test another date gets its own template"""
+        templates = DayTemplates(max_dates=1)
+
+        templates.get(doctor_template, "«15» марта 2024 г.")
+        templates.get(doctor_template, "«16» марта 2024 г.")
+        templates.get(doctor_template, "«15» марта 2024 г.")
+
+        assert templates.bakes == 3
+
+    def test_replaced_template_bakes_again(self, doctor_template):
+        """Test replaced template file is picked up"""
+        templates = DayTemplates()
+        templates.get(doctor_template, "«15» марта 2024 г.")
+
+        os.utime(doctor_template, ns=(0, 0))
+        templates.get(doctor_template, "«15» марта 2024 г.")
+
+        assert templates.bakes == 2
+
+    def test_seconds_until_midnight(self):
+        """Test rebuild delay"""
+        now = datetime.datetime(2024, 3, 15, 23, 59, 30)
+
+        assert seconds_until_midnight(now) == 30
+
+    def test_daily_rebuild_prepares_today(self, doctor_template):
+        """Test startup bakes today's template and arms the midnight timer"""
+        with patch.object(day_template, '_templates', DayTemplates()) as templates:
+            day_template.start_daily_rebuild(doctor_template, lambda: "«15» марта 2024 г.")
+            try:
+                assert templates.bakes == 1
+                assert day_template._timer is not None
+            finally:
+                day_template.stop_daily_rebuild()
+
+        assert day_template._timer is None
@@ -6,8 +6,18 @@ import tempfile
 from unittest.mock import MagicMock, patch
 
 import pytest
-from fastapi.responses import FileResponse, RedirectResponse
+from fastapi.responses import RedirectResponse
 
+from PIL import Image, ImageFont
+from pptx import Presentation
+
+from src.utils.gen_cert import fast_render
+from src.utils.office import get_export_profile
+from src.utils.responses import MemoryFileResponse
+from src.utils.gen_cert.fast_render import (
+    FastCertificateRenderer,
+    UnsupportedTemplate,
+)
 from src.utils.gen_cert.gen_cert_handler import (
     convert_pptx_to_pdf,
     gen_cert_handler,
@@ -101,13 +111,12 @@ class TestPptxToPdfConversion:
 class TestGenCertHandler:
     """Tests for certificate generation handler"""
 
-    @patch('src.utils.gen_cert.gen_cert_handler.os.path.exists')
-    @patch('src.utils.gen_cert.gen_cert_handler.Presentation')
-    @patch('src.utils.gen_cert.gen_cert_handler.convert_pptx_to_pdf')
-    def test_gen_cert_handler_success(self, mock_convert, mock_presentation, mock_exists, mock_request, mock_pptx):
+    @patch('src.utils.gen_cert.gen_cert_handler.render_template')
+    @patch('src.utils.gen_cert.gen_cert_handler.convert_pptx_bytes_to_pdf')
+    def test_gen_cert_handler_success(self, mock_convert, mock_render_template, mock_request):
         """Test successful certificate generation"""
-        mock_exists.return_value = True
-        mock_presentation.return_value = mock_pptx
+        mock_render_template.return_value = b"PK"
+        mock_convert.return_value = b"%PDF"
 
         result = gen_cert_handler(
             request=mock_request,
@@ -115,15 +124,15 @@ class TestGenCertHandler:
             price="5000"
         )
 
-        assert isinstance(result, FileResponse)
+        assert isinstance(result, MemoryFileResponse)
         assert result.filename == "Сертификат.pdf"
         mock_convert.assert_called_once()
+        # Each certificate has a new serial number, so it is never cached.
+        assert mock_convert.call_args[1]['cache'] is False
 
-    @patch('src.utils.gen_cert.gen_cert_handler.os.path.exists')
-    def test_gen_cert_handler_template_not_found(self, mock_exists, mock_request):
+    @patch('src.utils.gen_cert.gen_cert_handler.TEMPLATE_PATH', '/nonexistent/template.pptx')
+    def test_gen_cert_handler_template_not_found(self, mock_request):
         """Test missing template handling"""
-        mock_exists.return_value = False
-
         result = gen_cert_handler(
             request=mock_request,
             name="Иван Иванов",
@@ -134,13 +143,12 @@ class TestGenCertHandler:
         assert result.headers["location"] == "/gen_rit_cert"
         assert result.status_code == 303
 
-    @patch('src.utils.gen_cert.gen_cert_handler.os.path.exists')
-    @patch('src.utils.gen_cert.gen_cert_handler.Presentation')
-    @patch('src.utils.gen_cert.gen_cert_handler.convert_pptx_to_pdf')
-    def test_gen_cert_handler_empty_values(self, mock_convert, mock_presentation, mock_exists, mock_request, mock_pptx):
+    @patch('src.utils.gen_cert.gen_cert_handler.render_template')
+    @patch('src.utils.gen_cert.gen_cert_handler.convert_pptx_bytes_to_pdf')
+    def test_gen_cert_handler_empty_values(self, mock_convert, mock_render_template, mock_request):
         """Test certificate generation with empty values"""
-        mock_exists.return_value = True
-        mock_presentation.return_value = mock_pptx
+        mock_render_template.return_value = b"PK"
+        mock_convert.return_value = b"%PDF"
 
         result = gen_cert_handler(
             request=mock_request,
@@ -148,16 +156,15 @@ class TestGenCertHandler:
             price=""
         )
 
-        assert isinstance(result, FileResponse)
+        assert isinstance(result, MemoryFileResponse)
         mock_convert.assert_called_once()
 
-    @patch('src.utils.gen_cert.gen_cert_handler.os.path.exists')
-    @patch('src.utils.gen_cert.gen_cert_handler.Presentation')
-    @patch('src.utils.gen_cert.gen_cert_handler.convert_pptx_to_pdf')
-    def test_gen_cert_handler_none_values(self, mock_convert, mock_presentation, mock_exists, mock_request, mock_pptx):
+    @patch('src.utils.gen_cert.gen_cert_handler.render_template')
+    @patch('src.utils.gen_cert.gen_cert_handler.convert_pptx_bytes_to_pdf')
+    def test_gen_cert_handler_none_values(self, mock_convert, mock_render_template, mock_request):
         """Test certificate generation with None values"""
-        mock_exists.return_value = True
-        mock_presentation.return_value = mock_pptx
+        mock_render_template.return_value = b"PK"
+        mock_convert.return_value = b"%PDF"
 
         result = gen_cert_handler(
             request=mock_request,
@@ -165,15 +172,13 @@ class TestGenCertHandler:
             price=None
         )
 
-        assert isinstance(result, FileResponse)
+        assert isinstance(result, MemoryFileResponse)
         mock_convert.assert_called_once()
 
-    @patch('src.utils.gen_cert.gen_cert_handler.os.path.exists')
-    @patch('src.utils.gen_cert.gen_cert_handler.Presentation')
-    def test_gen_cert_handler_presentation_error(self, mock_exists, mock_presentation, mock_request):
+    @patch('src.utils.gen_cert.gen_cert_handler.render_template')
+    def test_gen_cert_handler_presentation_error(self, mock_render_template, mock_request):
         """Test presentation error handling"""
-        mock_exists.return_value = True
-        mock_presentation.side_effect = Exception("Presentation error")
+        mock_render_template.side_effect = Exception("Presentation error")
 
         result = gen_cert_handler(
             request=mock_request,
@@ -185,28 +190,12 @@ class TestGenCertHandler:
         assert result.headers["location"] == "/gen_rit_cert"
         assert result.status_code == 303
 
-    @patch('src.utils.gen_cert.gen_cert_handler.os.path.exists')
-    @patch('src.utils.gen_cert.gen_cert_handler.Presentation')
-    @patch('src.utils.gen_cert.gen_cert_handler.convert_pptx_to_pdf')
-    def test_gen_cert_handler_numeric_price_adds_ruble_symbol(self, mock_convert, mock_presentation, mock_exists, mock_request, mock_pptx):
+    @patch('src.utils.gen_cert.gen_cert_handler.render_template')
+    @patch('src.utils.gen_cert.gen_cert_handler.convert_pptx_bytes_to_pdf')
+    def test_gen_cert_handler_numeric_price_adds_ruble_symbol(self, mock_convert, mock_render_template, mock_request):
         """Test that numeric price gets ₽ symbol added"""
-        mock_exists.return_value = True
-        
-        # Настраиваем мок для проверки замены текста
-        mock_run = MagicMock()
-        mock_run.text = "price"  # Начальный текст содержит ключ для замены
-        mock_paragraph = MagicMock()
-        mock_paragraph.runs = [mock_run]
-        mock_text_frame = MagicMock()
-        mock_text_frame.paragraphs = [mock_paragraph]
-        mock_shape = MagicMock()
-        mock_shape.has_text_frame = True
-        mock_shape.text_frame = mock_text_frame
-        mock_slide = MagicMock()
-        mock_slide.shapes = [mock_shape]
-        mock_presentation_instance = MagicMock()
-        mock_presentation_instance.slides = [mock_slide]
-        mock_presentation.return_value = mock_presentation_instance
+        mock_render_template.return_value = b"PK"
+        mock_convert.return_value = b"%PDF"
 
         result = gen_cert_handler(
             request=mock_request,
@@ -214,32 +203,16 @@ class TestGenCertHandler:
             price="5000"
         )
 
-        assert isinstance(result, FileResponse)
-        # Проверяем, что текст был заменен на "5000 ₽"
-        assert mock_run.text == "5000 ₽"
+        assert isinstance(result, MemoryFileResponse)
+        # Проверяем, что в шаблон подставляется "5000 ₽"
+        assert mock_render_template.call_args[0][1]['price'] == "5000 ₽"
 
-    @patch('src.utils.gen_cert.gen_cert_handler.os.path.exists')
-    @patch('src.utils.gen_cert.gen_cert_handler.Presentation')
-    @patch('src.utils.gen_cert.gen_cert_handler.convert_pptx_to_pdf')
-    def test_gen_cert_handler_text_price_no_ruble_symbol(self, mock_convert, mock_presentation, mock_exists, mock_request, mock_pptx):
+    @patch('src.utils.gen_cert.gen_cert_handler.render_template')
+    @patch('src.utils.gen_cert.gen_cert_handler.convert_pptx_bytes_to_pdf')
+    def test_gen_cert_handler_text_price_no_ruble_symbol(self, mock_convert, mock_render_template, mock_request):
         """Test that text price doesn't get ₽ symbol added"""
-        mock_exists.return_value = True
-        
-        # Настраиваем мок для проверки замены текста
-        mock_run = MagicMock()
-        mock_run.text = "price"  # Начальный текст содержит ключ для замены
-        mock_paragraph = MagicMock()
-        mock_paragraph.runs = [mock_run]
-        mock_text_frame = MagicMock()
-        mock_text_frame.paragraphs = [mock_paragraph]
-        mock_shape = MagicMock()
-        mock_shape.has_text_frame = True
-        mock_shape.text_frame = mock_text_frame
-        mock_slide = MagicMock()
-        mock_slide.shapes = [mock_shape]
-        mock_presentation_instance = MagicMock()
-        mock_presentation_instance.slides = [mock_slide]
-        mock_presentation.return_value = mock_presentation_instance
+        mock_render_template.return_value = b"PK"
+        mock_convert.return_value = b"%PDF"
 
         result = gen_cert_handler(
             request=mock_request,
@@ -247,32 +220,16 @@ class TestGenCertHandler:
             price="бесплатно"
         )
 
-        assert isinstance(result, FileResponse)
-        # Проверяем, что текст был заменен на "бесплатно" без ₽
-        assert mock_run.text == "бесплатно"
+        assert isinstance(result, MemoryFileResponse)
+        # Проверяем, что подставляется "бесплатно" без ₽
+        assert mock_render_template.call_args[0][1]['price'] == "бесплатно"
 
-    @patch('src.utils.gen_cert.gen_cert_handler.os.path.exists')
-    @patch('src.utils.gen_cert.gen_cert_handler.Presentation')
-    @patch('src.utils.gen_cert.gen_cert_handler.convert_pptx_to_pdf')
-    def test_gen_cert_handler_empty_price_no_ruble_symbol(self, mock_convert, mock_presentation, mock_exists, mock_request, mock_pptx):
+    @patch('src.utils.gen_cert.gen_cert_handler.render_template')
+    @patch('src.utils.gen_cert.gen_cert_handler.convert_pptx_bytes_to_pdf')
+    def test_gen_cert_handler_empty_price_no_ruble_symbol(self, mock_convert, mock_render_template, mock_request):
         """Test that empty price doesn't get ₽ symbol added"""
-        mock_exists.return_value = True
-        
-        # Настраиваем мок для проверки замены текста
-        mock_run = MagicMock()
-        mock_run.text = "price"  # Начальный текст содержит ключ для замены
-        mock_paragraph = MagicMock()
-        mock_paragraph.runs = [mock_run]
-        mock_text_frame = MagicMock()
-        mock_text_frame.paragraphs = [mock_paragraph]
-        mock_shape = MagicMock()
-        mock_shape.has_text_frame = True
-        mock_shape.text_frame = mock_text_frame
-        mock_slide = MagicMock()
-        mock_slide.shapes = [mock_shape]
-        mock_presentation_instance = MagicMock()
-        mock_presentation_instance.slides = [mock_slide]
-        mock_presentation.return_value = mock_presentation_instance
+        mock_render_template.return_value = b"PK"
+        mock_convert.return_value = b"%PDF"
 
         result = gen_cert_handler(
             request=mock_request,
@@ -280,6 +237,138 @@ class TestGenCertHandler:
             price=""
         )
 
-        assert isinstance(result, FileResponse)
-        # Проверяем, что текст был заменен на пустую строку без ₽
-        assert mock_run.text == ""
+        assert isinstance(result, MemoryFileResponse)
+        # Проверяем, что подставляется пустая строка без ₽
+        assert mock_render_template.call_args[0][1]['price'] == ""
+
+
+def default_font(family, bold, italic, size_px):
+    return ImageFont.load_default(size_px)
+
+
+@pytest.fixture
+def cert_template(make_pptx):
+    """Шаблон сертификата с явно заданными шрифтами"""
+    path = make_pptx("name", "price", "№ serial")
+    prs = Presentation(path)
+    for shape in prs.slides[0].shapes:
+        shape.text_frame.paragraphs[0].runs[0].font.name = "DejaVu Sans"
+    prs.save(path)
+    return path
+
+
+class TestFastRenderer:
+    """Tests for LibreOffice-free certificate renderer"""
+
+    @patch.object(fast_render, 'load_font', default_font)
+    def test_render_returns_pdf(self, cert_template):
+        """Test renderer draws fields and returns a PDF page"""
+        background = Image.new('RGB', (200, 150), 'white')
+        renderer = FastCertificateRenderer(cert_template, background=background)
+
+        pdf = renderer.render({'name': 'Иван', 'price': '5000 ₽', 'serial': '123456'})
+
+        assert pdf.startswith(b'%PDF')
+        assert len(renderer.fields) == 3
+        assert renderer.fields[2].fill({'serial': '123456'}) == '№ 123456'
+        assert background.getpixel((0, 0)) == (255, 255, 255)
+
+    @patch.object(fast_render, 'load_font', default_font)
+    def test_screen_profile_is_smaller(self, cert_template):
+        """Test screen profile downsamples and compresses the page"""
+        background = Image.effect_noise((600, 450), 64).convert('RGB')
+        renderer = FastCertificateRenderer(cert_template, background=background)
+        values = {'name': 'Иван', 'price': '5000 ₽', 'serial': '123456'}
+
+        screen = renderer.render(values, get_export_profile('screen'))
+        default = renderer.render(values, get_export_profile('default'))
+
+        assert screen.startswith(b'%PDF')
+        assert len(screen) < len(default)
+
+    @patch.object(fast_render, 'load_font', default_font)
+    def test_render_draws_text_into_field_box(self, cert_template):
+        """Test drawn text lands inside the placeholder shape"""
+        background = Image.new('RGB', (2000, 1500), 'white')
+        renderer = FastCertificateRenderer(cert_template, background=background)
+        field = renderer.fields[0]
+
+        image = background.copy()
+        field.draw(fast_render.ImageDraw.Draw(image), "Иван Иванов")
+
+        bbox = Image.eval(image.convert('L'), lambda v: 255 - v).getbbox()
+        assert bbox is not None
+        assert field.left - 1 <= bbox[0] and bbox[2] <= field.right + 1
+
+    def test_template_without_explicit_font_is_unsupported(self, make_pptx):
+        """Test fallback to LibreOffice for templates with inherited fonts"""
+        with pytest.raises(UnsupportedTemplate):
+            FastCertificateRenderer(make_pptx("name"), background=Image.new('RGB', (10, 10)))
+
+    @patch.object(fast_render, 'load_font', default_font)
+    def test_get_fast_renderer_invalidates_on_template_change(self, cert_template):
+        """Test replaced template disables the cached renderer"""
+        renderer = FastCertificateRenderer(cert_template, background=Image.new('RGB', (10, 10)))
+        with patch.object(fast_render, '_renderer', renderer), \
+                patch.object(fast_render, 'prepare_fast_renderer_async') as mock_prepare:
+            assert fast_render.get_fast_renderer() is renderer
+
+            os.utime(cert_template, ns=(0, 0))
+
+            assert fast_render.get_fast_renderer() is None
+            mock_prepare.assert_called_once_with(cert_template)
+
+    def test_libreoffice_mode_skips_fast_renderer(self, cert_template):
+        """Test the raster renderer is not prepared unless fast mode is enabled"""
+        with patch.object(fast_render, 'RENDER_MODE', 'libreoffice'), \
+                patch.object(fast_render, 'FastCertificateRenderer') as mock_renderer:
+            assert fast_render.prepare_fast_renderer(cert_template) is None
+
+        mock_renderer.assert_not_called()
+
+    @patch('src.utils.gen_cert.gen_cert_handler.get_fast_renderer')
+    @patch('src.utils.gen_cert.gen_cert_handler.render_template')
+    @patch('src.utils.gen_cert.gen_cert_handler.convert_pptx_bytes_to_pdf')
+    def test_handler_uses_fast_renderer(self, mock_convert, mock_render_template, mock_get_renderer, mock_request):
+        """Test handler skips LibreOffice when fast renderer is ready"""
+        mock_get_renderer.return_value.render.return_value = b'%PDF-fast'
+
+        result = gen_cert_handler(request=mock_request, name="Иван", price="5000")
+
+        assert isinstance(result, MemoryFileResponse)
+        assert result.body == b'%PDF-fast'
+        mock_convert.assert_not_called()
+        mock_render_template.assert_not_called()
+        replacements = mock_get_renderer.return_value.render.call_args[0][0]
+        assert replacements['price'] == "5000 ₽"
+
+    @patch('src.utils.gen_cert.gen_cert_handler.get_fast_renderer')
+    def test_handler_passes_profile(self, mock_get_renderer, mock_request):
+        """Test selected export profile reaches the renderer"""
+        mock_get_renderer.return_value.render.return_value = b'%PDF-fast'
+
+        gen_cert_handler(request=mock_request, name="Иван", price="5000", profile="screen")
+
+        assert mock_get_renderer.return_value.render.call_args[0][1].name == 'screen'
+
+    @patch('src.utils.gen_cert.gen_cert_handler.get_fast_renderer')
+    @patch('src.utils.gen_cert.gen_cert_handler.render_template')
+    @patch('src.utils.gen_cert.gen_cert_handler.convert_pptx_bytes_to_pdf')
+    def test_print_profile_bypasses_raster(self, mock_convert, mock_render_template, mock_get_renderer, mock_request):
+        """Test print profile is exported by LibreOffice, not as a JPEG page"""
+        mock_render_template.return_value = b'PPTX'
+        mock_convert.return_value = b'%PDF-vector'
+
+        result = gen_cert_handler(request=mock_request, name="Иван", price="5000", profile="print")
+
+        assert result.body == b'%PDF-vector'
+        mock_get_renderer.return_value.render.assert_not_called()
+        assert mock_convert.call_args[0][1] == 'print'
+
+    @patch('src.utils.gen_cert.gen_cert_handler.get_fast_renderer')
+    def test_handler_unknown_profile(self, mock_get_renderer, mock_request):
+        """Test unknown export profile redirects with an error"""
+        result = gen_cert_handler(request=mock_request, name="Иван", price="5000", profile="fax")
+
+        assert isinstance(result, RedirectResponse)
+        mock_get_renderer.return_value.render.assert_not_called()
@@ -0,0 +1,229 @@
+"""
+Tests for gen_cert/bulk_cert_handler.py module
+"""
+import io
+import os
+import zipfile
+from unittest.mock import MagicMock, patch
+
+import pytest
+from fastapi.responses import FileResponse, RedirectResponse, StreamingResponse
+from pptx import Presentation
+
+from src.utils.gen_cert.bulk_cert_handler import (
+    bulk_cert_handler,
+    iter_certificate_pdfs,
+    read_certificate_rows,
+    render_merged_pdf,
+    render_merged_pptx,
+)
+from src.utils.streaming_zip import iter_zip, safe_filename
+
+
+CSV_CONTENT = "ФИО;Сумма\nИван Иванов;5000\nПётр Петров;бесплатно\n;\n".encode('utf-8')
+
+
+class TestReadCertificateRows:
+    """Tests for reading certificate rows"""
+
+    def test_read_csv_rows(self):
+        """Test CSV rows with Russian headers are parsed"""
+        rows = read_certificate_rows("list.csv", CSV_CONTENT)
+
+        assert rows == [("Иван Иванов", "5000"), ("Пётр Петров", "бесплатно")]
+
+    def test_read_rows_without_known_columns(self):
+        """Test error for table without name/price columns"""
+        with pytest.raises(ValueError, match="В таблице нет данных"):
+            read_certificate_rows("list.csv", b"a,b\n1,2\n")
+
+    @patch('src.utils.gen_cert.bulk_cert_handler.MAX_BULK_ROWS', 1)
+    def test_read_rows_limit(self):
+        """Test row limit"""
+        with pytest.raises(ValueError, match="Слишком много строк"):
+            read_certificate_rows("list.csv", CSV_CONTENT)
+
+
+class TestStreamingZip:
+    """Tests for streaming ZIP helper"""
+
+    def test_iter_zip_produces_valid_archive(self):
+        """Test streamed chunks form a valid archive"""
+        chunks = list(iter_zip([("a.txt", b"first"), ("b.txt", b"second")]))
+
+        assert len(chunks) >= 2
+        with zipfile.ZipFile(io.BytesIO(b"".join(chunks))) as archive:
+            assert archive.read("a.txt") == b"first"
+            assert archive.read("b.txt") == b"second"
+
+    def test_safe_filename(self):
+        """Test unsafe characters are replaced"""
+        assert safe_filename('Иван/Иванов: "VIP"') == 'Иван_Иванов_ _VIP_'
+        assert safe_filename('', 'default') == 'default'
+
+
+class TestBulkRendering:
+    """Tests for bulk certificate rendering"""
+
+    def test_render_merged_pptx(self, make_pptx, tmp_path):
+        """Test every certificate becomes a separate slide"""
+        template = make_pptx("name", "price", "serial")
+        output = str(tmp_path / "merged.pptx")
+
+        with patch('src.utils.gen_cert.bulk_cert_handler.TEMPLATE_PATH', template):
+            render_merged_pptx([("Иван", "100"), ("Пётр", "200"), ("Анна", "")], output)
+
+        prs = Presentation(output)
+        texts = [
+            [shape.text_frame.text for shape in slide.shapes]
+            for slide in prs.slides
+        ]
+        assert len(texts) == 3
+        assert texts[0][:2] == ["Иван", "100 ₽"]
+        assert texts[1][:2] == ["Пётр", "200 ₽"]
+        assert texts[2][:2] == ["Анна", ""]
+        assert texts[0][2].isdigit()
+
+    def test_render_merged_pdf_in_chunks(self, make_pptx, tmp_path):
+        """Test the merged PDF is converted per chunk and joined with pdfunite"""
+        template = make_pptx("name", "price", "serial")
+        workdir = tmp_path / "work"
+        workdir.mkdir()
+        slides_per_part = []
+
+        def fake_convert(pptx_path, pdf_path, cache=True):
+            assert cache is False
+            slides_per_part.append(len(Presentation(pptx_path).slides))
+            with open(pdf_path, 'wb') as f:
+                f.write(b"%PDF")
+
+        def fake_unite(cmd, **kwargs):
+            with open(cmd[-1], 'wb') as f:
+                f.write(b"%PDF-merged")
+            return MagicMock(returncode=0, stderr="")
+
+        rows = [(f"Имя {index}", "100") for index in range(5)]
+        with patch('src.utils.gen_cert.bulk_cert_handler.TEMPLATE_PATH', template), \
+                patch('src.utils.gen_cert.bulk_cert_handler.BULK_CHUNK', 2), \
+                patch('src.utils.gen_cert.bulk_cert_handler.convert_pptx_to_pdf', fake_convert), \
+                patch('src.utils.gen_cert.bulk_cert_handler.shutil.which', return_value='/usr/bin/pdfunite'), \
+                patch('src.utils.gen_cert.bulk_cert_handler.subprocess.run', side_effect=fake_unite) as mock_run:
+            pdf_path = render_merged_pdf(rows, str(workdir))
+
+        assert slides_per_part == [2, 2, 1]
+        cmd = mock_run.call_args[0][0]
+        assert [os.path.basename(path) for path in cmd[1:-1]] == [
+            "part0001.pdf", "part0002.pdf", "part0003.pdf"
+        ]
+        assert open(pdf_path, 'rb').read() == b"%PDF-merged"
+        assert os.listdir(workdir) == ["certificates.pdf"]
+
+    def test_iter_certificate_pdfs(self, make_pptx, tmp_path):
+        """Test PDFs are yielded with readable names and workdir is removed"""
+        template = make_pptx("name", "price", "serial")
+        workdir = tmp_path / "work"
+        workdir.mkdir()
+
+        def fake_convert(paths, outdir, cache=True):
+            assert cache is False
+            for path in paths:
+                pdf_path = os.path.splitext(path)[0] + ".pdf"
+                with open(pdf_path, 'wb') as f:
+                    f.write(b"%PDF")
+                yield path, pdf_path
+
+        with patch('src.utils.gen_cert.bulk_cert_handler.TEMPLATE_PATH', template), \
+                patch('src.utils.gen_cert.bulk_cert_handler.iter_convert_to_pdf', fake_convert):
+            result = list(iter_certificate_pdfs([("Иван", "100"), ("Пётр", "200")], str(workdir)))
+
+        assert result == [("001_Иван.pdf", b"%PDF"), ("002_Пётр.pdf", b"%PDF")]
+        assert not workdir.exists()
+
+    def test_iter_certificate_pdfs_in_chunks(self, make_pptx, tmp_path):
+        """Test each chunk is converted and removed before the next is filled"""
+        template = make_pptx("name", "price", "serial")
+        workdir = tmp_path / "work"
+        workdir.mkdir()
+        files_per_chunk = []
+
+        def fake_convert(paths, outdir, cache=True):
+            files_per_chunk.append(len(os.listdir(outdir)))
+            for path in paths:
+                pdf_path = os.path.splitext(path)[0] + ".pdf"
+                with open(pdf_path, 'wb') as f:
+                    f.write(b"%PDF")
+                yield path, pdf_path
+
+        rows = [(f"Имя {index}", "100") for index in range(5)]
+        with patch('src.utils.gen_cert.bulk_cert_handler.TEMPLATE_PATH', template), \
+                patch('src.utils.gen_cert.bulk_cert_handler.BULK_CHUNK', 2), \
+                patch('src.utils.gen_cert.bulk_cert_handler.iter_convert_to_pdf', fake_convert):
+            result = list(iter_certificate_pdfs(rows, str(workdir)))
+
+        assert len(result) == 5
+        assert result[-1][0] == "005_Имя 4.pdf"
+        assert files_per_chunk == [2, 2, 1]
+
+
+class TestBulkCertHandler:
+    """Tests for bulk certificate handler"""
+
+    @patch('src.utils.gen_cert.bulk_cert_handler.os.path.exists')
+    def test_bulk_zip_response(self, mock_exists, mock_request, make_upload):
+        """Test ZIP output is streamed"""
+        mock_exists.return_value = True
+
+        result = bulk_cert_handler(
+            request=mock_request,
+            file=make_upload("list.csv", CSV_CONTENT),
+            output="zip"
+        )
+
+        assert isinstance(result, StreamingResponse)
+        assert result.media_type == "application/zip"
+        assert "attachment" in result.headers["content-disposition"]
+
+    @patch('src.utils.gen_cert.bulk_cert_handler.os.path.exists')
+    @patch('src.utils.gen_cert.bulk_cert_handler.render_merged_pdf')
+    def test_bulk_pdf_response(self, mock_render, mock_exists, mock_request, make_upload):
+        """Test merged PDF output is returned as a file"""
+        mock_exists.return_value = True
+        mock_render.return_value = "/tmp/certificates.pdf"
+
+        result = bulk_cert_handler(
+            request=mock_request,
+            file=make_upload("list.csv", CSV_CONTENT),
+            output="pdf"
+        )
+
+        assert isinstance(result, FileResponse)
+        assert result.filename == "Сертификаты.pdf"
+        mock_render.assert_called_once()
+
+    @patch('src.utils.gen_cert.bulk_cert_handler.os.path.exists')
+    def test_bulk_invalid_table(self, mock_exists, mock_request, make_upload):
+        """Test unsupported table format redirects with status"""
+        mock_exists.return_value = True
+
+        result = bulk_cert_handler(
+            request=mock_request,
+            file=make_upload("list.txt", b"data"),
+            output=None
+        )
+
+        assert isinstance(result, RedirectResponse)
+        assert result.headers["location"] == "/gen_rit_cert"
+
+    @patch('src.utils.gen_cert.bulk_cert_handler.os.path.exists')
+    def test_bulk_template_not_found(self, mock_exists, mock_request, make_upload):
+        """Test missing template handling"""
+        mock_exists.return_value = False
+
+        result = bulk_cert_handler(
+            request=mock_request,
+            file=make_upload("list.csv", CSV_CONTENT),
+            output="zip"
+        )
+
+        assert isinstance(result, RedirectResponse)
+        assert result.status_code == 303
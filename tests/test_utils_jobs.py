@@ -0,0 +1,258 @@
+"""
+Тесты для фоновых задач генерации документов
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+from unittest.mock import MagicMock
+
+import pytest
+from fastapi import BackgroundTasks
+from starlette.background import BackgroundTask
+from fastapi.responses import FileResponse, RedirectResponse
+
+from src.utils import jobs
+from src.utils.jobs import JobManager, JobQueueFull, DONE, FAILED
+from src.utils.responses import MemoryFileResponse, StreamingFileResponse
+
+
+def file_handler(path, cleaned):
+    def handler():
+        with open(path, 'wb') as f:
+            f.write(b'%PDF')
+        background = BackgroundTasks()
+        background.add_task(cleaned.set)
+        return FileResponse(path=path, filename="Сертификат.pdf", media_type='application/pdf', background=background)
+    return handler
+
+
+def error_handler():
+    response = RedirectResponse(url="/gen_rit_cert", status_code=303)
+    response.set_cookie("gen_cert_status", "0J7RiNC40LHQutCw", max_age=10)
+    return response
+
+
+@pytest.fixture
+def manager():
+    manager = JobManager(workers=1, max_pending=2, ttl=60)
+    yield manager
+    manager.shutdown()
+
+
+class TestJobManager:
+    """Tests for JobManager"""
+
+    def test_file_response_becomes_result(self, manager, tmp_path, wait_job):
+        """Test successful handler stores file result"""
+        path = str(tmp_path / "out.pdf")
+        job = manager.submit('gen_rit_cert', file_handler(path, threading.Event()))
+
+        job = wait_job(manager, job)
+
+        assert job.status == DONE
+        assert job.result_path == path
+        assert job.filename == "Сертификат.pdf"
+        assert job.to_dict()['result_url'] == f'/jobs/{job.id}/result'
+
+    def test_memory_response_becomes_result(self, manager, wait_job):
+        """Test in-memory file is kept as job result"""
+        def handler():
+            return MemoryFileResponse(b'%PDF', "Сертификат.pdf", 'application/pdf')
+
+        job = wait_job(manager, manager.submit('gen_rit_cert', handler))
+
+        assert job.status == DONE
+        assert job.result_body == b'%PDF'
+        assert job.result_path is None
+        assert job.media_type == 'application/pdf'
+
+    def test_streaming_response_is_collected(self, manager, wait_job):
+        """Test a streamed attachment is written to disk from its generator, with its X- headers"""
+        cleaned = threading.Event()
+        loops = []
+
+        def chunks():
+            # The generator runs in the job thread, outside any event loop.
+            try:
+                loops.append(asyncio.get_running_loop())
+            except RuntimeError:
+                pass
+            yield b'PK'
+            yield b'\x03\x04'
+
+        def handler():
+            return StreamingFileResponse(
+                chunks(),
+                filename="Без фона.zip",
+                media_type='application/zip',
+                headers={'X-Page-Count': '2'},
+                background=BackgroundTask(cleaned.set)
+            )
+
+        job = wait_job(manager, manager.submit('remove_bg', handler))
+
+        assert job.status == DONE
+        assert job.result_body is None
+        with open(job.result_path, 'rb') as result:
+            assert result.read() == b'PK\x03\x04'
+        assert job.result_size == 4
+        assert job.filename == "Без фона.zip"
+        assert job.headers == {'x-page-count': '2'}
+        assert cleaned.is_set()
+        assert loops == []
+
+        manager.shutdown()
+        assert not os.path.exists(job.result_path)
+
+    def test_redirect_becomes_error(self, manager, wait_job):
+        """Test handler error redirect is reported with its status message"""
+        job = wait_job(manager, manager.submit('gen_rit_cert', error_handler))
+
+        assert job.status == FAILED
+        assert job.error == "Ошибка"
+
+    def test_exception_becomes_error(self, manager, wait_job):
+        """Test unexpected exception fails the job"""
+        def broken():
+            raise RuntimeError("boom")
+
+        job = wait_job(manager, manager.submit('remove_bg', broken))
+
+        assert job.status == FAILED
+        assert job.error == "boom"
+
+    def test_queue_limit(self, manager):
+        """Test submissions beyond max_pending are refused"""
+        release = threading.Event()
+        manager.submit('a', release.wait)
+        second = manager.submit('b', release.wait)
+
+        with pytest.raises(JobQueueFull):
+            manager.submit('c', release.wait)
+
+        assert manager.position(second) == 1
+        release.set()
+
+    def test_result_storage_limit(self, wait_job):
+        """Test new jobs are refused while stored results exceed the byte limit"""
+        manager = JobManager(workers=1, max_pending=100, ttl=60, max_result_bytes=4)
+        try:
+            job = manager.submit(
+                'remove_bg', lambda: MemoryFileResponse(b'PNG!', "a.png", 'image/png')
+            )
+            wait_job(manager, job)
+
+            with pytest.raises(JobQueueFull, match="Хранилище"):
+                manager.submit('remove_bg', lambda: None)
+            assert manager.stats()['result_bytes'] == 4
+
+            manager.ttl = 0
+            time.sleep(0.01)
+            manager.submit('remove_bg', lambda: None)
+        finally:
+            manager.shutdown()
+
+    def test_expired_results_are_cleaned(self, tmp_path):
+        """Test finished jobs expire and run their cleanup"""
+        manager = JobManager(workers=1, ttl=0)
+        cleaned = threading.Event()
+        job = manager.submit('gen_rit_cert', file_handler(str(tmp_path / "out.pdf"), cleaned))
+        while job.status not in jobs.FINISHED:
+            time.sleep(0.01)
+        time.sleep(0.01)
+
+        assert manager.get(job.id) is None
+        assert cleaned.is_set()
+        manager.shutdown()
+
+    def test_sweeper_expires_without_api_calls(self):
+        """Test expired in-memory results are dropped by the background sweeper"""
+        manager = JobManager(workers=1, ttl=0, sweep_interval=0.01)
+        job = manager.submit(
+            'remove_bg', lambda: MemoryFileResponse(b'PNG', "a.png", 'image/png')
+        )
+        deadline = time.time() + 5
+        while job.id in manager._jobs:
+            assert time.time() < deadline
+            time.sleep(0.01)
+
+        assert job.status == DONE
+        manager.shutdown()
+
+    def test_status_has_no_fake_progress(self, manager, wait_job):
+        """Test job status reports the state without a synthetic percentage"""
+        job = wait_job(manager, manager.submit('remove_bg', lambda: None))
+
+        assert 'progress' not in job.to_dict()
+
+
+class TestJobResponses:
+    """Tests for job HTTP helpers"""
+
+    @pytest.fixture(autouse=True)
+    def isolated_manager(self, manager, monkeypatch):
+        monkeypatch.setattr(jobs, '_manager', manager)
+
+    def test_wants_async(self):
+        """Test async mode is requested by header or query parameter"""
+        by_header = MagicMock(query_params={}, headers={'prefer': 'respond-async'})
+        by_query = MagicMock(query_params={'async': '1'}, headers={})
+        regular = MagicMock(query_params={}, headers={})
+
+        assert jobs.wants_async(by_header) is True
+        assert jobs.wants_async(by_query) is True
+        assert jobs.wants_async(regular) is False
+
+    def test_submit_returns_202(self, manager, tmp_path):
+        """Test submission returns job id and links"""
+        response = jobs.submit_job_response(
+            'gen_rit_cert', file_handler(str(tmp_path / "out.pdf"), threading.Event())
+        )
+
+        body = json.loads(response.body)
+        assert response.status_code == 202
+        assert response.headers['location'] == f"/jobs/{body['id']}"
+        assert body['events_url'] == f"/jobs/{body['id']}/events"
+
+    def test_result_download(self, manager, tmp_path, wait_job):
+        """Test finished result is served, unfinished one is 409"""
+        release = threading.Event()
+        path = str(tmp_path / "out.pdf")
+        handler = file_handler(path, threading.Event())
+        job = manager.submit('gen_rit_cert', lambda: (release.wait(), handler())[1])
+
+        assert jobs.job_result_response(job.id).status_code == 409
+        release.set()
+        wait_job(manager, job)
+
+        response = jobs.job_result_response(job.id)
+        assert isinstance(response, FileResponse)
+        assert response.path == path
+        assert "attachment" in response.headers['content-disposition']
+
+    def test_unknown_job(self):
+        """Test unknown job id returns 404"""
+        assert jobs.job_status_response("missing").status_code == 404
+        assert jobs.job_result_response("missing").status_code == 404
+
+    def test_events_stream_until_finished(self, manager, tmp_path):
+        """Test SSE stream reports status changes and ends with the result"""
+        release = threading.Event()
+        handler = file_handler(str(tmp_path / "out.pdf"), threading.Event())
+        job = manager.submit('gen_rit_cert', lambda: (release.wait(), handler())[1])
+        response = jobs.job_events_response(job.id)
+
+        async def collect():
+            events = []
+            async for chunk in response.body_iterator:
+                events.append(chunk)
+                release.set()
+            return events
+
+        events = asyncio.run(collect())
+
+        assert response.media_type == 'text/event-stream'
+        assert events[-1].startswith("event: done\n")
+        assert json.loads(events[-1].split("data: ", 1)[1])['result_url']
@@ -0,0 +1,861 @@
+"""
+Tests for office/ conversion subsystem
+"""
+import io
+import json
+import os
+import struct
+import zipfile
+import threading
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+from pptx import Presentation
+
+from src.utils.office import libreoffice, libreoffice_pool, profiles
+from src.utils.office import converter_status, discover_converter
+from src.utils.office.libreoffice_pool import LibreOfficePool
+from src.utils.office.profiles import SlotRunner
+from src.utils.office.conversion_cache import ConversionCache, conversion_key
+from src.utils.office.substitution import Substitutions
+from src.utils.office.pdf_export import ExportStats, get_export_profile, linearize_pdf
+from src.utils.office.package import PptxPackage
+from src.utils.office.templates import TemplateCache, fill_template, render_template
+from src.utils.office.scratch import scratch_dir
+from src.utils.office.batch import iter_convert_to_pdf
+from src.utils.office.slides import duplicate_slide
+from src.utils.office.spreadsheet import pick, read_rows
+from src.utils.gen_cert.gen_cert_handler import _convert_in_slot, convert_pptx_to_pdf
+
+
+class FakeWorker:
+    """Заглушка экземпляра LibreOffice"""
+
+    def __init__(self, name="fake", delay=0.0, error=None):
+        self.name = name
+        self.delay = delay
+        self.error = error
+        self.killed = False
+        self.converted = []
+
+    def alive(self):
+        return not self.killed
+
+    def convert(self, pptx_path, pdf_path, filter_data=None):
+        deadline = time.monotonic() + self.delay
+        while time.monotonic() < deadline:
+            if self.killed:
+                raise Exception("disposed")
+            time.sleep(0.01)
+        if self.error:
+            raise self.error
+        self.converted.append((pptx_path, pdf_path))
+
+    def kill(self):
+        self.killed = True
+
+
+def make_pool(*workers, **kwargs):
+    pool = LibreOfficePool("soffice", size=len(workers), **kwargs)
+    pool._restart = MagicMock()
+    for worker in workers:
+        pool._idle.put(worker)
+    pool._ready.set()
+    return pool
+
+
+class TestLibreOfficePool:
+    """Tests for LibreOffice worker pool"""
+
+    def test_convert_uses_idle_worker_and_returns_it(self):
+        """Test conversion goes to idle worker which returns to the pool"""
+        worker = FakeWorker()
+        pool = make_pool(worker)
+
+        pool.convert("in.pptx", "out.pdf")
+
+        assert worker.converted == [("in.pptx", "out.pdf")]
+        assert pool._idle.get_nowait() is worker
+        pool._restart.assert_not_called()
+
+    def test_convert_failure_restarts_worker(self):
+        """Test crashed worker is replaced"""
+        worker = FakeWorker(error=Exception("crash"))
+        pool = make_pool(worker)
+
+        with pytest.raises(Exception, match="crash"):
+            pool.convert("in.pptx", "out.pdf")
+
+        pool._restart.assert_called_once_with(worker)
+        assert pool._idle.empty()
+
+    def test_convert_hung_worker_is_killed(self):
+        """Test hung conversion is killed by watchdog"""
+        worker = FakeWorker(delay=5)
+        pool = make_pool(worker, convert_timeout=0.1)
+
+        with pytest.raises(Exception, match="Превышено время ожидания"):
+            pool.convert("in.pptx", "out.pdf")
+
+        assert worker.killed
+        pool._restart.assert_called_once_with(worker)
+
+    def test_acquire_skips_dead_worker(self):
+        """Test dead idle worker is restarted and skipped"""
+        dead = FakeWorker("dead")
+        dead.killed = True
+        alive = FakeWorker("alive")
+        pool = make_pool(dead, alive)
+
+        pool.convert("in.pptx", "out.pdf")
+
+        pool._restart.assert_called_once_with(dead)
+        assert alive.converted
+
+    def test_acquire_timeout(self):
+        """Test error when no worker becomes free"""
+        pool = make_pool(acquire_timeout=0.1)
+
+        with pytest.raises(Exception, match="Нет свободного обработчика"):
+            pool.convert("in.pptx", "out.pdf")
+
+    def test_parallel_conversions_use_different_workers(self):
+        """Test concurrent conversions are spread across workers"""
+        first = FakeWorker("first", delay=0.2)
+        second = FakeWorker("second", delay=0.2)
+        pool = make_pool(first, second)
+
+        threads = [
+            threading.Thread(target=pool.convert, args=(f"{i}.pptx", f"{i}.pdf"))
+            for i in range(2)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(first.converted) == 1
+        assert len(second.converted) == 1
+
+
+class TestPoolLifecycle:
+    """Tests for pool startup"""
+
+    @patch.object(libreoffice_pool, 'uno', None)
+    @patch('src.utils.office.libreoffice.subprocess.run')
+    def test_start_pool_without_uno(self, mock_run, caplog):
+        """Test missing UNO is logged as an error and reported as degraded"""
+        mock_run.return_value = MagicMock(returncode=0, stdout=b"LibreOffice 7.6")
+
+        with caplog.at_level('ERROR', logger=libreoffice_pool.__name__):
+            assert libreoffice_pool.start_pool(size=2) is None
+
+        assert libreoffice_pool.get_pool() is None
+        assert "uno" in caplog.text
+        assert converter_status()['status'] == 'degraded'
+
+    @patch('src.utils.gen_cert.gen_cert_handler.get_pool')
+    @patch('src.utils.gen_cert.gen_cert_handler.subprocess.run')
+    def test_convert_pptx_to_pdf_uses_pool(self, mock_run, mock_get_pool):
+        """Test conversion is delegated to the pool when it is ready"""
+        pool = MagicMock()
+        mock_get_pool.return_value = pool
+
+        convert_pptx_to_pdf("in.pptx", "out.pdf")
+
+        pool.convert.assert_called_once_with("in.pptx", "out.pdf", {})
+        mock_run.assert_not_called()
+
+
+class TestConverterDiscovery:
+    """Tests for cached converter discovery"""
+
+    @patch('src.utils.office.libreoffice.subprocess.run')
+    def test_discovery_is_cached(self, mock_run):
+        """Test LibreOffice is probed only once"""
+        mock_run.return_value = MagicMock(returncode=0, stdout=b"LibreOffice 7.6.4.1\n")
+
+        first = discover_converter()
+        second = discover_converter()
+
+        assert first is second
+        assert first['binary'] == 'libreoffice'
+        assert first['version'] == "LibreOffice 7.6.4.1"
+        assert mock_run.call_count == 1
+
+    @patch.object(libreoffice, 'uno', None)
+    @patch('src.utils.office.libreoffice.subprocess.run')
+    def test_discovery_backend_without_uno(self, mock_run):
+        """Test subprocess backend is chosen without UNO"""
+        mock_run.return_value = MagicMock(returncode=0, stdout=b"LibreOffice 7.6")
+
+        assert discover_converter()['backend'] == 'subprocess'
+
+    @patch('src.utils.office.libreoffice.subprocess.run')
+    def test_discovery_not_found(self, mock_run):
+        """Test missing LibreOffice is reported as unavailable"""
+        mock_run.side_effect = FileNotFoundError()
+
+        status = converter_status()
+
+        assert status['status'] == 'unavailable'
+        assert status['binary'] is None
+
+    @patch('src.utils.gen_cert.gen_cert_handler.subprocess.run')
+    def test_convert_does_not_probe_again(self, mock_run, temp_file):
+        """Test conversion reuses cached binary path"""
+        mock_run.return_value = MagicMock(returncode=0, stdout=b"LibreOffice", stderr="")
+        discover_converter()
+        mock_run.reset_mock()
+
+        with pytest.raises(Exception, match="PDF файл не был создан"):
+            convert_pptx_to_pdf(temp_file + ".pptx", temp_file + ".pdf")
+
+        assert mock_run.call_count == 1
+        assert '--convert-to' in mock_run.call_args[0][0]
+
+
+class TestReadinessEndpoint:
+    """Tests for /ready endpoint"""
+
+    @patch('src.main.converter_status')
+    def test_ready_ok(self, mock_status, client):
+        """Test ready converter returns 200 without converter details"""
+        mock_status.return_value = {
+            'status': 'ok', 'backend': 'subprocess',
+            'binary': '/usr/bin/libreoffice', 'version': '7.6', 'pool_size': 0
+        }
+
+        response = client.get("/ready")
+
+        assert response.status_code == 200
+        assert response.json() == {'status': 'ok'}
+
+    @patch('src.main.converter_status')
+    def test_ready_unavailable_head(self, mock_status, client):
+        """Test HEAD /ready returns 503 without LibreOffice"""
+        mock_status.return_value = {'status': 'unavailable'}
+
+        response = client.head("/ready")
+
+        assert response.status_code == 503
+        assert response.content == b""
+
+
+class TestSlotRunner:
+    """Tests for isolated LibreOffice profiles"""
+
+    def test_slots_have_distinct_profiles(self, tmp_path):
+        """Test concurrent slots get different profile directories"""
+        with patch.object(profiles, 'PROFILE_ROOT', str(tmp_path)), \
+                patch.object(profiles, 'TEMPLATE_DIR', str(tmp_path / 'template')):
+            runner = SlotRunner(slots=2)
+            with runner.slot() as first, runner.slot() as second:
+                assert first != second
+                assert os.path.isdir(first)
+                assert os.path.isdir(second)
+
+    def test_profile_seeded_from_template(self, tmp_path):
+        """Test slot profile is copied from the warmed template"""
+        template = tmp_path / 'template' / 'user'
+        template.mkdir(parents=True)
+        (template / 'registrymodifications.xcu').write_text("warm")
+
+        with patch.object(profiles, 'PROFILE_ROOT', str(tmp_path)), \
+                patch.object(profiles, 'TEMPLATE_DIR', str(tmp_path / 'template')):
+            runner = SlotRunner(slots=1)
+            with runner.slot() as profile_dir:
+                seeded = os.path.join(profile_dir, 'user', 'registrymodifications.xcu')
+                assert open(seeded).read() == "warm"
+
+    def test_failed_slot_is_reseeded(self, tmp_path):
+        """Test profile is recreated after a failed conversion"""
+        with patch.object(profiles, 'PROFILE_ROOT', str(tmp_path)), \
+                patch.object(profiles, 'TEMPLATE_DIR', str(tmp_path / 'template')):
+            runner = SlotRunner(slots=1)
+            with pytest.raises(RuntimeError):
+                with runner.slot() as profile_dir:
+                    open(os.path.join(profile_dir, '.lock'), 'w').close()
+                    raise RuntimeError("soffice crashed")
+
+            with runner.slot() as profile_dir:
+                assert not os.path.exists(os.path.join(profile_dir, '.lock'))
+
+    @patch('src.utils.gen_cert.gen_cert_handler.subprocess.run')
+    def test_failed_soffice_run_reseeds_slot(self, mock_run, tmp_path):
+        """Test a non-zero soffice exit marks the slot profile for reseeding"""
+        mock_run.return_value = MagicMock(returncode=1, stdout="", stderr="crash")
+        runner = SlotRunner(slots=1)
+        runner._seeded.add(0)
+
+        with patch('src.utils.gen_cert.gen_cert_handler.get_slot_runner', return_value=runner), \
+                patch('src.utils.gen_cert.gen_cert_handler.find_libreoffice',
+                      return_value='soffice'), \
+                patch.object(runner, 'profile_dir', return_value=str(tmp_path)):
+            with pytest.raises(Exception, match="LibreOffice error"):
+                _convert_in_slot(
+                    str(tmp_path / 'in.pptx'), str(tmp_path / 'out.pdf'), get_export_profile()
+                )
+
+        assert 0 not in runner._seeded
+
+    def test_slot_timeout(self):
+        """Test error when all slots are busy"""
+        runner = SlotRunner(slots=1, slot_timeout=0.05)
+        runner._free.get()
+
+        with pytest.raises(Exception, match="Нет свободного слота"):
+            with runner.slot():
+                pass
+
+    @patch('src.utils.gen_cert.gen_cert_handler.subprocess.run')
+    def test_convert_passes_slot_profile(self, mock_run, temp_file):
+        """Test soffice is started with a per-slot user profile"""
+        mock_run.return_value = MagicMock(returncode=0, stdout=b"LibreOffice", stderr="")
+
+        with pytest.raises(Exception):
+            convert_pptx_to_pdf(temp_file + ".pptx", temp_file + ".pdf")
+
+        cmd = mock_run.call_args[0][0]
+        assert any(arg.startswith('-env:UserInstallation=file://') for arg in cmd)
+
+
+def make_xlsx(rows):
+    """Минимальный XLSX с inline-строками и общими строками"""
+    shared = []
+    sheet_rows = []
+    for row_index, row in enumerate(rows, start=1):
+        cells = []
+        for col_index, value in enumerate(row):
+            ref = f"{chr(ord('A') + col_index)}{row_index}"
+            if isinstance(value, (int, float)):
+                cells.append(f'<c r="{ref}"><v>{value}</v></c>')
+            else:
+                shared.append(value)
+                cells.append(f'<c r="{ref}" t="s"><v>{len(shared) - 1}</v></c>')
+        sheet_rows.append(f'<row r="{row_index}">{"".join(cells)}</row>')
+    main = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+    rel = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        archive.writestr('xl/workbook.xml', (
+            f'<workbook xmlns="{main}" xmlns:r="{rel}"><sheets>'
+            '<sheet name="Лист1" sheetId="1" r:id="rId1"/></sheets></workbook>'
+        ))
+        archive.writestr('xl/_rels/workbook.xml.rels', (
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" Target="worksheets/sheet1.xml" '
+            'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"/>'
+            '</Relationships>'
+        ))
+        archive.writestr('xl/sharedStrings.xml', (
+            f'<sst xmlns="{main}">'
+            + ''.join(f'<si><t>{value}</t></si>' for value in shared)
+            + '</sst>'
+        ))
+        archive.writestr('xl/worksheets/sheet1.xml', (
+            f'<worksheet xmlns="{main}"><sheetData>{"".join(sheet_rows)}</sheetData></worksheet>'
+        ))
+    return buffer.getvalue()
+
+
+class TestSpreadsheet:
+    """Tests for CSV/XLSX reader"""
+
+    def test_read_csv_comma(self):
+        """Test comma separated CSV"""
+        rows = read_rows("a.csv", b"Name,Price\nIvan,100\n")
+
+        assert rows == [{'name': 'Ivan', 'price': '100'}]
+
+    def test_read_csv_cp1251(self):
+        """Test CSV exported by Excel in cp1251"""
+        rows = read_rows("a.csv", "ФИО;Сумма\nИван;100\n".encode('cp1251'))
+
+        assert rows == [{'фио': 'Иван', 'сумма': '100'}]
+
+    def test_read_xlsx(self):
+        """Test XLSX with shared strings and numbers"""
+        content = make_xlsx([["ФИО", "Сумма"], ["Иван Иванов", 5000], ["Пётр", 1500.5]])
+
+        rows = read_rows("a.xlsx", content)
+
+        assert rows == [
+            {'фио': 'Иван Иванов', 'сумма': '5000'},
+            {'фио': 'Пётр', 'сумма': '1500.5'},
+        ]
+
+    def test_read_unsupported(self):
+        """Test unsupported extension"""
+        with pytest.raises(ValueError, match="Неподдерживаемый формат таблицы"):
+            read_rows("a.ods", b"")
+
+    def test_pick_aliases(self):
+        """Test picking value by column aliases"""
+        assert pick({'фио': 'Иван'}, 'name', 'фио') == 'Иван'
+        assert pick({}, 'name') == ''
+
+
+class TestDuplicateSlide:
+    """Tests for slide cloning"""
+
+    def test_duplicate_slide_copies_shapes(self, make_pptx):
+        """Test cloned slide has independent copies of shapes"""
+        prs = Presentation(make_pptx("name", "price"))
+        source = prs.slides[0]
+
+        clone = duplicate_slide(prs, source)
+        clone.shapes[0].text_frame.paragraphs[0].runs[0].text = "changed"
+
+        assert len(prs.slides) == 2
+        assert [shape.text_frame.text for shape in clone.shapes] == ["changed", "price"]
+        assert source.shapes[0].text_frame.text == "name"
+
+
+class TestBatchConversion:
+    """Tests for batch conversion"""
+
+    @patch('src.utils.office.batch.get_pool')
+    @patch('src.utils.office.batch.subprocess.run')
+    def test_batch_uses_grouped_invocations(self, mock_run, mock_get_pool, tmp_path):
+        """Test several files are converted by a single soffice run per group"""
+        mock_get_pool.return_value = None
+        paths = [str(tmp_path / f"{i}.pptx") for i in range(3)]
+
+        def fake_run(cmd, **kwargs):
+            for path in cmd[cmd.index('--outdir') + 2:]:
+                open(os.path.splitext(path)[0] + ".pdf", 'wb').close()
+            return MagicMock(returncode=0, stderr="")
+
+        mock_run.side_effect = fake_run
+        with patch('src.utils.office.batch.find_libreoffice', return_value='soffice'), \
+                patch('src.utils.office.batch.get_slot_runner', return_value=SlotRunner(slots=1)):
+            result = list(iter_convert_to_pdf(paths, str(tmp_path)))
+
+        assert sorted(pptx for pptx, _ in result) == sorted(paths)
+        assert mock_run.call_count == 1
+
+    @patch('src.utils.office.batch.get_pool')
+    def test_batch_fans_out_to_pool(self, mock_get_pool, tmp_path):
+        """Test conversions are spread across the pool"""
+        pool = MagicMock(size=2)
+        mock_get_pool.return_value = pool
+        paths = [str(tmp_path / f"{i}.pptx") for i in range(4)]
+
+        result = list(iter_convert_to_pdf(paths, str(tmp_path)))
+
+        assert len(result) == 4
+        assert pool.convert.call_count == 4
+
+
+def write_zip(path, members, date_time=(2024, 1, 1, 0, 0, 0)):
+    with zipfile.ZipFile(path, 'w') as archive:
+        for name, data in members:
+            archive.writestr(zipfile.ZipInfo(name, date_time), data)
+
+
+class TestConversionCache:
+    """Tests for content-addressed conversion cache"""
+
+    def test_key_ignores_zip_timestamps(self, tmp_path):
+        """Test identical content saved at different times has the same key"""
+        first = tmp_path / "a.pptx"
+        second = tmp_path / "b.pptx"
+        write_zip(first, [("ppt/slide1.xml", b"<a/>")], (2024, 1, 1, 0, 0, 0))
+        write_zip(second, [("ppt/slide1.xml", b"<a/>")], (2025, 6, 1, 12, 0, 0))
+
+        assert conversion_key(str(first)) == conversion_key(str(second))
+
+    def test_key_depends_on_content_and_variant(self, tmp_path):
+        """Test key changes with content and conversion variant"""
+        first = tmp_path / "a.pptx"
+        second = tmp_path / "b.pptx"
+        write_zip(first, [("ppt/slide1.xml", b"<a/>")])
+        write_zip(second, [("ppt/slide1.xml", b"<b/>")])
+
+        assert conversion_key(str(first)) != conversion_key(str(second))
+        assert conversion_key(str(first)) != conversion_key(str(first), variant='print')
+
+    def test_key_missing_file(self):
+        """Test missing file is not cacheable"""
+        assert conversion_key("/nonexistent/file.pptx") is None
+
+    def test_hit_and_miss_counters(self, tmp_path):
+        """Test cached PDF is returned and counters are updated"""
+        cache = ConversionCache(str(tmp_path / "cache"))
+        pdf = tmp_path / "out.pdf"
+        pdf.write_bytes(b"%PDF-1")
+
+        assert cache.get("key", str(tmp_path / "miss.pdf")) is False
+        cache.put("key", str(pdf))
+        target = tmp_path / "hit.pdf"
+        assert cache.get("key", str(target)) is True
+
+        assert target.read_bytes() == b"%PDF-1"
+        stats = cache.stats()
+        assert stats['hits'] == 1
+        assert stats['misses'] == 1
+        assert stats['entries'] == 1
+
+    def test_lru_eviction(self, tmp_path):
+        """Test least recently used entry is evicted over the size limit"""
+        cache = ConversionCache(str(tmp_path / "cache"), max_bytes=10)
+        pdf = tmp_path / "out.pdf"
+        pdf.write_bytes(b"12345")
+        cache.put("first", str(pdf))
+        cache.put("second", str(pdf))
+        cache.get("first", str(tmp_path / "touch.pdf"))
+
+        cache.put("third", str(pdf))
+
+        assert cache.get("second", str(tmp_path / "x.pdf")) is False
+        assert cache.get("first", str(tmp_path / "x.pdf")) is True
+        assert cache.stats()['evictions'] == 1
+        assert not os.path.exists(cache._path("second"))
+
+    def test_index_restored_from_disk(self, tmp_path):
+        """Test a new cache instance picks up stored files"""
+        directory = str(tmp_path / "cache")
+        pdf = tmp_path / "out.pdf"
+        pdf.write_bytes(b"%PDF")
+        ConversionCache(directory).put("key", str(pdf))
+
+        assert ConversionCache(directory).get("key", str(tmp_path / "x.pdf")) is True
+
+    @patch('src.utils.gen_cert.gen_cert_handler.subprocess.run')
+    def test_repeated_conversion_is_served_from_cache(self, mock_run, tmp_path):
+        """Test second conversion of the same PPTX does not run LibreOffice"""
+        pptx = tmp_path / "cert.pptx"
+        write_zip(pptx, [("ppt/slide1.xml", b"<a/>")])
+
+        def fake_run(cmd, **kwargs):
+            if '--convert-to' in cmd:
+                (tmp_path / "cert.pdf").write_bytes(b"%PDF-converted")
+            return MagicMock(returncode=0, stdout=b"LibreOffice", stderr="")
+
+        mock_run.side_effect = fake_run
+        convert_pptx_to_pdf(str(pptx), str(tmp_path / "cert.pdf"))
+        calls = mock_run.call_count
+
+        other = tmp_path / "copy.pdf"
+        convert_pptx_to_pdf(str(pptx), str(other))
+
+        assert mock_run.call_count == calls
+        assert other.read_bytes() == b"%PDF-converted"
+
+
+    @patch('src.utils.gen_cert.gen_cert_handler.get_pool', return_value=None)
+    @patch('src.utils.gen_cert.gen_cert_handler.conversion_key')
+    @patch('src.utils.gen_cert.gen_cert_handler.subprocess.run')
+    def test_conversion_without_cache(
+        self, mock_run, mock_key, mock_get_pool, tmp_path, isolated_conversion_cache
+    ):
+        """Test cache=False neither hashes the PPTX nor stores a PDF copy"""
+        pptx = tmp_path / "cert.pptx"
+        write_zip(pptx, [("ppt/slide1.xml", b"<a/>")])
+
+        def fake_run(cmd, **kwargs):
+            if '--convert-to' in cmd:
+                (tmp_path / "cert.pdf").write_bytes(b"%PDF-converted")
+            return MagicMock(returncode=0, stdout=b"LibreOffice", stderr="")
+
+        mock_run.side_effect = fake_run
+        convert_pptx_to_pdf(str(pptx), str(tmp_path / "cert.pdf"), cache=False)
+
+        mock_key.assert_not_called()
+        assert isolated_conversion_cache.stats()['entries'] == 0
+
+
+class TestPdfExportProfiles:
+    """Tests for PDF export profiles"""
+
+    def test_default_profile(self):
+        """Test empty profile name selects LibreOffice defaults"""
+        profile = get_export_profile(None)
+
+        assert profile.name == 'default'
+        assert profile.variant == ''
+        assert profile.convert_to() == 'pdf'
+
+    def test_unknown_profile(self):
+        """Test unknown profile name is rejected"""
+        with pytest.raises(ValueError, match="screen"):
+            get_export_profile("fax")
+
+    def test_filter_options_on_command_line(self):
+        """Test profile options are passed to soffice as typed JSON"""
+        convert_to = get_export_profile('screen').convert_to()
+
+        assert convert_to.startswith('pdf:impress_pdf_Export:')
+        options = json.loads(convert_to.split(':', 2)[2])
+        assert options['MaxImageResolution'] == {'type': 'long', 'value': '150'}
+        assert options['ReduceImageResolution'] == {'type': 'boolean', 'value': 'true'}
+
+    def test_profiles_are_cached_separately(self, tmp_path):
+        """Test the same PPTX gets a different cache key per profile"""
+        pptx = tmp_path / "cert.pptx"
+        write_zip(pptx, [("ppt/slide1.xml", b"<a/>")])
+
+        keys = {
+            conversion_key(str(pptx), get_export_profile(name).variant)
+            for name in ('default', 'screen', 'print')
+        }
+
+        assert len(keys) == 3
+
+    @patch('src.utils.gen_cert.gen_cert_handler.get_pool', return_value=None)
+    @patch('src.utils.gen_cert.gen_cert_handler.subprocess.run')
+    def test_conversion_uses_profile(self, mock_run, mock_get_pool, tmp_path):
+        """Test soffice receives profile filter and the result is recorded"""
+        pptx = tmp_path / "cert.pptx"
+        write_zip(pptx, [("ppt/slide1.xml", b"<print/>")])
+
+        def fake_run(cmd, **kwargs):
+            if '--convert-to' in cmd:
+                (tmp_path / "cert.pdf").write_bytes(b"%PDF-print")
+            return MagicMock(returncode=0, stdout=b"LibreOffice", stderr="")
+
+        mock_run.side_effect = fake_run
+        with patch('src.utils.gen_cert.gen_cert_handler.record_export') as mock_record:
+            convert_pptx_to_pdf(str(pptx), str(tmp_path / "cert.pdf"), 'print')
+
+        cmd = mock_run.call_args[0][0]
+        assert cmd[cmd.index('--convert-to') + 1].startswith('pdf:impress_pdf_Export:')
+        profile, seconds, size = mock_record.call_args[0]
+        assert profile == 'print'
+        assert size == len(b"%PDF-print")
+
+    @patch('src.utils.office.pdf_export.shutil.which', return_value=None)
+    def test_linearize_without_qpdf(self, mock_which, tmp_path):
+        """Test linearization is skipped when qpdf is missing"""
+        pdf = tmp_path / "out.pdf"
+        pdf.write_bytes(b"%PDF")
+
+        assert linearize_pdf(str(pdf)) is False
+        assert pdf.read_bytes() == b"%PDF"
+
+    def test_stats_per_profile(self):
+        """Test time and size are averaged per profile"""
+        stats = ExportStats()
+        stats.record('screen', 0.2, 100)
+        stats.record('screen', 0.4, 300)
+        stats.record('screen', 0.0, 0, cached=True)
+        stats.record('print', 1.0, 5000)
+
+        result = stats.stats()
+
+        assert result['screen'] == {
+            'conversions': 2, 'cache_hits': 1, 'avg_seconds': 0.3, 'avg_bytes': 200
+        }
+        assert result['print']['avg_bytes'] == 5000
+
+
+class TestTemplateCache:
+    """Tests for parsed template cache"""
+
+    def test_template_parsed_once(self, make_pptx):
+        """Test repeated loads reuse the parsed template"""
+        cache = TemplateCache()
+        path = make_pptx("name")
+
+        cache.load(path)
+        cache.load(path)
+
+        assert cache.loads == 1
+
+    def test_copies_are_independent(self, make_pptx):
+        """Test changes to one copy do not leak into the next request"""
+        cache = TemplateCache()
+        path = make_pptx("name")
+
+        first = cache.load(path)
+        first.slides[0].shapes[0].text_frame.text = "changed"
+        second = cache.load(path)
+
+        assert second.slides[0].shapes[0].text_frame.text == "name"
+
+    def test_replaced_template_is_reloaded(self, make_pptx):
+        """Test hot-swapped template file is picked up"""
+        cache = TemplateCache()
+        path = make_pptx("name")
+        cache.load(path)
+
+        os.replace(make_pptx("price", name="other.pptx"), path)
+
+        assert cache.load(path).slides[0].shapes[0].text_frame.text == "price"
+        assert cache.loads == 2
+
+    def test_missing_template(self):
+        """Test missing template raises FileNotFoundError"""
+        with pytest.raises(FileNotFoundError, match="Файл шаблона не найден"):
+            TemplateCache().load("/nonexistent/template.pptx")
+
+
+def make_paragraph(*texts):
+    paragraph = MagicMock()
+    paragraph.runs = [MagicMock(text=text) for text in texts]
+    return paragraph
+
+
+class TestSubstitutions:
+    """Tests for single-pass placeholder substitution"""
+
+    def test_placeholder_split_across_runs(self):
+        """Test placeholder split by PowerPoint into several runs"""
+        paragraph = make_paragraph("Кому: na", "m", "e!")
+
+        count = Substitutions({'name': 'Иван'}).apply_paragraph(paragraph)
+
+        assert count == 1
+        assert [run.text for run in paragraph.runs] == ["Кому: Иван", "", "!"]
+
+    def test_multiple_keys_single_pass(self):
+        """Test several placeholders in one run are all replaced"""
+        paragraph = make_paragraph("price / name / price")
+
+        count = Substitutions({'name': 'Иван', 'price': '5000 ₽'}).apply_paragraph(paragraph)
+
+        assert count == 3
+        assert paragraph.runs[0].text == "5000 ₽ / Иван / 5000 ₽"
+
+    def test_values_are_not_substituted_again(self):
+        """Test a value containing another key is inserted as is"""
+        substitutions = Substitutions({'name': 'price', 'price': '100'})
+
+        assert substitutions.sub("name price") == "price 100"
+
+    def test_longest_key_wins(self):
+        """Test overlapping keys prefer the longest match"""
+        substitutions = Substitutions({'Doctor_1': 'A', 'Doctor_10': 'B'})
+
+        assert substitutions.sub("Doctor_10 Doctor_1") == "B A"
+
+    def test_untouched_runs_are_not_rewritten(self):
+        """Test runs without placeholders keep their text object"""
+        paragraph = make_paragraph("Сертификат", "name")
+        first = paragraph.runs[0]
+
+        Substitutions({'name': 'Иван'}).apply_paragraph(paragraph)
+
+        assert first.text == "Сертификат"
+        assert paragraph.runs[1].text == "Иван"
+
+    def test_apply_slides_counts_replacements(self, make_pptx):
+        """Test substitutions across a real presentation"""
+        prs = Presentation(make_pptx("name", "price", slides=2))
+
+        count = Substitutions({'name': 'Иван', 'price': '5000'}).apply_slides(prs.slides)
+
+        assert count == 4
+        assert [shape.text_frame.text for shape in prs.slides[1].shapes] == ["Иван", "5000"]
+
+    def test_empty_replacements(self):
+        """Test empty dictionary leaves text unchanged"""
+        paragraph = make_paragraph("name")
+
+        assert Substitutions({}).apply_paragraph(paragraph) == 0
+        assert paragraph.runs[0].text == "name"
+
+
+def raw_members(path):
+    """Compressed bytes of every archive member as stored in the file"""
+    with open(path, 'rb') as source:
+        data = source.read()
+    members = {}
+    with zipfile.ZipFile(path) as archive:
+        for info in archive.infolist():
+            name_length, extra_length = struct.unpack_from('<HH', data, info.header_offset + 26)
+            start = info.header_offset + 30 + name_length + extra_length
+            members[info.filename] = data[start:start + info.compress_size]
+    return members
+
+
+class TestPptxPackage:
+    """Tests for zip-level template rewriting"""
+
+    def test_render_substitutes_text(self, make_pptx, tmp_path):
+        """Test rendered file is a valid presentation with values filled in"""
+        package = PptxPackage(make_pptx("name", "price"))
+        output = tmp_path / "out.pptx"
+
+        count = package.render({'name': 'Иван', 'price': '5000 ₽'}, str(output))
+
+        assert count == 2
+        with zipfile.ZipFile(output) as archive:
+            assert archive.testzip() is None
+        texts = [shape.text_frame.text for shape in Presentation(output).slides[0].shapes]
+        assert texts == ["Иван", "5000 ₽"]
+
+    def test_untouched_parts_copied_verbatim(self, make_pptx, tmp_path):
+        """Test only slides with placeholders are recompressed"""
+        template = make_pptx("name", slides=2)
+        prs = Presentation(template)
+        prs.slides[1].shapes[0].text_frame.text = "static"
+        prs.save(template)
+        output = tmp_path / "out.pptx"
+
+        PptxPackage(template).render({'name': 'Иван'}, str(output))
+
+        source, result = raw_members(template), raw_members(output)
+        assert list(source) == list(result)
+        changed = [name for name in source if source[name] != result[name]]
+        assert changed == ['ppt/slides/slide1.xml']
+
+    def test_placeholder_split_across_runs(self, tmp_path):
+        """Test placeholder split between runs is replaced"""
+        template = tmp_path / "split.pptx"
+        prs = Presentation()
+        slide = prs.slides.add_slide(prs.slide_layouts[6])
+        paragraph = slide.shapes.add_textbox(0, 0, 100, 100).text_frame.paragraphs[0]
+        for text in ("Кому: na", "me", "!"):
+            paragraph.add_run().text = text
+        prs.save(template)
+        output = tmp_path / "out.pptx"
+
+        count = PptxPackage(str(template)).render({'name': 'Иван'}, str(output))
+
+        assert count == 1
+        assert Presentation(output).slides[0].shapes[0].text_frame.text == "Кому: Иван!"
+
+    def test_no_matches_copies_template(self, make_pptx, tmp_path):
+        """Test template without placeholders is copied member by member"""
+        template = make_pptx("static")
+        output = tmp_path / "out.pptx"
+
+        assert PptxPackage(template).render({'name': 'Иван'}, str(output)) == 0
+        assert raw_members(template) == raw_members(output)
+
+    def test_fill_template_uses_cache(self, make_pptx, tmp_path):
+        """Test fill_template renders from the cached package"""
+        template = make_pptx("name")
+        output = tmp_path / "out.pptx"
+
+        assert fill_template(template, {'name': 'Иван'}, str(output)) == 1
+        assert Presentation(output).slides[0].shapes[0].text_frame.text == "Иван"
+
+    def test_render_template_in_memory(self, make_pptx):
+        """Test render_template returns presentation bytes"""
+        data = render_template(make_pptx("name"), {'name': 'Иван'})
+
+        assert Presentation(io.BytesIO(data)).slides[0].shapes[0].text_frame.text == "Иван"
+
+
+class TestScratchDir:
+    """Tests for scratch directories"""
+
+    def test_removed_on_exit(self):
+        """Test scratch directory is removed with its contents"""
+        with scratch_dir('rit-test-') as directory:
+            with open(os.path.join(directory, "file.pptx"), 'wb') as f:
+                f.write(b"data")
+
+        assert not os.path.exists(directory)
+
+    def test_removed_on_error(self):
+        """Test scratch directory is removed when the block fails"""
+        with pytest.raises(RuntimeError):
+            with scratch_dir('rit-test-') as directory:
+                raise RuntimeError("boom")
+
+        assert not os.path.exists(directory)
@@ -1,7 +1,9 @@
 """
 Tests for remove_bg module
 """
+import io
 import os
+import zipfile
 from unittest.mock import MagicMock, patch
 
 try:
@@ -9,11 +11,49 @@ try:
 except ImportError:
     np = None
 import pytest
-from fastapi.responses import FileResponse, RedirectResponse
+from fastapi.responses import RedirectResponse
 
+from src.utils.responses import MemoryFileResponse
 from src.utils.remove_bg.remove_bg_document import (
+    CropOutsideImageError,
+    ImageDecodeError,
+    ImageNotFoundError,
+    ImageTooLargeError,
+    RemoveBackgroundError,
+    check_image_size,
+    content_bounds,
+    crop_image,
+    decode_image,
+    decoded_pixels_bound,
+    get_threshold_method,
+    local_threshold_mask,
+    otsu_threshold,
+    parse_crop,
     parse_rgb_color,
+    parse_rgb_colors,
+    recolor_variants,
+    reduction_factor,
     remove_background,
+    remove_background_bytes,
+    remove_background_image,
+    remove_background_tiled,
+    sample_histogram,
+    trim_to_content,
+)
+from src.utils.remove_bg.encoding import encode_result, get_output_format
+from src.utils.remove_bg.image_pool import (
+    EncodedImage,
+    ImagePool,
+    ImagePoolBusy,
+    _process_encoded,
+    _process_shared,
+)
+from src.utils.remove_bg.pages import (
+    PageSource,
+    is_multipage,
+    iter_page_images,
+    iter_processed_pages,
+    iter_tiff_pages,
 )
 from src.utils.remove_bg.remove_bg_handler import remove_bg_handler
 
@@ -127,7 +167,7 @@ class TestRemoveBackground:
         input_path = temp_file + ".png"
         output_path = temp_file + "_output.png"
 
-        with pytest.raises(SystemExit):
+        with pytest.raises(ImageNotFoundError):
             remove_background(input_path, output_path)
 
     @patch('src.utils.remove_bg.remove_bg_document.cv2.imread')
@@ -144,7 +184,7 @@ class TestRemoveBackground:
             f.write(b"invalid image")
 
         try:
-            with pytest.raises(SystemExit):
+            with pytest.raises(ImageDecodeError):
                 remove_background(input_path, output_path)
         finally:
             if os.path.exists(input_path):
@@ -199,10 +239,1086 @@ class TestRemoveBackground:
                 os.unlink(input_path)
 
 
+class TestRemoveBackgroundBytes:
+    """Tests for in-memory background removal"""
+
+    @pytest.mark.skipif(np is None, reason="numpy is not installed")
+    def test_round_trip(self):
+        """Test encoded image is processed without touching the disk"""
+        import cv2
+        img = np.full((20, 20, 3), 255, dtype=np.uint8)
+        img[5:15, 5:15] = 0
+        ok, encoded = cv2.imencode('.png', img)
+        assert ok
+
+        data = remove_background_bytes(encoded.tobytes(), text_color=(255, 0, 0))
+
+        result = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_UNCHANGED)
+        assert result.shape == (20, 20, 4)
+        assert result[10, 10, 3] == 255
+        assert result[0, 0, 3] == 0
+        assert tuple(result[10, 10, :3]) == (255, 0, 0)
+
+    def test_invalid_image(self):
+        """Test undecodable data raises a typed error"""
+        with pytest.raises(ImageDecodeError):
+            remove_background_bytes(b"not an image")
+        with pytest.raises(RemoveBackgroundError):
+            remove_background_bytes(b"")
+
+    @pytest.mark.skipif(np is None, reason="numpy is not installed")
+    def test_decode_from_memoryview(self):
+        """Test upload buffer is decoded without copying to bytes"""
+        import cv2
+        ok, encoded = cv2.imencode('.png', np.zeros((4, 6, 3), dtype=np.uint8))
+
+        img = decode_image(memoryview(encoded.tobytes()))
+
+        assert img.shape == (4, 6, 3)
+
+    @pytest.mark.skipif(np is None, reason="numpy is not installed")
+    def test_array_api_accepts_grayscale(self):
+        """Test grayscale array gives a BGRA result"""
+        gray = np.full((8, 8), 255, dtype=np.uint8)
+        gray[2:6, 2:6] = 0
+
+        result = remove_background_image(gray, text_color=(0, 0, 255))
+
+        assert result.shape == (8, 8, 4)
+        assert result[4, 4, 3] == 255
+        assert tuple(result[4, 4, :3]) == (0, 0, 255)
+
+    @pytest.mark.skipif(np is None, reason="numpy is not installed")
+    def test_array_api_rejects_unsupported_shape(self):
+        """Test arrays that are not images are rejected"""
+        with pytest.raises(ImageDecodeError):
+            remove_background_image(np.zeros((2, 2, 2), dtype=np.uint8))
+
+
+class TestDecodeLimits:
+    """Tests for the pixel budget and reduced-resolution decoding"""
+
+    @staticmethod
+    def _encoded(extension, width=800, height=600):
+        import cv2
+        img = np.full((height, width, 3), 220, dtype=np.uint8)
+        img[100:200, 100:700] = 0
+        ok, encoded = cv2.imencode(extension, img)
+        assert ok
+        return encoded.tobytes()
+
+    @pytest.mark.skipif(np is None, reason="numpy is not installed")
+    def test_size_read_from_header(self):
+        """Test dimensions are known before decoding"""
+        assert check_image_size(self._encoded('.png')) == (800, 600)
+        assert check_image_size(self._encoded('.jpg')) == (800, 600)
+
+    @pytest.mark.skipif(np is None, reason="numpy is not installed")
+    def test_over_budget_is_rejected_before_decoding(self):
+        """Test images above the pixel budget are not decoded"""
+        with patch('src.utils.remove_bg.remove_bg_document.cv2.imdecode') as mock_decode:
+            with pytest.raises(ImageTooLargeError):
+                decode_image(self._encoded('.png'), max_pixels=100_000)
+
+        mock_decode.assert_not_called()
+
+    def test_reduction_factor(self):
+        """Test decoder scale keeps the result at least max_dimension"""
+        assert reduction_factor(8000, 6000, 1000) == 8
+        assert reduction_factor(8000, 6000, 1500) == 4
+        assert reduction_factor(8000, 6000, 3000) == 2
+        assert reduction_factor(8000, 6000, 5000) == 1
+        assert reduction_factor(1000, 800, 2000) == 1
+
+    @pytest.mark.skipif(np is None, reason="numpy is not installed")
+    def test_jpeg_decoded_at_reduced_resolution(self):
+        """Test JPEG is decoded with IMREAD_REDUCED flag and fitted"""
+        import cv2
+        data = self._encoded('.jpg', 1600, 1200)
+
+        with patch(
+            'src.utils.remove_bg.remove_bg_document.cv2.imdecode', wraps=cv2.imdecode
+        ) as mock_decode:
+            img = decode_image(data, max_dimension=300)
+
+        assert mock_decode.call_args.args[1] == cv2.IMREAD_REDUCED_COLOR_4
+        assert img.shape == (225, 300, 3)
+
+    @pytest.mark.skipif(np is None, reason="numpy is not installed")
+    def test_png_fitted_to_max_dimension(self):
+        """Test other formats are downscaled to max_dimension"""
+        img = decode_image(self._encoded('.png'), max_dimension=200)
+
+        assert img.shape == (150, 200, 3)
+
+    @pytest.mark.skipif(np is None, reason="numpy is not installed")
+    def test_handler_rejects_large_image(self, mock_request, mock_file_upload):
+        """Test handler reports an image over the budget"""
+        mock_file_upload.filename = "huge.png"
+        mock_file_upload.file.read.return_value = self._encoded('.png')
+
+        with patch('src.utils.remove_bg.remove_bg_document.MAX_IMAGE_PIXELS', 1000):
+            result = remove_bg_handler(
+                request=mock_request,
+                file=mock_file_upload,
+                color=None
+            )
+
+        assert isinstance(result, RedirectResponse)
+
+    @patch('src.utils.remove_bg.remove_bg_handler.remove_background_bytes')
+    def test_handler_passes_max_dimension(self, mock_remove_bg, mock_request, mock_file_upload):
+        """Test max dimension form value is parsed and passed on"""
+        mock_remove_bg.return_value = b"PNG"
+        mock_file_upload.filename = "photo.jpg"
+
+        remove_bg_handler(
+            request=mock_request,
+            file=mock_file_upload,
+            color=None,
+            max_dimension=" 1200 "
+        )
+
+        assert mock_remove_bg.call_args[1]['max_dimension'] == 1200
+
+    def test_handler_invalid_max_dimension(self, mock_request, mock_file_upload):
+        """Test invalid max dimension redirects with an error"""
+        mock_file_upload.filename = "photo.jpg"
+
+        result = remove_bg_handler(
+            request=mock_request,
+            file=mock_file_upload,
+            color=None,
+            max_dimension="-5"
+        )
+
+        assert isinstance(result, RedirectResponse)
+
+
+class TestCropAndTrim:
+    """Tests for region-of-interest input and trim-to-content output"""
+
+    @staticmethod
+    def _encoded(extension, width=800, height=600):
+        import cv2
+        img = np.full((height, width, 3), 230, dtype=np.uint8)
+        img[300:340, 400:520] = 10
+        ok, encoded = cv2.imencode(extension, img)
+        assert ok
+        return encoded.tobytes()
+
+    def test_parse_crop(self):
+        """Test crop rectangle parsing"""
+        assert parse_crop("10, 20,300,400") == (10, 20, 300, 400)
+
+    @pytest.mark.parametrize("value", ["10,20,300", "a,b,c,d", "-1,0,10,10", "0,0,0,10"])
+    def test_parse_crop_invalid(self, value):
+        """Test malformed or empty rectangles are rejected"""
+        with pytest.raises(ValueError):
+            parse_crop(value)
+
+    @pytest.mark.skipif(np is None, reason="numpy is not installed")
+    def test_crop_is_clipped_view(self):
+        """Test crop returns a view clipped to the image"""
+        img = np.zeros((100, 200, 3), dtype=np.uint8)
+
+        region = crop_image(img, (150, 80, 100, 100))
+
+        assert region.shape == (20, 50, 3)
+        assert np.shares_memory(region, img)
+        with pytest.raises(CropOutsideImageError):
+            crop_image(img, (200, 0, 10, 10))
+
+    @pytest.mark.skipif(np is None, reason="numpy is not installed")
+    def test_decode_with_crop(self):
+        """Test only the region is returned after decoding"""
+        img = decode_image(self._encoded('.png'), crop=(380, 280, 160, 80))
+
+        assert img.shape == (80, 160, 3)
+        assert img[30, 30, 0] == 10
+
+    @pytest.mark.skipif(np is None, reason="numpy is not installed")
+    def test_crop_scaled_for_reduced_decoding(self):
+        """Test crop is in full-size pixels and max_dimension applies to the region"""
+        import cv2
+        data = self._encoded('.jpg', 1600, 1200)
+
+        with patch(
+            'src.utils.remove_bg.remove_bg_document.cv2.imdecode', wraps=cv2.imdecode
+        ) as mock_decode:
+            img = decode_image(data, max_dimension=200, crop=(0, 0, 800, 600))
+
+        assert mock_decode.call_args.args[1] == cv2.IMREAD_REDUCED_COLOR_4
+        assert img.shape == (150, 200, 3)
+
+    def test_decoded_pixels_bound(self):
+        """Test result size bound follows crop and max_dimension"""
+        assert decoded_pixels_bound(4000, 3000) == 12_000_000
+        assert decoded_pixels_bound(4000, 3000, crop=(0, 0, 100, 50)) == 5000
+        assert decoded_pixels_bound(4000, 3000, crop=(0, 0, 3500, 3500)) == 12_000_000
+        assert decoded_pixels_bound(4000, 3000, max_dimension=1000) == 1_000_000
+
+    @pytest.mark.skipif(np is None, reason="numpy is not installed")
+    def test_trim_to_content(self):
+        """Test result is cut to the opaque pixels plus padding"""
+        result = np.zeros((100, 200, 4), dtype=np.uint8)
+        result[40:50, 60:90, 3] = 255
+
+        assert content_bounds(result, 5) == (55, 35, 95, 55)
+        assert trim_to_content(result, 5).shape == (20, 40, 4)
+        assert content_bounds(result, 100) == (0, 0, 190, 100)
+
+    @pytest.mark.skipif(np is None, reason="numpy is not installed")
+    def test_trim_empty_result_unchanged(self):
+        """Test a result without text is not trimmed"""
+        result = np.zeros((10, 20, 4), dtype=np.uint8)
+
+        assert content_bounds(result) is None
+        assert trim_to_content(result).shape == (10, 20, 4)
+
+    @pytest.mark.skipif(np is None, reason="numpy is not installed")
+    def test_pool_trims_before_encoding(self):
+        """Test encoded result has the size of the text box"""
+        import cv2
+        pool = ImagePool(size=0, max_pending=1)
+
+        encoded = pool.remove_background_bytes(
+            self._encoded('.png'), text_color=(0, 0, 0), trim_padding=4
+        )
+
+        result = cv2.imdecode(np.frombuffer(encoded, np.uint8), cv2.IMREAD_UNCHANGED)
+        assert result.shape == (48, 128, 4)
+
+    @patch('src.utils.remove_bg.remove_bg_handler.remove_background_bytes')
+    def test_handler_passes_crop_and_trim(self, mock_remove_bg, mock_request, mock_file_upload):
+        """Test crop and trim form values are parsed and passed on"""
+        mock_remove_bg.return_value = b"PNG"
+        mock_file_upload.filename = "photo.jpg"
+
+        remove_bg_handler(
+            request=mock_request,
+            file=mock_file_upload,
+            color=None,
+            crop="10,20,300,400",
+            trim="on",
+            trim_padding="8"
+        )
+
+        assert mock_remove_bg.call_args[1]['crop'] == (10, 20, 300, 400)
+        assert mock_remove_bg.call_args[1]['trim_padding'] == 8
+
+    @patch('src.utils.remove_bg.remove_bg_handler.remove_background_bytes')
+    def test_handler_no_trim_by_default(self, mock_remove_bg, mock_request, mock_file_upload):
+        """Test full canvas is kept without the trim flag"""
+        mock_remove_bg.return_value = b"PNG"
+        mock_file_upload.filename = "photo.jpg"
+
+        remove_bg_handler(
+            request=mock_request,
+            file=mock_file_upload,
+            color=None
+        )
+
+        assert mock_remove_bg.call_args[1]['crop'] is None
+        assert mock_remove_bg.call_args[1]['trim_padding'] is None
+
+    @pytest.mark.skipif(np is None, reason="numpy is not installed")
+    def test_handler_crop_outside_image(self, mock_request, mock_file_upload):
+        """Test crop outside the image redirects with an error"""
+        mock_file_upload.filename = "photo.png"
+        mock_file_upload.file.read.return_value = self._encoded('.png')
+
+        with patch('src.utils.remove_bg.image_pool._pool', ImagePool(size=0, max_pending=1)):
+            result = remove_bg_handler(
+                request=mock_request,
+                file=mock_file_upload,
+                color=None,
+                crop="900,0,10,10"
+            )
+
+        assert isinstance(result, RedirectResponse)
+
+
+class TestColorVariants:
+    """Tests for several ink colours from one mask"""
+
+    @staticmethod
+    def _scan():
+        img = np.full((40, 60, 3), 230, dtype=np.uint8)
+        img[10:30, 10:50] = 20
+        return img
+
+    def test_parse_rgb_colors(self):
+        """Test colour list parsing, duplicates dropped"""
+        assert parse_rgb_colors("0,0,0; 255,0,0;0,0,0;") == [(0, 0, 0), (0, 0, 255)]
+
+    @pytest.mark.parametrize("value", ["", ";", "0,0,0;red"])
+    def test_parse_rgb_colors_invalid(self, value):
+        """Test empty or malformed lists are rejected"""
+        with pytest.raises(ValueError):
+            parse_rgb_colors(value)
+
+    @patch('src.utils.remove_bg.remove_bg_document.MAX_COLOR_VARIANTS', 2)
+    def test_parse_rgb_colors_limit(self):
+        """Test the number of colours is limited"""
+        with pytest.raises(ValueError):
+            parse_rgb_colors("0,0,0;1,1,1;2,2,2")
+
+    @pytest.mark.skipif(np is None, reason="numpy is not installed")
+    def test_variants_match_single_colour_runs(self):
+        """Test every variant equals a separate run with that colour"""
+        img = self._scan()
+        colors = [(0, 0, 0), (255, 0, 0), (10, 20, 30)]
+
+        result = remove_background_image(img, text_color=None)
+        for text_color, variant in recolor_variants(result, colors):
+            assert np.array_equal(variant, remove_background_image(img, text_color=text_color))
+
+    @pytest.mark.skipif(np is None, reason="numpy is not installed")
+    def test_pool_processes_once(self):
+        """Test the mask is computed once for all colours"""
+        import cv2
+        pool = ImagePool(size=0, max_pending=1)
+        colors = [(0, 0, 0), (255, 0, 0)]
+
+        with patch(
+            'src.utils.remove_bg.image_pool.remove_background_image',
+            wraps=remove_background_image
+        ) as mock_remove:
+            results = pool.remove_background_variants(self._scan(), colors)
+
+        assert mock_remove.call_count == 1
+        assert len(results) == 2
+        blue = cv2.imdecode(np.frombuffer(results[1], np.uint8), cv2.IMREAD_UNCHANGED)
+        assert tuple(blue[20, 20]) == (255, 0, 0, 255)
+
+    @pytest.mark.skipif(np is None, reason="numpy is not installed")
+    def test_handler_returns_zip(self, mock_request, mock_file_upload):
+        """Test several colours give a ZIP with a file per colour"""
+        import cv2
+        mock_file_upload.filename = "sign.png"
+        mock_file_upload.file.read.return_value = cv2.imencode('.png', self._scan())[1].tobytes()
+
+        with patch('src.utils.remove_bg.image_pool._pool', ImagePool(size=0, max_pending=1)):
+            result = remove_bg_handler(
+                request=mock_request,
+                file=mock_file_upload,
+                color=None,
+                colors="0,0,0;0,0,255"
+            )
+
+        assert isinstance(result, MemoryFileResponse)
+        assert result.filename == "sign_no_bg.zip"
+        assert result.headers["X-Variant-Count"] == "2"
+        assert result.headers["X-Output-Format"] == "png; compression=fast"
+        assert result.headers["X-Output-Size"] == str(len(result.body))
+
+        archive = zipfile.ZipFile(io.BytesIO(result.body))
+        assert archive.namelist() == ["sign_no_bg_000000.png", "sign_no_bg_0000ff.png"]
+
+    def test_variants_async_job(self, mock_request, mock_file_upload, wait_job):
+        """Test several colours processed as a background job give the ZIP"""
+        import cv2
+        from src.utils.jobs import DONE, JobManager
+        mock_file_upload.filename = "sign.png"
+        mock_file_upload.file.read.return_value = cv2.imencode('.png', self._scan())[1].tobytes()
+        manager = JobManager(workers=1)
+        try:
+            with patch('src.utils.remove_bg.image_pool._pool', ImagePool(size=0, max_pending=1)):
+                job = manager.submit(
+                    'remove_bg', remove_bg_handler,
+                    request=mock_request,
+                    file=mock_file_upload, color=None, colors="0,0,0;0,0,255"
+                )
+                job = wait_job(manager, job)
+        finally:
+            manager.shutdown()
+
+        assert job.status == DONE, job.error
+        archive = zipfile.ZipFile(io.BytesIO(job.result_body))
+        assert len(archive.namelist()) == 2
+        assert job.filename == "sign_no_bg.zip"
+        assert job.headers["x-variant-count"] == "2"
+        assert job.headers["x-output-format"] == "png; compression=fast"
+
+    @patch('src.utils.remove_bg.remove_bg_handler.remove_background_bytes')
+    def test_handler_single_colour_in_list(self, mock_remove_bg, mock_request, mock_file_upload):
+        """Test a list with one colour gives the usual single image"""
+        mock_remove_bg.return_value = b"PNG"
+        mock_file_upload.filename = "sign.png"
+
+        result = remove_bg_handler(
+            request=mock_request,
+            file=mock_file_upload,
+            color=None,
+            colors="255,0,0"
+        )
+
+        assert isinstance(result, MemoryFileResponse)
+        assert mock_remove_bg.call_args[1]['text_color'] == (0, 0, 255)
+
+    def test_handler_invalid_colors(self, mock_request, mock_file_upload):
+        """Test invalid colour list redirects with an error"""
+        mock_file_upload.filename = "sign.png"
+
+        result = remove_bg_handler(
+            request=mock_request,
+            file=mock_file_upload,
+            color=None,
+            colors="0,0,0;blue"
+        )
+
+        assert isinstance(result, RedirectResponse)
+
+
+class TestRemoveBackgroundTiled:
+    """Tests for bounded-memory tiled processing"""
+
+    @pytest.mark.skipif(np is None, reason="numpy is not installed")
+    def test_otsu_threshold_matches_opencv(self):
+        """Test histogram Otsu gives the OpenCV threshold"""
+        import cv2
+        rng = np.random.default_rng(1)
+        for _ in range(20):
+            gray = rng.integers(0, 256, (30, 50), dtype=np.uint8)
+            expected, _ = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+            hist = np.bincount(gray.ravel(), minlength=256)
+            assert otsu_threshold(hist) == int(expected)
+
+    @pytest.mark.skipif(np is None, reason="numpy is not installed")
+    @pytest.mark.parametrize("channels", [None, 3, 4])
+    def test_small_image_matches_untiled(self, channels):
+        """Test tiled result is identical when the sample is the whole image"""
+        rng = np.random.default_rng(2)
+        shape = (45, 37) if channels is None else (45, 37, channels)
+        img = rng.integers(0, 256, shape, dtype=np.uint8)
+
+        for invert in (False, True):
+            expected = remove_background_image(img, invert, (10, 20, 30), tiled=False)
+            result = remove_background_tiled(img, invert, (10, 20, 30), tile_rows=8)
+            assert np.array_equal(result, expected)
+
+    @pytest.mark.skipif(np is None, reason="numpy is not installed")
+    def test_writes_into_preallocated_output(self):
+        """Test result is written into the given array"""
+        img = np.full((20, 10, 3), 240, dtype=np.uint8)
+        img[5:15, 2:8] = 10
+        out = np.zeros((20, 10, 4), dtype=np.uint8)
+
+        result = remove_background_tiled(img, text_color=(0, 0, 255), out=out, tile_rows=3)
+
+        assert result is out
+        assert out[10, 5, 3] == 255
+        assert tuple(out[10, 5, :3]) == (0, 0, 255)
+        assert out[0, 0, 3] == 0
+
+    @pytest.mark.skipif(np is None, reason="numpy is not installed")
+    def test_sample_histogram_decimates(self):
+        """Test large images are sampled instead of counted in full"""
+        img = np.zeros((100, 100), dtype=np.uint8)
+
+        hist = sample_histogram(img, sample_pixels=100, tile_rows=4)
+
+        assert hist.sum() == 100
+        assert hist[0] == 100
+
+    @pytest.mark.skipif(np is None, reason="numpy is not installed")
+    def test_large_images_use_tiled_mode(self):
+        """Test images over the pixel limit are processed in tiles"""
+        img = np.full((4, 4, 3), 255, dtype=np.uint8)
+
+        with patch('src.utils.remove_bg.remove_bg_document.TILED_MIN_PIXELS', 10), \
+             patch('src.utils.remove_bg.remove_bg_document.remove_background_tiled') as mock_tiled:
+            remove_background_image(img)
+
+        mock_tiled.assert_called_once()
+
+
+class TestLocalThreshold:
+    """Tests for Sauvola/Bradley thresholds on integral images"""
+
+    @staticmethod
+    def _reference(gray, method, window):
+        radius = window // 2
+        expected = np.zeros_like(gray)
+        for y in range(gray.shape[0]):
+            for x in range(gray.shape[1]):
+                area = gray[max(0, y - radius):y + radius + 1,
+                            max(0, x - radius):x + radius + 1].astype(np.float64)
+                mean = area.mean()
+                if method == 'bradley':
+                    threshold = mean * 0.85
+                else:
+                    threshold = mean * (1 + 0.2 * (area.std() / 128 - 1))
+                expected[y, x] = 255 if gray[y, x] <= threshold else 0
+        return expected
+
+    @pytest.mark.skipif(np is None, reason="numpy is not installed")
+    @pytest.mark.parametrize("method", ['sauvola', 'bradley'])
+    def test_matches_direct_window_computation(self, method):
+        """Test integral-image mask equals explicit window statistics"""
+        gray = np.random.default_rng(3).integers(0, 256, (23, 19), dtype=np.uint8)
+
+        for window in (3, 7, 25):
+            assert np.array_equal(
+                local_threshold_mask(gray, method, window),
+                self._reference(gray, method, window)
+            )
+
+    @pytest.mark.skipif(np is None, reason="numpy is not installed")
+    def test_bands_match_whole_image(self):
+        """Test band-by-band mask equals the whole-image mask"""
+        gray = np.random.default_rng(4).integers(0, 256, (40, 30), dtype=np.uint8)
+
+        bands = [
+            local_threshold_mask(gray, 'sauvola', 9, start, min(40, start + 7))
+            for start in range(0, 40, 7)
+        ]
+
+        assert np.array_equal(np.vstack(bands), local_threshold_mask(gray, 'sauvola', 9))
+
+    @pytest.mark.skipif(np is None, reason="numpy is not installed")
+    @pytest.mark.parametrize("method", ['sauvola', 'bradley'])
+    def test_uneven_lighting(self, method):
+        """Test local threshold finds text where global Otsu fails"""
+        import cv2
+        light = np.linspace(110, 240, 200, dtype=np.float32)
+        gray = np.tile(light, (120, 1))
+        ink = np.zeros(gray.shape, dtype=bool)
+        for top in range(10, 110, 12):
+            ink[top:top + 3, 10:190] = True
+        gray[ink] *= 0.45
+        img = cv2.cvtColor(gray.astype(np.uint8), cv2.COLOR_GRAY2BGR)
+
+        local = remove_background_image(img, method=method)[:, :, 3] > 0
+        otsu = remove_background_image(img)[:, :, 3] > 0
+
+        assert (local != ink).mean() < 0.01
+        assert (otsu != ink).mean() > 0.1
+
+    def test_method_validation(self):
+        """Test unknown methods are rejected"""
+        assert get_threshold_method(None) == 'otsu'
+        assert get_threshold_method(' Sauvola ') == 'sauvola'
+        with pytest.raises(ValueError):
+            get_threshold_method('niblack')
+
+    @patch('src.utils.remove_bg.remove_bg_handler.remove_background_bytes')
+    def test_handler_passes_method(self, mock_remove_bg, mock_request, mock_file_upload):
+        """Test threshold form value reaches the processing call"""
+        mock_remove_bg.return_value = b"PNG"
+        mock_file_upload.filename = "photo.jpg"
+
+        result = remove_bg_handler(
+            request=mock_request,
+            file=mock_file_upload,
+            color=None,
+            threshold="bradley"
+        )
+
+        assert isinstance(result, MemoryFileResponse)
+        assert mock_remove_bg.call_args[1]['method'] == "bradley"
+
+    def test_handler_unknown_method(self, mock_request, mock_file_upload):
+        """Test unknown threshold redirects with an error"""
+        mock_file_upload.filename = "photo.jpg"
+
+        result = remove_bg_handler(
+            request=mock_request,
+            file=mock_file_upload,
+            color=None,
+            threshold="niblack"
+        )
+
+        assert isinstance(result, RedirectResponse)
+
+
+class TestOutputEncoding:
+    """Tests for compact output encodings"""
+
+    @staticmethod
+    def _result():
+        img = np.full((40, 60, 3), 230, dtype=np.uint8)
+        img[10:30, 15:45] = 20
+        return remove_background_image(img, text_color=(0, 0, 255))
+
+    @staticmethod
+    def _decode_rgba(data):
+        import io
+        from PIL import Image
+        return np.array(Image.open(io.BytesIO(data)).convert('RGBA'))
+
+    @pytest.mark.skipif(np is None, reason="numpy is not installed")
+    @pytest.mark.parametrize("name", ['png', 'indexed', 'gray', 'webp'])
+    @pytest.mark.parametrize("compression", ['fast', 'small'])
+    def test_formats_keep_alpha(self, name, compression):
+        """Test every format keeps the transparency mask"""
+        result = self._result()
+
+        data = encode_result(result, name, compression, text_color=(0, 0, 255))
+
+        assert np.array_equal(self._decode_rgba(data)[:, :, 3], result[:, :, 3])
+
+    @pytest.mark.skipif(np is None, reason="numpy is not installed")
+    def test_indexed_is_one_bit_with_ink_colour(self):
+        """Test single-colour result is stored as a 1-bit palette PNG"""
+        import io
+        from PIL import Image
+        result = self._result()
+
+        data = encode_result(result, 'indexed', text_color=(0, 0, 255))
+
+        image = Image.open(io.BytesIO(data))
+        assert image.mode in ('P', '1')
+        assert data[24] == 1  # IHDR bit depth
+        assert tuple(self._decode_rgba(data)[20, 30]) == (255, 0, 0, 255)
+        assert len(data) < len(encode_result(result, 'png'))
+
+    @pytest.mark.skipif(np is None, reason="numpy is not installed")
+    def test_indexed_without_text_colour_is_quantized(self):
+        """Test original colours are quantized to a palette"""
+        data = encode_result(self._result(), 'indexed')
+
+        assert data[25] == 3  # IHDR colour type: palette
+
+    def test_unknown_format_and_compression(self):
+        """Test unknown names are rejected"""
+        with pytest.raises(ValueError):
+            get_output_format('gif')
+        with pytest.raises(ValueError):
+            encode_result(np.zeros((2, 2, 4), dtype=np.uint8), 'png', 'ultra')
+
+
+def multipage_tiff_bytes(count=3):
+    import io
+    from PIL import Image
+    frames = []
+    for index in range(count):
+        page = np.full((30, 40), 230, dtype=np.uint8)
+        page[5:10 + index * 5, 5:35] = 10
+        frames.append(Image.fromarray(page))
+    output = io.BytesIO()
+    frames[0].save(output, 'TIFF', save_all=True, append_images=frames[1:])
+    return output.getvalue()
+
+
+class TestMultipageInput:
+    """Tests for multi-page TIFF and PDF input"""
+
+    @pytest.fixture(autouse=True)
+    def inline_pool(self):
+        with patch('src.utils.remove_bg.image_pool._pool', ImagePool(size=0, max_pending=4)):
+            yield
+
+    @pytest.mark.skipif(np is None, reason="numpy is not installed")
+    def test_tiff_pages_decoded_one_by_one(self):
+        """Test every TIFF frame is decoded"""
+        pages = list(iter_tiff_pages(multipage_tiff_bytes(3)))
+
+        assert len(pages) == 3
+        assert [int((page < 128).sum()) for page in pages] == [150, 300, 450]
+
+    @pytest.mark.skipif(np is None, reason="numpy is not installed")
+    def test_is_multipage(self):
+        """Test only PDF and TIFF with several pages are multi-page"""
+        assert is_multipage("scan.tif", multipage_tiff_bytes(2))
+        assert not is_multipage("scan.tif", multipage_tiff_bytes(1))
+        assert not is_multipage("scan.tif", b"not a tiff")
+        assert not is_multipage("scan.png", b"")
+        assert is_multipage("scan.pdf", b"")
+
+    def test_processed_pages_keep_order_and_bound(self):
+        """Test results come in page order with bounded read-ahead"""
+        import threading
+        import time
+        decoded = []
+        lock = threading.Lock()
+        in_flight = []
+
+        def pages():
+            for number in range(10):
+                decoded.append(number)
+                yield number
+
+        def process(number):
+            with lock:
+                in_flight.append(len(decoded) - number)
+            time.sleep(0.002 * (number % 3))
+            return number * 10
+
+        results = list(iter_processed_pages(pages(), process, workers=2))
+
+        assert results == [number * 10 for number in range(10)]
+        assert max(in_flight) <= 3
+
+    @staticmethod
+    def _poppler(page_size=(595, 842), pages=2):
+        """subprocess.run stand-in answering like pdfinfo and pdftoppm"""
+        import cv2
+        ok, page = cv2.imencode('.ppm', np.full((10, 10, 3), 255, dtype=np.uint8))
+        info = f"Title: scan\nPages:          {pages}\n".encode()
+        info += b"".join(
+            f"Page    {number} size: {page_size[0]} x {page_size[1]} pts\n".encode()
+            for number in range(1, pages + 1)
+        )
+
+        def run(args, **kwargs):
+            stdout = info if args[0].endswith('pdfinfo') else page.tobytes()
+            return MagicMock(returncode=0, stdout=stdout)
+        return run
+
+    @patch('src.utils.remove_bg.pages.shutil.which', side_effect=lambda tool: f'/usr/bin/{tool}')
+    @patch('src.utils.remove_bg.pages.subprocess.run')
+    def test_pdf_pages_rendered_lazily(self, mock_run, mock_which):
+        """Test PDF page count and per-page rendering with poppler"""
+        mock_run.side_effect = self._poppler()
+
+        with PageSource("scan.pdf", b"%PDF-1.4") as source:
+            workdir = source._workdir
+            assert source.page_count == 2
+            pages = list(source)
+
+        assert len(pages) == 2
+        assert pages[0].shape == (10, 10, 3)
+        rendered = [
+            call.args[0] for call in mock_run.call_args_list
+            if call.args[0][0].endswith('pdftoppm')
+        ]
+        assert [args[args.index('-f') + 1] for args in rendered] == ['1', '2']
+        assert not os.path.exists(workdir)
+
+    @patch('src.utils.remove_bg.pages.shutil.which', side_effect=lambda tool: f'/usr/bin/{tool}')
+    @patch('src.utils.remove_bg.pages.subprocess.run')
+    def test_pdf_page_over_budget(self, mock_run, mock_which):
+        """Test oversized PDF pages are rejected before rendering"""
+        mock_run.side_effect = self._poppler(page_size=(14400, 14400))
+
+        with pytest.raises(ImageTooLargeError):
+            PageSource("poster.pdf", b"%PDF-1.4").open()
+
+        assert not any(call.args[0][0].endswith('pdftoppm') for call in mock_run.call_args_list)
+
+    @patch('src.utils.remove_bg.pages.shutil.which', side_effect=lambda tool: f'/usr/bin/{tool}')
+    @patch('src.utils.remove_bg.pages.subprocess.run')
+    def test_pdf_max_dimension_scales_rendering(self, mock_run, mock_which):
+        """Test max dimension is passed to pdftoppm instead of the DPI"""
+        mock_run.side_effect = self._poppler(page_size=(14400, 14400), pages=1)
+
+        with PageSource("poster.pdf", b"%PDF-1.4", max_dimension=800) as source:
+            list(source)
+
+        args = mock_run.call_args_list[-1].args[0]
+        assert args[args.index('-scale-to') + 1] == '800'
+        assert '-r' not in args
+
+    @pytest.mark.skipif(np is None, reason="numpy is not installed")
+    @patch('src.utils.remove_bg.pages.shutil.which', side_effect=lambda tool: f'/usr/bin/{tool}')
+    @patch('src.utils.remove_bg.pages.subprocess.run')
+    def test_failed_page_reported_in_manifest(self, mock_run, mock_which):
+        """Test a page that fails mid-stream is listed in the manifest, not a cut archive"""
+        import json
+        poppler = self._poppler(pages=3)
+
+        def run(args, **kwargs):
+            if args[0].endswith('pdftoppm') and args[args.index('-f') + 1] == '2':
+                return MagicMock(returncode=1, stdout=b"")
+            return poppler(args, **kwargs)
+        mock_run.side_effect = run
+
+        source = PageSource("scan.pdf", b"%PDF-1.4").open()
+        entries = dict(iter_page_images(source, "scan", (0, 0, 0), get_output_format('png')))
+
+        assert sorted(entries) == ["manifest.json", "scan_001.png", "scan_003.png"]
+        manifest = json.loads(entries["manifest.json"])
+        assert manifest['processed'] == 2
+        assert manifest['failed'] == 1
+        assert manifest['files'][1] == {
+            'page': 2, 'status': 'error', 'error': "Не удалось прочитать страницу"
+        }
+        assert source._workdir is None
+
+    @patch('src.utils.remove_bg.pages.shutil.which', return_value=None)
+    def test_pdf_without_poppler(self, mock_which):
+        """Test missing poppler is a typed error and the scratch dir is removed"""
+        with pytest.raises(RemoveBackgroundError):
+            PageSource("scan.pdf", b"%PDF-1.4").open()
+
+    @pytest.mark.skipif(np is None, reason="numpy is not installed")
+    def test_handler_multipage_tiff_output(self, mock_request, mock_file_upload):
+        """Test multi-page TIFF is returned as one multi-page TIFF"""
+        import io
+        from PIL import Image
+        mock_file_upload.filename = "scan.tiff"
+        mock_file_upload.file.read.return_value = multipage_tiff_bytes(3)
+
+        result = remove_bg_handler(
+            request=mock_request,
+            file=mock_file_upload,
+            color=None,
+            pages="tiff"
+        )
+
+        assert isinstance(result, MemoryFileResponse)
+        assert result.filename == "scan_no_bg.tiff"
+        assert result.headers["X-Page-Count"] == "3"
+        image = Image.open(io.BytesIO(result.body))
+        assert image.n_frames == 3
+        assert image.mode == 'RGBA'
+
+    @pytest.mark.skipif(np is None, reason="numpy is not installed")
+    def test_handler_multipage_zip_output(self, mock_request, mock_file_upload):
+        """Test multi-page TIFF is streamed as a ZIP of pages by default"""
+        from fastapi.responses import StreamingResponse
+        mock_file_upload.filename = "scan.tif"
+        mock_file_upload.file.read.return_value = multipage_tiff_bytes(2)
+
+        result = remove_bg_handler(
+            request=mock_request,
+            file=mock_file_upload,
+            color=None
+        )
+
+        assert isinstance(result, StreamingResponse)
+        assert result.media_type == "application/zip"
+        assert result.headers["X-Page-Count"] == "2"
+        # The source is closed even if the archive is never read.
+        assert result.background.func.__name__ == 'close'
+
+    @pytest.mark.skipif(np is None, reason="numpy is not installed")
+    def test_multipage_async_job(self, mock_request, mock_file_upload, wait_job):
+        """Test a multi-page document processed as a background job gives the ZIP"""
+        from src.utils.jobs import DONE, JobManager
+        mock_file_upload.filename = "scan.tif"
+        mock_file_upload.file.read.return_value = multipage_tiff_bytes(2)
+        manager = JobManager(workers=1)
+        try:
+            job = manager.submit(
+                'remove_bg', remove_bg_handler,
+                request=mock_request,
+                file=mock_file_upload, color=None
+            )
+            job = wait_job(manager, job)
+            assert job.status == DONE, job.error
+            with zipfile.ZipFile(job.result_path) as archive:
+                assert archive.namelist() == ["scan_001.png", "scan_002.png", "manifest.json"]
+        finally:
+            manager.shutdown()
+
+        assert job.filename == "scan_no_bg.zip"
+        assert job.headers["x-page-count"] == "2"
+
+    def test_handler_unknown_pages_output(self, mock_request, mock_file_upload):
+        """Test unknown multi-page output redirects with an error"""
+        mock_file_upload.filename = "scan.tif"
+
+        result = remove_bg_handler(
+            request=mock_request,
+            file=mock_file_upload,
+            color=None,
+            pages="gif"
+        )
+
+        assert isinstance(result, RedirectResponse)
+
+
+class TestImagePool:
+    """Tests for the background removal process pool"""
+
+    @staticmethod
+    def _scan():
+        img = np.full((30, 40, 3), 255, dtype=np.uint8)
+        img[10:20, 10:30] = 0
+        return img
+
+    @pytest.mark.skipif(np is None, reason="numpy is not installed")
+    def test_worker_writes_result_to_shared_memory(self):
+        """Test worker entry point reads and writes segments in place"""
+        from multiprocessing import shared_memory
+        img = self._scan()
+        source = shared_memory.SharedMemory(create=True, size=img.nbytes)
+        result = shared_memory.SharedMemory(create=True, size=30 * 40 * 4)
+        try:
+            np.ndarray(img.shape, dtype=np.uint8, buffer=source.buf)[...] = img
+
+            _process_shared(source.name, result.name, img.shape, False, (0, 0, 255))
+
+            out = np.ndarray((30, 40, 4), dtype=np.uint8, buffer=result.buf)
+            assert np.array_equal(out, remove_background_image(img, text_color=(0, 0, 255)))
+            del out
+        finally:
+            for segment in (source, result):
+                segment.close()
+                segment.unlink()
+
+    @pytest.mark.skipif(np is None, reason="numpy is not installed")
+    def test_pool_matches_inline_result(self):
+        """Test pooled processing gives the same pixels as in-process call"""
+        from concurrent.futures import ThreadPoolExecutor
+        pool = ImagePool(size=1, max_pending=1)
+        executor = ThreadPoolExecutor(max_workers=1)
+        img = self._scan()
+        try:
+            with patch.object(pool, '_get_executor', return_value=executor):
+                result = pool.remove_background_image(img, invert=True)
+        finally:
+            executor.shutdown()
+
+        assert np.array_equal(result, remove_background_image(img, invert=True))
+        assert pool.stats()['processed'] == 1
+        assert pool.stats()['in_flight'] == 0
+
+    @pytest.mark.skipif(np is None, reason="numpy is not installed")
+    def test_size_zero_processes_inline(self):
+        """Test disabled pool processes images in the calling thread"""
+        import cv2
+        pool = ImagePool(size=0, max_pending=0)
+        ok, encoded = cv2.imencode('.png', self._scan())
+
+        with patch.object(pool, '_get_executor') as mock_executor:
+            data = pool.remove_background_bytes(encoded.tobytes())
+
+        mock_executor.assert_not_called()
+        assert cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_UNCHANGED).shape == (30, 40, 4)
+
+    @pytest.mark.skipif(np is None, reason="numpy is not installed")
+    def test_full_queue_rejects(self):
+        """Test callers are rejected when the queue is full"""
+        pool = ImagePool(size=0, max_pending=0, queue_timeout=0.01)
+        pool._slots.acquire()
+        try:
+            with pytest.raises(ImagePoolBusy):
+                pool.remove_background_image(self._scan())
+        finally:
+            pool._slots.release()
+
+        assert pool.stats()['rejected'] == 1
+        assert pool.stats()['processed'] == 0
+
+    @pytest.mark.skipif(np is None, reason="numpy is not installed")
+    def test_crashed_worker_restarts_pool(self):
+        """Test broken pool is replaced and the error is typed"""
+        from concurrent.futures.process import BrokenProcessPool
+        pool = ImagePool(size=1, max_pending=0)
+        executor = MagicMock()
+        executor.submit.return_value.result.side_effect = BrokenProcessPool()
+        pool._executor = executor
+
+        with pytest.raises(RemoveBackgroundError):
+            pool.remove_background_image(self._scan())
+
+        executor.shutdown.assert_called_once()
+        assert pool._executor is None
+        assert pool.stats()['restarts'] == 1
+
+    @pytest.mark.skipif(np is None, reason="numpy is not installed")
+    def test_worker_decodes_encoded_upload(self):
+        """Test the worker decodes the upload itself and reports the result shape"""
+        import cv2
+        from multiprocessing import shared_memory
+        data = cv2.imencode('.png', self._scan())[1].tobytes()
+        source = shared_memory.SharedMemory(create=True, size=len(data))
+        result = shared_memory.SharedMemory(create=True, size=30 * 40 * 4)
+        try:
+            source.buf[:len(data)] = data
+
+            shape = _process_encoded(
+                source.name, len(data), result.name, result.size,
+                None, (10, 5, 20, 10), False, (0, 0, 255)
+            )
+
+            assert shape == (10, 20)
+            out = np.ndarray((10, 20, 4), dtype=np.uint8, buffer=result.buf)
+            expected = remove_background_image(
+                decode_image(data, crop=(10, 5, 20, 10)), text_color=(0, 0, 255)
+            )
+            assert np.array_equal(out, expected)
+            del out
+        finally:
+            for segment in (source, result):
+                segment.close()
+                segment.unlink()
+
+    @pytest.mark.skipif(np is None, reason="numpy is not installed")
+    def test_pool_does_not_decode_in_parent(self):
+        """Test an upload is decoded only in the worker, with the same result"""
+        import cv2
+        from concurrent.futures import ThreadPoolExecutor
+        pool = ImagePool(size=1, max_pending=1)
+        executor = ThreadPoolExecutor(max_workers=1)
+        data = cv2.imencode('.png', self._scan())[1].tobytes()
+        try:
+            with patch.object(pool, '_get_executor', return_value=executor), \
+                    patch.object(EncodedImage, 'decode') as mock_decode:
+                encoded = pool.remove_background_bytes(data, text_color=(0, 0, 0))
+        finally:
+            executor.shutdown()
+
+        mock_decode.assert_not_called()
+        result = cv2.imdecode(np.frombuffer(encoded, np.uint8), cv2.IMREAD_UNCHANGED)
+        assert np.array_equal(result, remove_background_image(self._scan(), text_color=(0, 0, 0)))
+
+    @pytest.mark.skipif(np is None, reason="numpy is not installed")
+    def test_full_shared_memory_is_busy(self):
+        """Test ENOSPC on reservation is reported before any pixel is written"""
+        import errno
+        pool = ImagePool(size=1, max_pending=0)
+
+        with patch('src.utils.remove_bg.image_pool.os.posix_fallocate',
+                   side_effect=OSError(errno.ENOSPC, "No space left on device"), create=True), \
+                patch.object(pool, '_get_executor') as mock_executor:
+            with pytest.raises(ImagePoolBusy):
+                pool.remove_background_image(self._scan())
+
+        mock_executor.assert_not_called()
+        assert pool.stats()['in_flight'] == 0
+
+    @pytest.mark.skipif(np is None, reason="numpy is not installed")
+    def test_image_larger_than_shared_memory(self):
+        """Test an image that can never fit into /dev/shm is too large"""
+        import errno
+        pool = ImagePool(size=1, max_pending=0)
+
+        with patch('src.utils.remove_bg.image_pool.os.posix_fallocate',
+                   side_effect=OSError(errno.ENOSPC, "No space left on device"), create=True), \
+                patch('src.utils.remove_bg.image_pool._shared_memory_capacity', return_value=100), \
+                patch.object(pool, '_get_executor'):
+            with pytest.raises(ImageTooLargeError):
+                pool.remove_background_image(self._scan())
+
+    @pytest.mark.skipif(np is None, reason="numpy is not installed")
+    def test_timeout_terminates_workers(self):
+        """Test a timed-out task does not keep running after its slot is released"""
+        from concurrent.futures import TimeoutError as FutureTimeout
+        pool = ImagePool(size=1, max_pending=0, task_timeout=0.01)
+        worker = MagicMock()
+        executor = MagicMock(spec=['submit', 'shutdown', '_processes'])
+        executor._processes = {1: worker}
+        executor.submit.return_value.result.side_effect = FutureTimeout()
+        pool._executor = executor
+
+        with pytest.raises(RemoveBackgroundError, match="longer than"):
+            pool.remove_background_image(self._scan())
+
+        worker.terminate.assert_called_once()
+        assert pool._executor is None
+        assert pool.stats()['timeouts'] == 1
+        assert pool.stats()['in_flight'] == 0
+
+    def test_corrupt_upload_is_not_submitted(self):
+        """Test undecodable data fails before reaching a worker"""
+        pool = ImagePool(size=1, max_pending=0)
+
+        with patch.object(pool, '_get_executor') as mock_executor:
+            with pytest.raises(ImageDecodeError):
+                pool.remove_background_bytes(b"not an image")
+
+        mock_executor.assert_not_called()
+
+
 class TestRemoveBgHandler:
     """Tests for remove background handler"""
 
-    @patch('src.utils.remove_bg.remove_bg_handler.remove_background')
+    @patch('src.utils.remove_bg.remove_bg_handler.remove_background_bytes')
     def test_remove_bg_handler_success(
         self,
         mock_remove_bg,
@@ -211,22 +1327,22 @@ class TestRemoveBgHandler:
         temp_file
     ):
         """Test successful background removal"""
+        mock_remove_bg.return_value = b"PNG"
         mock_file_upload.filename = "test.png"
         mock_file_upload.file.read.return_value = b"fake image content"
 
         result = remove_bg_handler(
             request=mock_request,
-            background_tasks=MagicMock(),
             file=mock_file_upload,
             color="255,0,0"
         )
 
-        assert isinstance(result, FileResponse)
+        assert isinstance(result, MemoryFileResponse)
         assert result.filename == "test_no_bg.png"
         assert result.media_type == "image/png"
         mock_remove_bg.assert_called_once()
 
-    @patch('src.utils.remove_bg.remove_bg_handler.remove_background')
+    @patch('src.utils.remove_bg.remove_bg_handler.remove_background_bytes')
     def test_remove_bg_handler_default_color(
         self,
         mock_remove_bg,
@@ -234,21 +1350,82 @@ class TestRemoveBgHandler:
         mock_file_upload
     ):
         """Test background removal with default color (black)"""
+        mock_remove_bg.return_value = b"PNG"
         mock_file_upload.filename = "test.jpg"
         mock_file_upload.file.read.return_value = b"fake image content"
 
         result = remove_bg_handler(
             request=mock_request,
-            background_tasks=MagicMock(),
             file=mock_file_upload,
             color=None
         )
 
-        assert isinstance(result, FileResponse)
+        assert isinstance(result, MemoryFileResponse)
         mock_remove_bg.assert_called_once()
         call_args = mock_remove_bg.call_args
         assert call_args[1]['text_color'] == (0, 0, 0)
 
+    @patch('src.utils.remove_bg.remove_bg_handler.remove_background_bytes')
+    def test_remove_bg_handler_output_format(
+        self,
+        mock_remove_bg,
+        mock_request,
+        mock_file_upload
+    ):
+        """Test chosen format sets extension, media type and headers"""
+        mock_remove_bg.return_value = b"RIFF1234"
+        mock_file_upload.filename = "stamp.jpg"
+
+        result = remove_bg_handler(
+            request=mock_request,
+            file=mock_file_upload,
+            color=None,
+            output_format="webp"
+        )
+
+        assert isinstance(result, MemoryFileResponse)
+        assert result.filename == "stamp_no_bg.webp"
+        assert result.media_type == "image/webp"
+        assert result.headers["X-Output-Format"] == "webp"
+        assert result.headers["X-Output-Size"] == "8"
+        assert mock_remove_bg.call_args[1]['output_format'].name == "webp"
+
+    @patch('src.utils.remove_bg.remove_bg_handler.remove_background_bytes')
+    def test_remove_bg_handler_png_compression_header(
+        self,
+        mock_remove_bg,
+        mock_request,
+        mock_file_upload
+    ):
+        """Test PNG compression is reported in the header"""
+        mock_remove_bg.return_value = b"PNG"
+        mock_file_upload.filename = "sign.png"
+
+        result = remove_bg_handler(
+            request=mock_request,
+            file=mock_file_upload,
+            color=None,
+            output_format="indexed",
+            compression="small"
+        )
+
+        assert result.headers["X-Output-Format"] == "indexed; compression=small"
+        assert mock_remove_bg.call_args[1]['compression'] == "small"
+
+    def test_remove_bg_handler_unknown_format(self, mock_request, mock_file_upload):
+        """Test unknown output format redirects with an error"""
+        mock_file_upload.filename = "sign.png"
+
+        result = remove_bg_handler(
+            request=mock_request,
+            file=mock_file_upload,
+            color=None,
+            output_format="gif"
+        )
+
+        assert isinstance(result, RedirectResponse)
+        assert result.headers["location"] == "/remove_bg"
+
     def test_remove_bg_handler_no_filename(self, mock_request):
         """Test handler with file without filename"""
         mock_file = MagicMock()
@@ -256,7 +1433,6 @@ class TestRemoveBgHandler:
 
         result = remove_bg_handler(
             request=mock_request,
-            background_tasks=MagicMock(),
             file=mock_file,
             color=None
         )
@@ -268,11 +1444,10 @@ class TestRemoveBgHandler:
     def test_remove_bg_handler_invalid_extension(self, mock_request):
         """Test handler with unsupported file extension"""
         mock_file = MagicMock()
-        mock_file.filename = "test.pdf"
+        mock_file.filename = "test.gif"
 
         result = remove_bg_handler(
             request=mock_request,
-            background_tasks=MagicMock(),
             file=mock_file,
             color=None
         )
@@ -288,7 +1463,6 @@ class TestRemoveBgHandler:
 
         result = remove_bg_handler(
             request=mock_request,
-            background_tasks=MagicMock(),
             file=mock_file_upload,
             color="invalid"
         )
@@ -297,7 +1471,7 @@ class TestRemoveBgHandler:
         assert result.headers["location"] == "/remove_bg"
         assert result.status_code == 303
 
-    @patch('src.utils.remove_bg.remove_bg_handler.remove_background')
+    @patch('src.utils.remove_bg.remove_bg_handler.remove_background_bytes')
     def test_remove_bg_handler_allowed_extensions(
         self,
         mock_remove_bg,
@@ -305,6 +1479,7 @@ class TestRemoveBgHandler:
         temp_file
     ):
         """Test handler with all allowed file extensions"""
+        mock_remove_bg.return_value = b"PNG"
         allowed_extensions = ['.png', '.jpg', '.jpeg', '.bmp', '.tiff', '.tif']
 
         for ext in allowed_extensions:
@@ -314,15 +1489,14 @@ class TestRemoveBgHandler:
 
             result = remove_bg_handler(
                 request=mock_request,
-                background_tasks=MagicMock(),
                 file=mock_file,
                 color=None
             )
 
-            assert isinstance(result, FileResponse)
+            assert isinstance(result, MemoryFileResponse)
             mock_remove_bg.reset_mock()
 
-    @patch('src.utils.remove_bg.remove_bg_handler.remove_background')
+    @patch('src.utils.remove_bg.remove_bg_handler.remove_background_bytes')
     def test_remove_bg_handler_output_filename(
         self,
         mock_remove_bg,
@@ -330,60 +1504,51 @@ class TestRemoveBgHandler:
         mock_file_upload
     ):
         """Test handler generates correct output filename"""
+        mock_remove_bg.return_value = b"PNG"
         mock_file_upload.filename = "my_image.jpg"
         mock_file_upload.file.read.return_value = b"fake image content"
 
         result = remove_bg_handler(
             request=mock_request,
-            background_tasks=MagicMock(),
             file=mock_file_upload,
             color=None
         )
 
-        assert isinstance(result, FileResponse)
+        assert isinstance(result, MemoryFileResponse)
         assert result.filename == "my_image_no_bg.png"
 
-    @patch('src.utils.remove_bg.remove_bg_handler.remove_background')
-    def test_remove_bg_handler_background_tasks(
+    @patch('src.utils.remove_bg.remove_bg_handler.remove_background_bytes')
+    def test_remove_bg_handler_exception_handling(
         self,
         mock_remove_bg,
         mock_request,
         mock_file_upload
     ):
-        """Test handler adds cleanup task to background tasks"""
+        """Test handler exception handling"""
         mock_file_upload.filename = "test.png"
         mock_file_upload.file.read.return_value = b"fake image content"
-        mock_background_tasks = MagicMock()
+        mock_remove_bg.side_effect = Exception("Processing error")
 
         result = remove_bg_handler(
             request=mock_request,
-            background_tasks=mock_background_tasks,
             file=mock_file_upload,
             color=None
         )
 
-        assert isinstance(result, FileResponse)
-        mock_background_tasks.add_task.assert_called_once()
+        assert isinstance(result, RedirectResponse)
+        assert result.headers["location"] == "/remove_bg"
+        assert result.status_code == 303
 
-    @patch('src.utils.remove_bg.remove_bg_handler.remove_background')
-    def test_remove_bg_handler_exception_handling(
-        self,
-        mock_remove_bg,
-        mock_request,
-        mock_file_upload
-    ):
-        """Test handler exception handling"""
+    def test_remove_bg_handler_corrupt_image(self, mock_request, mock_file_upload):
+        """Test undecodable upload redirects with a readable error"""
         mock_file_upload.filename = "test.png"
-        mock_file_upload.file.read.return_value = b"fake image content"
-        mock_remove_bg.side_effect = Exception("Processing error")
+        mock_file_upload.file.read.return_value = b"not an image"
 
         result = remove_bg_handler(
             request=mock_request,
-            background_tasks=MagicMock(),
             file=mock_file_upload,
             color=None
         )
 
         assert isinstance(result, RedirectResponse)
         assert result.headers["location"] == "/remove_bg"
-        assert result.status_code == 303
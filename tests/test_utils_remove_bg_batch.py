@@ -0,0 +1,131 @@
+"""
+Tests for remove_bg/batch_handler.py module
+"""
+import io
+import json
+import zipfile
+from unittest.mock import patch
+
+import cv2
+import numpy as np
+import pytest
+from fastapi.responses import RedirectResponse, StreamingResponse
+
+from src.utils.remove_bg.batch_handler import (
+    MANIFEST_NAME,
+    iter_batch_results,
+    remove_bg_batch_handler,
+)
+from src.utils.remove_bg.encoding import get_output_format
+from src.utils.remove_bg.image_pool import ImagePool
+from src.utils.streaming_zip import iter_zip
+
+
+def encoded_scan():
+    img = np.full((20, 30, 3), 240, dtype=np.uint8)
+    img[5:15, 5:25] = 10
+    ok, encoded = cv2.imencode('.png', img)
+    assert ok
+    return encoded.tobytes()
+
+
+@pytest.fixture(autouse=True)
+def inline_pool():
+    """Images are processed in the test process, without worker processes"""
+    with patch('src.utils.remove_bg.image_pool._pool', ImagePool(size=0, max_pending=4)):
+        yield
+
+
+def read_archive(uploads, output_format='png'):
+    entries = iter_batch_results(uploads, (0, 0, 0), get_output_format(output_format), 'fast')
+    archive = zipfile.ZipFile(io.BytesIO(b"".join(iter_zip(entries))))
+    manifest = json.loads(archive.read(MANIFEST_NAME))
+    return archive, manifest
+
+
+class TestIterBatchResults:
+    """Tests for batch processing into an archive"""
+
+    def test_all_files_processed(self):
+        """Test every image is added to the archive and the manifest"""
+        archive, manifest = read_archive([
+            ("stamp.png", encoded_scan()),
+            ("sign.jpg", encoded_scan()),
+        ])
+
+        assert sorted(archive.namelist()) == [
+            "001_stamp_no_bg.png", "002_sign_no_bg.png", MANIFEST_NAME
+        ]
+        assert manifest['processed'] == 2
+        assert manifest['failed'] == 0
+        assert [entry['file'] for entry in manifest['files']] == ["stamp.png", "sign.jpg"]
+        result = cv2.imdecode(
+            np.frombuffer(archive.read("001_stamp_no_bg.png"), np.uint8), cv2.IMREAD_UNCHANGED
+        )
+        assert result.shape == (20, 30, 4)
+
+    def test_errors_reported_in_manifest(self):
+        """Test a bad file does not fail the batch"""
+        archive, manifest = read_archive([
+            ("good.png", encoded_scan()),
+            ("broken.png", b"not an image"),
+            ("notes.txt", b"text"),
+        ])
+
+        assert sorted(archive.namelist()) == ["001_good_no_bg.png", MANIFEST_NAME]
+        assert manifest['processed'] == 1
+        assert manifest['failed'] == 2
+        errors = {entry['file']: entry for entry in manifest['files'] if entry['status'] == 'error'}
+        assert "повреждён" in errors["broken.png"]['error']
+        assert ".txt" in errors["notes.txt"]['error']
+
+    def test_output_format_extension(self):
+        """Test archive names follow the chosen format"""
+        archive, manifest = read_archive([("stamp.png", encoded_scan())], output_format='webp')
+
+        assert "001_stamp_no_bg.webp" in archive.namelist()
+        assert manifest['format'] == 'webp'
+
+
+class TestRemoveBgBatchHandler:
+    """Tests for batch background removal handler"""
+
+    def test_batch_zip_response(self, mock_request, make_upload):
+        """Test ZIP is streamed for several uploads"""
+        result = remove_bg_batch_handler(
+            request=mock_request,
+            files=[make_upload("a.png", encoded_scan()), make_upload("b.png", encoded_scan())],
+            color="255,0,0"
+        )
+
+        assert isinstance(result, StreamingResponse)
+        assert result.media_type == "application/zip"
+        assert "attachment" in result.headers["content-disposition"]
+
+    def test_batch_no_files(self, mock_request, make_upload):
+        """Test empty upload redirects with an error"""
+        result = remove_bg_batch_handler(request=mock_request, files=[make_upload("", b"")])
+
+        assert isinstance(result, RedirectResponse)
+        assert result.headers["location"] == "/remove_bg"
+
+    @patch('src.utils.remove_bg.batch_handler.MAX_BATCH_FILES', 1)
+    def test_batch_too_many_files(self, mock_request, make_upload):
+        """Test file count limit"""
+        result = remove_bg_batch_handler(
+            request=mock_request,
+            files=[make_upload("a.png", b"1"), make_upload("b.png", b"2")]
+        )
+
+        assert isinstance(result, RedirectResponse)
+
+    def test_batch_invalid_color(self, mock_request, make_upload):
+        """Test invalid colour redirects before processing"""
+        result = remove_bg_batch_handler(
+            request=mock_request,
+            files=[make_upload("a.png", encoded_scan())],
+            color="red"
+        )
+
+        assert isinstance(result, RedirectResponse)
+        assert "remove_bg_status" in result.headers["set-cookie"]